@@ -7,6 +7,7 @@ calculations.
 .. autosummary::
    :toctree:
 
+   autotune
    correl
    fft
    interpolate
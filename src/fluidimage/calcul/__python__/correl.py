@@ -0,0 +1,307 @@
+from math import sqrt
+import numpy as np
+
+
+def _is_there_a_nan(arr):
+    arr = arr.ravel()
+    for idx in range(9):
+        if np.isnan(arr[idx]):
+            return True
+    return False
+
+
+def _indices_max_with_error_code(correl, i0_start, i0_stop, i1_start, i1_stop):
+    """Same as nan_indices_max but returns an error code (see
+    peak_error_explanations) and does not fail if there is only nan"""
+    correl_max = np.nan
+    n0, n1 = correl.shape
+    correl_flatten = correl.ravel()
+    for i_flat in range(i0_start * n1 + i1_start, n0 * n1):
+        value = correl_flatten[i_flat]
+        if not np.isnan(value):
+            correl_max = value
+            break
+    i0_max = 0
+    i1_max = 0
+    for i0 in range(i0_start, i0_stop):
+        for i1 in range(i1_start, i1_stop):
+            value = correl[i0, i1]
+            if np.isnan(value):
+                continue
+            if value >= correl_max:
+                correl_max = value
+                i0_max = i0
+                i1_max = i1
+    error_code = 0
+    i0, i1 = (i0_max, i1_max)
+    if i0 == 0 or i0 == n0 - 1 or i1 == 0 or (i1 == n1 - 1):
+        error_code = 1
+    elif _is_there_a_nan(correl[i0 - 1:i0 + 2, i1 - 1:i1 + 2]):
+        error_code = 2
+    return (i0_max, i1_max, error_code)
+
+
+def _mask_around_peak(correl, i0, i1, radius):
+    """Put nan in the square of half size `radius` centered on a peak"""
+    n0, n1 = correl.shape
+    correl[max(i0 - radius, 0):min(i0 + radius + 1, n0),
+           max(i1 - radius, 0):min(i1 + radius + 1, n1)] = np.nan
+
+
+def nan_indices_max(correl, i0_start, i0_stop, i1_start, i1_stop):
+    correl_max = np.nan
+    # first, get the first non nan value
+    n0, n1 = correl.shape
+    correl_flatten = correl.ravel()
+    for i_flat in range(i0_start * n1 + i1_start, n0 * n1):
+        value = correl_flatten[i_flat]
+        if not np.isnan(value):
+            correl_max = value
+            break
+    assert not np.isnan(correl_max)
+    i0_max = 0
+    i1_max = 0
+    for i0 in range(i0_start, i0_stop):
+        for i1 in range(i1_start, i1_stop):
+            value = correl[i0, i1]
+            if np.isnan(value):
+                continue
+            if value >= correl_max:
+                correl_max = value
+                i0_max = i0
+                i1_max = i1
+    error_message = ''
+    i0, i1 = (i0_max, i1_max)
+    if i0 == 0 or i0 == n0 - 1 or i1 == 0 or (i1 == n1 - 1):
+        error_message = 'Correlation peak touching boundary.'
+    elif _is_there_a_nan(correl[i0 - 1:i0 + 2, i1 - 1:i1 + 2]):
+        error_message = 'Correlation peak touching nan.'
+    return (i0_max, i1_max, error_message)
+
+
+def find_peaks_stack(correls, norms, where_large_displacement, i0_start, i0_stop, i1_start, i1_stop, particle_radius, nb_peaks_to_search):
+    """Find the correlation peaks for a stack of correlation maps
+
+    For each map, this function does the same as
+    :func:`CorrelBase.compute_displacements_from_correl` (search of the
+    maximum, "second chance" in case of error and search of the secondary
+    peaks with non-maximum suppression over `particle_radius`) but without
+    modifying the input maps.
+
+    Returns
+    -------
+
+    i0s, i1s : indices of the main peaks
+
+    correls_max : normalized values of the main peaks
+
+    error_codes : 0 if no error (see peak_error_explanations)
+
+    i0s_others, i1s_others, correls_max_others : secondary peaks (2d arrays
+      of shape (nb_correls, nb_peaks_to_search - 1))
+
+    nbs_others : number of secondary peaks found for each map
+
+    """
+    nb_correls, n0, n1 = correls.shape
+    nb_others = max(nb_peaks_to_search - 1, 0)
+    i0s = np.zeros(nb_correls, dtype=np.int32)
+    i1s = np.zeros(nb_correls, dtype=np.int32)
+    correls_max = np.zeros(nb_correls)
+    error_codes = np.zeros(nb_correls, dtype=np.int32)
+    i0s_others = np.zeros((nb_correls, nb_others), dtype=np.int32)
+    i1s_others = np.zeros((nb_correls, nb_others), dtype=np.int32)
+    correls_max_others = np.zeros((nb_correls, nb_others))
+    nbs_others = np.zeros(nb_correls, dtype=np.int32)
+    correl = np.empty_like(correls[0])
+    for index in range(nb_correls):
+        correl[:] = correls[index]
+        correl[where_large_displacement] = np.nan
+        norm = norms[index]
+        i0, i1, error_code = _indices_max_with_error_code(
+            correl, i0_start, i0_stop, i1_start, i1_stop)
+        if norm == 0:
+            correl_max = 0.0
+        else:
+            correl_max = correl[i0, i1] / norm
+        if error_code != 0:
+            # second chance to find a better peak...
+            _mask_around_peak(correl, i0, i1, particle_radius)
+            i0_2, i1_2, error_code = _indices_max_with_error_code(
+                correl, i0_start, i0_stop, i1_start, i1_stop)
+            if error_code == 0:
+                i0, i1 = (i0_2, i1_2)
+                if norm != 0:
+                    correl_max = correl[i0, i1] / norm
+        i0s[index] = i0
+        i1s[index] = i1
+        correls_max[index] = correl_max
+        error_codes[index] = error_code
+        if error_code != 0:
+            continue
+        for i_other in range(nb_others):
+            _mask_around_peak(correl, i0, i1, particle_radius)
+            i0, i1, error_code_other = _indices_max_with_error_code(
+                correl, i0_start, i0_stop, i1_start, i1_stop)
+            if error_code_other != 0:
+                break
+            i0s_others[index, i_other] = i0
+            i1s_others[index, i_other] = i1
+            if norm == 0:
+                correls_max_others[index, i_other] = 0.0
+            else:
+                correls_max_others[index, i_other] = correl[i0, i1] / norm
+            nbs_others[index] = i_other + 1
+    return (i0s, i1s, correls_max, error_codes, i0s_others, i1s_others, correls_max_others, nbs_others)
+
+
+def correl_numpy(im0, im1, disp_max):
+    """Correlations by hand using only numpy.
+
+    Parameters
+    ----------
+
+    im0, im1 : images
+      input images : 2D matrix
+
+    disp_max : int
+      displacement max.
+
+    Notes
+    -----
+
+    im1_shape inf to im0_shape
+
+    Returns
+    -------
+
+    the computing correlation (size of computed correlation = disp_max*2 + 1)
+
+    """
+    norm = np.sqrt(np.sum(im1 ** 2) * np.sum(im0 ** 2))
+    ny = nx = int(disp_max) * 2 + 1
+    ny0, nx0 = im0.shape
+    ny1, nx1 = im1.shape
+    zero = np.float32(0.0)
+    correl = np.empty((ny, nx), dtype=np.float32)
+    for xiy in range(disp_max + 1):
+        dispy = -disp_max + xiy
+        nymax = ny1 + min(ny0 // 2 - ny1 // 2 + dispy, 0)
+        ny1dep = -min(ny0 // 2 - ny1 // 2 + dispy, 0)
+        ny0dep = max(0, ny0 // 2 - ny1 // 2 + dispy)
+        for xix in range(disp_max + 1):
+            dispx = -disp_max + xix
+            nxmax = nx1 + min(nx0 // 2 - nx1 // 2 + dispx, 0)
+            nx1dep = -min(nx0 // 2 - nx1 // 2 + dispx, 0)
+            nx0dep = max(0, nx0 // 2 - nx1 // 2 + dispx)
+            tmp = zero
+            for iy in range(nymax):
+                for ix in range(nxmax):
+                    tmp += im1[iy + ny1dep, ix + nx1dep] * \
+                        im0[ny0dep + iy, nx0dep + ix]
+            correl[xiy, xix] = tmp / (nxmax * nymax)
+        for xix in range(disp_max):
+            dispx = xix + 1
+            nxmax = nx1 - max(nx0 // 2 + nx1 // 2 + dispx - nx0, 0)
+            nx1dep = 0
+            nx0dep = nx0 // 2 - nx1 // 2 + dispx
+            tmp = zero
+            for iy in range(nymax):
+                for ix in range(nxmax):
+                    tmp += im1[iy + ny1dep, ix + nx1dep] * \
+                        im0[ny0dep + iy, nx0dep + ix]
+            correl[xiy, xix + disp_max + 1] = tmp / (nxmax * nymax)
+    for xiy in range(disp_max):
+        dispy = xiy + 1
+        nymax = ny1 - max(ny0 // 2 + ny1 // 2 + dispy - ny0, 0)
+        ny1dep = 0
+        ny0dep = ny0 // 2 - ny1 // 2 + dispy
+        for xix in range(disp_max + 1):
+            dispx = -disp_max + xix
+            nxmax = nx1 + min(nx0 // 2 - nx1 // 2 + dispx, 0)
+            nx1dep = -min(nx0 // 2 - nx1 // 2 + dispx, 0)
+            nx0dep = max(0, nx0 // 2 - nx1 // 2 + dispx)
+            tmp = zero
+            for iy in range(nymax):
+                for ix in range(nxmax):
+                    tmp += im1[iy + ny1dep, ix + nx1dep] * \
+                        im0[ny0dep + iy, nx0dep + ix]
+            correl[xiy + disp_max + 1, xix] = tmp / (nxmax * nymax)
+        for xix in range(disp_max):
+            dispx = xix + 1
+            nxmax = nx1 - max(nx0 // 2 + nx1 // 2 + dispx - nx0, 0)
+            nx1dep = 0
+            nx0dep = nx0 // 2 - nx1 // 2 + dispx
+            tmp = zero
+            for iy in range(nymax):
+                for ix in range(nxmax):
+                    tmp += im1[iy + ny1dep, ix + nx1dep] * \
+                        im0[ny0dep + iy, nx0dep + ix]
+            correl[xiy + disp_max + 1, xix +
+                   disp_max + 1] = tmp / (nxmax * nymax)
+    correl = correl * im1.size
+    return (correl, norm)
+
+
+def _norm_images(im0, im1):
+    """Less accurate than the numpy equivalent but much faster
+
+    Should return something close to:
+
+    sqrt(np.sum(im1**2) * np.sum(im0**2))
+
+    """
+    im0 = im0.ravel()
+    im1 = im1.ravel()
+    tmp0 = np.float64(im0[0] ** 2)
+    tmp1 = np.float64(im1[0] ** 2)
+    if im0.size != im1.size:
+        for idx in range(1, im0.size):
+            tmp0 += im0[idx] ** 2
+        for idx in range(1, im1.size):
+            tmp1 += im1[idx] ** 2
+    else:
+        for idx in range(1, im0.size):
+            tmp0 += im0[idx] ** 2
+            tmp1 += im1[idx] ** 2
+    return sqrt(tmp0 * tmp1)
+
+
+def _like_fftshift(arr):
+    """Pythran optimized function doing the equivalent of
+
+    np.ascontiguousarray(np.fft.fftshift(arr[::-1, ::-1]))
+
+    """
+    n0, n1 = arr.shape
+    arr = np.ascontiguousarray(arr[::-1, ::-1])
+    tmp = np.empty_like(arr)
+    if n1 % 2 == 0:
+        for i0 in range(n0):
+            for i1 in range(n1 // 2):
+                tmp[i0, n1 // 2 + i1] = arr[i0, i1]
+                tmp[i0, i1] = arr[i0, n1 // 2 + i1]
+    else:
+        for i0 in range(n0):
+            for i1 in range(n1 // 2 + 1):
+                tmp[i0, n1 // 2 + i1] = arr[i0, i1]
+            for i1 in range(n1 // 2):
+                tmp[i0, i1] = arr[i0, n1 // 2 + 1 + i1]
+    arr_1d_view = arr.ravel()
+    tmp_1d_view = tmp.ravel()
+    if n0 % 2 == 0:
+        n_half = n0 // 2 * n1
+        for idx in range(n_half):
+            arr_1d_view[idx + n_half] = tmp_1d_view[idx]
+            arr_1d_view[idx] = tmp_1d_view[idx + n_half]
+    else:
+        n_half_a = (n0 // 2 + 1) * n1
+        n_half_b = n0 // 2 * n1
+        for idx in range(n_half_a):
+            arr_1d_view[idx + n_half_b] = tmp_1d_view[idx]
+        for idx in range(n_half_b):
+            arr_1d_view[idx] = tmp_1d_view[idx + n_half_a]
+    return arr
+
+
+def __transonic__(): return "0.8.0"
@@ -0,0 +1,39 @@
+import numpy as np
+
+
+def _compute_energy_from_fourier(field_fft, coef_norm):
+    """Simple Pythran implementation of
+
+    (
+        0.5 / coef_norm
+        * (
+            np.sum(abs(field_fft[:, 0]) ** 2 + abs(field_fft[:, -1]) ** 2)
+            + 2 * np.sum(abs(field_fft[:, 1:-1]) ** 2)
+        )
+    )
+    """
+    n0, n1 = field_fft.shape
+    result = 0.0
+    for i0 in range(n0):
+        result += abs(field_fft[i0, 0]) ** 2 + abs(field_fft[i0, n1 - 1]) ** 2
+        for i1 in range(1, n1 - 1):
+            result += 2 * abs(field_fft[i0, i1]) ** 2
+    return 0.5 / coef_norm * result
+
+
+def _compute_energies_from_fourier(fields_fft, coef_norm):
+    """Pythran implementation of _compute_energy_from_fourier for a stack"""
+    nb_fields, n0, n1 = fields_fft.shape
+    energies = np.empty(nb_fields)
+    for i_field in range(nb_fields):
+        result = 0.0
+        for i0 in range(n0):
+            result += abs(fields_fft[i_field, i0, 0]) ** 2 + \
+                abs(fields_fft[i_field, i0, n1 - 1]) ** 2
+            for i1 in range(1, n1 - 1):
+                result += 2 * abs(fields_fft[i_field, i0, i1]) ** 2
+        energies[i_field] = 0.5 / coef_norm * result
+    return energies
+
+
+def __transonic__(): return "0.8.0"
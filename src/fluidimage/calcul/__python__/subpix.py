@@ -0,0 +1,158 @@
+import numpy as np
+
+
+def _subpix_2d_gaussian2(correl, ix, iy):
+    correl_crop = np.empty((3, 3))
+    for i0 in range(3):
+        for i1 in range(3):
+            correl_crop[i0, i1] = correl[iy - 1 + i0, ix - 1 + i1]
+    correl_crop -= correl_crop.min()
+    correl_crop /= correl_crop.max()
+    c10 = 0.0
+    c01 = 0.0
+    c11 = 0.0
+    c20 = 0.0
+    c02 = 0.0
+    for i0 in range(3):
+        for i1 in range(3):
+            value = correl_crop[i0, i1]
+            if value == 0:
+                value = 1e-08
+            log_value = np.log(value)
+            c10 += (i1 - 1) * log_value
+            c01 += (i0 - 1) * log_value
+            c11 += (i1 - 1) * (i0 - 1) * log_value
+            c20 += (3 * (i1 - 1) ** 2 - 2) * log_value
+            c02 += (3 * (i0 - 1) ** 2 - 2) * log_value
+    c10 /= 6
+    c01 /= 6
+    c11 /= 4
+    c20 /= 6
+    c02 /= 6
+    deplx = (c11 * c01 - 2 * c10 * c02) / (4 * c20 * c02 - c11 ** 2)
+    deply = (c11 * c10 - 2 * c01 * c20) / (4 * c20 * c02 - c11 ** 2)
+    return (deplx, deply)
+
+
+def _subpix_centroid(correl, ix, iy, nsubpix):
+    sum_correl = 0.0
+    deplx = 0.0
+    deply = 0.0
+    for i0 in range(2 * nsubpix + 1):
+        for i1 in range(2 * nsubpix + 1):
+            value = correl[iy - nsubpix + i0, ix - nsubpix + i1]
+            sum_correl += value
+            deplx += (i1 - nsubpix) * value
+            deply += (i0 - nsubpix) * value
+    if sum_correl == 0.0:
+        return (np.nan, np.nan)
+    return (deplx / sum_correl, deply / sum_correl)
+
+
+def compute_subpix_2d_gaussian2(correl, ix, iy):
+    # without np.ascontiguousarray => memory leak
+    correl_crop = np.ascontiguousarray(correl[iy - 1:iy + 2, ix - 1:ix + 2])
+    correl_crop_ravel = correl_crop.ravel()
+    correl_min = correl_crop.min()
+    for idx in range(9):
+        correl_crop_ravel[idx] -= correl_min
+    correl_max = correl_crop.max()
+    for idx in range(9):
+        correl_crop_ravel[idx] /= correl_max
+    for idx in range(9):
+        if correl_crop_ravel[idx] == 0:
+            correl_crop_ravel[idx] = 1e-08
+    c10 = 0
+    c01 = 0
+    c11 = 0
+    c20 = 0
+    c02 = 0
+    for i0 in range(3):
+        for i1 in range(3):
+            c10 += (i1 - 1) * np.log(correl_crop[i0, i1])
+            c01 += (i0 - 1) * np.log(correl_crop[i0, i1])
+            c11 += (i1 - 1) * (i0 - 1) * np.log(correl_crop[i0, i1])
+            c20 += (3 * (i1 - 1) ** 2 - 2) * np.log(correl_crop[i0, i1])
+            c02 += (3 * (i0 - 1) ** 2 - 2) * np.log(correl_crop[i0, i1])
+            c00 = (5 - 3 * (i1 - 1) ** 2 - 3 * (i0 - 1) ** 2) * \
+                np.log(correl_crop[i0, i1])
+    c00, c10, c01, c11, c20, c02 = (
+        c00 / 9, c10 / 6, c01 / 6, c11 / 4, c20 / 6, c02 / 6)
+    deplx = (c11 * c01 - 2 * c10 * c02) / (4 * c20 * c02 - c11 ** 2)
+    deply = (c11 * c10 - 2 * c01 * c20) / (4 * c20 * c02 - c11 ** 2)
+    return (deplx, deply, correl_crop)
+
+
+def compute_subpix_stack(correls, ixs, iys, method_index, nsubpix, matrix_inv):
+    """Compute the subpixel positions of the peaks of a stack of correlations
+
+    `method_index` is the index of the method in :attr:`SubPix.methods`. The
+    fallbacks are the same as in :meth:`SubPix.compute_subpix`.
+
+    Returns
+    -------
+
+    ixs_subpix, iys_subpix : positions of the peaks (equal to the input
+      indices if there is an error)
+
+    error_codes : 0 if no error (see subpix_error_explanations)
+
+    nb_too_large_depl : number of too large subpixel displacements
+
+    """
+    nb_correls, ny, nx = correls.shape
+    ixs_subpix = np.empty(nb_correls)
+    iys_subpix = np.empty(nb_correls)
+    error_codes = np.zeros(nb_correls, dtype=np.int32)
+    nb_too_large_depl = 0
+    size_crop = 2 * nsubpix + 1
+    log_crop = np.empty(size_crop * size_crop)
+    depl2_max = 2 * (0.5 + nsubpix) ** 2
+    for index in range(nb_correls):
+        ix = ixs[index]
+        iy = iys[index]
+        ixs_subpix[index] = ix
+        iys_subpix[index] = iy
+        if iy - nsubpix < 0 or iy + nsubpix + 1 > ny or ix - nsubpix < 0 or (ix + nsubpix + 1 > nx):
+            error_codes[index] = 1
+            continue
+        correl = correls[index]
+        method = method_index
+        deplx = 0.0
+        deply = 0.0
+        if method == 0:
+            # 2d_gaussian
+            for i0 in range(size_crop):
+                for i1 in range(size_crop):
+                    value = correl[iy - nsubpix + i0, ix - nsubpix + i1]
+                    if value <= 0.0:
+                        value = 1e-06
+                    log_crop[i0 * size_crop + i1] = np.log(value)
+            coef = np.dot(matrix_inv, log_crop)
+            if coef[0] > 0 or coef[1] > 0:
+                method = 2
+            else:
+                deplx = coef[2] / (-2 * coef[0])
+                deply = coef[3] / (-2 * coef[1])
+                if np.isnan(deplx) or np.isnan(deply):
+                    method = 2
+        if method == 1:
+            deplx, deply = _subpix_2d_gaussian2(correl, ix, iy)
+            if deplx ** 2 + deply ** 2 > depl2_max:
+                nb_too_large_depl += 1
+                method = 2
+        if method == 2:
+            deplx, deply = _subpix_centroid(correl, ix, iy, nsubpix)
+            if np.isnan(deplx):
+                error_codes[index] = 3
+                continue
+        if deplx ** 2 + deply ** 2 > depl2_max:
+            nb_too_large_depl += 1
+            error_codes[index] = 2
+            continue
+        ixs_subpix[index] = deplx + ix
+        iys_subpix[index] = deply + iy
+    return (ixs_subpix, iys_subpix, error_codes, nb_too_large_depl)
+
+
+def __transonic__(): return "0.8.0"
@@ -0,0 +1,148 @@
+"""Autotuning of the correlation method
+======================================
+
+The correlation methods running on CPU (see
+:data:`fluidimage.calcul.correl.correlation_classes`) are benchmarked for
+given window shapes and the fastest one is chosen. The decisions are saved in
+a per-machine profile (see :func:`fluidimage.config.get_path_autotune_profile`)
+so that the tuning is done only once on a machine.
+
+.. autofunction:: get_method_correl_auto
+
+.. autofunction:: benchmark_methods_correl
+
+"""
+
+import platform
+from time import perf_counter
+
+import numpy as np
+
+from ..config import load_autotune_profile, save_autotune_profile
+from ..util import logger
+from .correl import correlation_classes
+
+methods_correl_cpu = (
+    "fftw",
+    "np.fft",
+    "pythran",
+    "scipy.signal",
+    "scipy.ndimage",
+)
+
+
+def _make_key(im0_shape, im1_shape, displacement_max, nb_windows):
+    return repr(
+        (tuple(im0_shape), tuple(im1_shape), displacement_max, nb_windows)
+    )
+
+
+def benchmark_methods_correl(
+    im0_shape,
+    im1_shape=None,
+    displacement_max=None,
+    nb_windows=32,
+    nb_repeat=3,
+    methods=None,
+):
+    """Measure the time to compute a stack of correlations with each method.
+
+    The time includes the computation of the correlations and of the
+    displacements (search of the peaks). The methods which cannot be used (for
+    example because of a missing library or unsupported shapes) are skipped.
+
+    Returns
+    -------
+
+    timings : dict
+
+      Time (in s) per window for each usable method.
+
+    """
+    if im1_shape is None:
+        im1_shape = im0_shape
+    if methods is None:
+        methods = methods_correl_cpu
+
+    generator = np.random.default_rng(0)
+    ims0 = generator.random((nb_windows, *im0_shape), dtype=np.float32)
+    ims1 = generator.random((nb_windows, *im1_shape), dtype=np.float32)
+
+    timings = {}
+    for method in methods:
+        try:
+            correl = correlation_classes[method](
+                im0_shape, im1_shape, displacement_max=displacement_max
+            )
+            # warm up (creation of the stack operators, FFT plans, ...)
+            t_start = perf_counter()
+            correls, norms = correl.compute_correls_stack(ims0, ims1)
+            correl.compute_displacements_from_correls_stack(correls, norms)
+            duration_warm_up = perf_counter() - t_start
+        except Exception as error:
+            logger.debug("Correlation method %s not usable: %s", method, error)
+            continue
+
+        # no need to repeat for very slow methods
+        time_min = min(timings.values(), default=np.inf) * nb_windows
+        if duration_warm_up > 10 * time_min:
+            timings[method] = duration_warm_up / nb_windows
+            continue
+
+        durations = []
+        for _ in range(nb_repeat):
+            t_start = perf_counter()
+            correls, norms = correl.compute_correls_stack(ims0, ims1)
+            correl.compute_displacements_from_correls_stack(correls, norms)
+            durations.append(perf_counter() - t_start)
+        timings[method] = min(durations) / nb_windows
+
+    return timings
+
+
+def get_method_correl_auto(
+    im0_shape,
+    im1_shape=None,
+    displacement_max=None,
+    nb_windows=32,
+    path_profile=None,
+):
+    """Get the fastest correlation method for this machine.
+
+    The decision is read from the profile of this machine if it has already
+    been taken for the same parameters. Otherwise, the methods are
+    benchmarked (with :func:`benchmark_methods_correl`) and the decision is
+    saved in the profile.
+
+    """
+    if im1_shape is None:
+        im1_shape = im0_shape
+
+    key = _make_key(im0_shape, im1_shape, displacement_max, nb_windows)
+    profile = load_autotune_profile(path_profile)
+    try:
+        return profile["correl"][key]["method"]
+    except (KeyError, TypeError):
+        pass
+
+    logger.info(
+        "Autotuning of the correlation method for windows %s and %s",
+        im0_shape,
+        im1_shape,
+    )
+    timings = benchmark_methods_correl(
+        im0_shape, im1_shape, displacement_max, nb_windows
+    )
+    if not timings:
+        raise ValueError("No correlation method can be used")
+    method = min(timings, key=timings.get)
+    logger.info("Fastest correlation method: %s", method)
+
+    # reload to merge the decisions taken by other processes
+    profile = load_autotune_profile(path_profile)
+    profile["machine"] = platform.node()
+    decisions = profile.setdefault("correl", {})
+    decisions[key] = {"method": method, "timings": timings}
+    save_autotune_profile(profile, path_profile)
+
+    return method
@@ -44,6 +44,7 @@ different methods.
 
 from abc import ABC, abstractmethod
 from math import sqrt
+from threading import local
 
 import numpy as np
 from scipy.ndimage import correlate
@@ -55,8 +56,11 @@ from .errors import PIVError
 from .fft import (
     CUFFT2DReal2Complex,
     FFTW2DReal2Complex,
+    FFTW2DReal2ComplexStack,
     NumpyFFT2DReal2Complex,
+    NumpyFFT2DReal2ComplexStack,
     SKCUFFT2DReal2Complex,
+    compute_fast_size,
 )
 from .subpix import SubPix
 
@@ -74,8 +78,16 @@ def parse_displacement_max(displ_max, im0_shape):
 
 
 A2dC = Array[Type(np.float32, np.float64), "2d", "C"]
+A3dC = Array[Type(np.float32, np.float64), "3d", "C"]
 A2df32 = "float32[][]"
 
+#: Explanations corresponding to the error codes returned by
+#: :func:`find_peaks_stack` (0 means no error)
+peak_error_explanations = {
+    1: "Correlation peak touching boundary.",
+    2: "Correlation peak touching nan.",
+}
+
 
 def _is_there_a_nan(arr):
     arr = arr.ravel()
@@ -132,6 +144,157 @@ def nan_indices_max(
     return i0_max, i1_max, error_message
 
 
+def _indices_max_with_error_code(correl, i0_start, i0_stop, i1_start, i1_stop):
+    """Same as nan_indices_max but returns an error code (see
+    peak_error_explanations) and does not fail if there is only nan"""
+    correl_max = np.nan
+    n0, n1 = correl.shape
+    correl_flatten = correl.ravel()
+    for i_flat in range(i0_start * n1 + i1_start, n0 * n1):
+        value = correl_flatten[i_flat]
+        if not np.isnan(value):
+            correl_max = value
+            break
+
+    i0_max = 0
+    i1_max = 0
+    for i0 in range(i0_start, i0_stop):
+        for i1 in range(i1_start, i1_stop):
+            value = correl[i0, i1]
+            if np.isnan(value):
+                continue
+            if value >= correl_max:
+                correl_max = value
+                i0_max = i0
+                i1_max = i1
+
+    error_code = 0
+    i0, i1 = i0_max, i1_max
+    if i0 == 0 or i0 == n0 - 1 or i1 == 0 or i1 == n1 - 1:
+        error_code = 1
+    elif _is_there_a_nan(correl[i0 - 1 : i0 + 2, i1 - 1 : i1 + 2]):
+        error_code = 2
+
+    return i0_max, i1_max, error_code
+
+
+def _mask_around_peak(correl, i0, i1, radius):
+    """Put nan in the square of half size `radius` centered on a peak"""
+    n0, n1 = correl.shape
+    correl[
+        max(i0 - radius, 0) : min(i0 + radius + 1, n0),
+        max(i1 - radius, 0) : min(i1 + radius + 1, n1),
+    ] = np.nan
+
+
+@boost
+def find_peaks_stack(
+    correls: A3dC,
+    norms: "float64[]",
+    where_large_displacement: "bool[][]",
+    i0_start: int,
+    i0_stop: int,
+    i1_start: int,
+    i1_stop: int,
+    particle_radius: int,
+    nb_peaks_to_search: int,
+):
+    """Find the correlation peaks for a stack of correlation maps
+
+    For each map, this function does the same as
+    :func:`CorrelBase.compute_displacements_from_correl` (search of the
+    maximum, "second chance" in case of error and search of the secondary
+    peaks with non-maximum suppression over `particle_radius`) but without
+    modifying the input maps.
+
+    Returns
+    -------
+
+    i0s, i1s : indices of the main peaks
+
+    correls_max : normalized values of the main peaks
+
+    error_codes : 0 if no error (see peak_error_explanations)
+
+    i0s_others, i1s_others, correls_max_others : secondary peaks (2d arrays
+      of shape (nb_correls, nb_peaks_to_search - 1))
+
+    nbs_others : number of secondary peaks found for each map
+
+    """
+    nb_correls, n0, n1 = correls.shape
+    nb_others = max(nb_peaks_to_search - 1, 0)
+
+    i0s = np.zeros(nb_correls, dtype=np.int32)
+    i1s = np.zeros(nb_correls, dtype=np.int32)
+    correls_max = np.zeros(nb_correls)
+    error_codes = np.zeros(nb_correls, dtype=np.int32)
+    i0s_others = np.zeros((nb_correls, nb_others), dtype=np.int32)
+    i1s_others = np.zeros((nb_correls, nb_others), dtype=np.int32)
+    correls_max_others = np.zeros((nb_correls, nb_others))
+    nbs_others = np.zeros(nb_correls, dtype=np.int32)
+
+    correl = np.empty_like(correls[0])
+
+    for index in range(nb_correls):
+        correl[:] = correls[index]
+        correl[where_large_displacement] = np.nan
+        norm = norms[index]
+
+        i0, i1, error_code = _indices_max_with_error_code(
+            correl, i0_start, i0_stop, i1_start, i1_stop
+        )
+        if norm == 0:
+            correl_max = 0.0
+        else:
+            correl_max = correl[i0, i1] / norm
+
+        if error_code != 0:
+            # second chance to find a better peak...
+            _mask_around_peak(correl, i0, i1, particle_radius)
+            i0_2, i1_2, error_code = _indices_max_with_error_code(
+                correl, i0_start, i0_stop, i1_start, i1_stop
+            )
+            if error_code == 0:
+                i0, i1 = i0_2, i1_2
+                if norm != 0:
+                    correl_max = correl[i0, i1] / norm
+
+        i0s[index] = i0
+        i1s[index] = i1
+        correls_max[index] = correl_max
+        error_codes[index] = error_code
+
+        if error_code != 0:
+            continue
+
+        for i_other in range(nb_others):
+            _mask_around_peak(correl, i0, i1, particle_radius)
+            i0, i1, error_code_other = _indices_max_with_error_code(
+                correl, i0_start, i0_stop, i1_start, i1_stop
+            )
+            if error_code_other != 0:
+                break
+            i0s_others[index, i_other] = i0
+            i1s_others[index, i_other] = i1
+            if norm == 0:
+                correls_max_others[index, i_other] = 0.0
+            else:
+                correls_max_others[index, i_other] = correl[i0, i1] / norm
+            nbs_others[index] = i_other + 1
+
+    return (
+        i0s,
+        i1s,
+        correls_max,
+        error_codes,
+        i0s_others,
+        i1s_others,
+        correls_max_others,
+        nbs_others,
+    )
+
+
 def _compute_indices_max(
     correl, norm, start_stop_for_search0, start_stop_for_search1
 ):
@@ -179,8 +342,10 @@ class CorrelBase(ABC):
         particle_radius=3,
         nb_peaks_to_search=1,
         mode=None,
+        pad_to_fast_sizes=False,
     ):
         self.mode = mode
+        self.pad_to_fast_sizes = pad_to_fast_sizes
 
         self.subpix = SubPix(method=method_subpix, nsubpix=nsubpix)
 
@@ -199,10 +364,46 @@ class CorrelBase(ABC):
         self.start_stop_for_search1 = [0, None]
         self._finalize_init()
 
+    #: True if the correlations can be computed from stacks of spectra (see
+    #: :meth:`CorrelFFTWithOperBase.compute_spectra_stack`)
+    can_use_spectra = False
+
     @abstractmethod
     def __call__(self, im0, im1):
         """Compute the correlation from 2 images."""
 
+    def compute_correls_stack(self, ims0, ims1, nb_fields_oper=None):
+        """Compute the correlations from 2 stacks of images.
+
+        This default implementation loops over the couples of images. It is
+        overridden by the classes able to process a stack in one go
+        (`nb_fields_oper` is then the number of fields of their FFT
+        operators).
+
+        Returns
+        -------
+
+        correls : np.ndarray (3d)
+          Stack of correlation maps.
+
+        norms : np.ndarray (1d)
+
+        """
+        nb_correls = len(ims0)
+        norms = np.empty(nb_correls)
+        correls = None
+        for index, (im0, im1) in enumerate(zip(ims0, ims1)):
+            correl, norm = self(im0, im1)
+            if correls is None:
+                correls = np.empty(
+                    (nb_correls,) + correl.shape, dtype=correl.dtype
+                )
+            correls[index] = correl
+            norms[index] = norm
+        if correls is None:
+            correls = np.empty((0, 0, 0), dtype=np.float32)
+        return correls, norms
+
     def _finalize_init(self):
         """Finalize initialization"""
 
@@ -231,10 +432,7 @@ class CorrelBase(ABC):
         except PIVError as piv_error:
             ix, iy, correl_max = piv_error.results
             # second chance to find a better peak...
-            correl[
-                iy - self.particle_radius : iy + self.particle_radius + 1,
-                ix - self.particle_radius : ix + self.particle_radius + 1,
-            ] = np.nan
+            _mask_around_peak(correl, iy, ix, self.particle_radius)
             try:
                 ix2, iy2, correl_max2 = self._compute_indices_max(correl, norm)
             except PIVError as _piv_error:
@@ -253,10 +451,7 @@ class CorrelBase(ABC):
             correl = correl.copy()
             other_peaks = []
             for _ in range(0, self.nb_peaks_to_search - 1):
-                correl[
-                    iy - self.particle_radius : iy + self.particle_radius + 1,
-                    ix - self.particle_radius : ix + self.particle_radius + 1,
-                ] = np.nan
+                _mask_around_peak(correl, iy, ix, self.particle_radius)
                 try:
                     ix, iy, correl_max_other = self._compute_indices_max(
                         correl, norm
@@ -274,12 +469,117 @@ class CorrelBase(ABC):
 
         return dx, dy, correl_max, other_peaks
 
+    def compute_displacements_from_correls_stack(self, correls, norms):
+        """Compute the displacements from a stack of correlations.
+
+        The peaks of all the maps are searched with one call to the compiled
+        function :func:`find_peaks_stack`. The input maps are not modified.
+
+        Returns
+        -------
+
+        deltaxs, deltays, correls_max : np.ndarray
+
+        errors : dict
+
+          Explanations of the errors indexed by the indices in the stack.
+
+        other_peaks : list
+
+          Secondary peaks (lists of tuples ``(dx, dy, correl_max)``) or None
+          if `nb_peaks_to_search` is equal to 1.
+
+        """
+        nb_correls = len(correls)
+        try:
+            where_large_displacement = self.where_large_displacement
+        except AttributeError:
+            where_large_displacement = np.zeros(correls.shape[1:], dtype=bool)
+
+        i0_start, i0_stop = self.start_stop_for_search0
+        i1_start, i1_stop = self.start_stop_for_search1
+        if i0_stop is None:
+            i0_stop, i1_stop = correls.shape[1:]
+
+        if nb_correls == 0:
+            empty = np.empty(0)
+            return empty, empty.copy(), empty.copy(), {}, []
+
+        (
+            i0s,
+            i1s,
+            correls_max,
+            error_codes,
+            i0s_others,
+            i1s_others,
+            correls_max_others,
+            nbs_others,
+        ) = find_peaks_stack(
+            np.ascontiguousarray(correls),
+            np.ascontiguousarray(norms, dtype=np.float64),
+            where_large_displacement,
+            i0_start,
+            i0_stop,
+            i1_start,
+            i1_stop,
+            self.particle_radius,
+            self.nb_peaks_to_search,
+        )
+
+        deltaxs, deltays = self.compute_displacement_from_indices(i1s, i0s)
+
+        errors = {
+            index: peak_error_explanations[code]
+            for index, code in enumerate(error_codes.tolist())
+            if code != 0
+        }
+
+        if self.nb_peaks_to_search == 1:
+            other_peaks = [None] * nb_correls
+        else:
+            dxs_others, dys_others = self.compute_displacement_from_indices(
+                i1s_others, i0s_others
+            )
+            other_peaks = [
+                list(
+                    zip(
+                        dxs_others[index, :nb].tolist(),
+                        dys_others[index, :nb].tolist(),
+                        correls_max_others[index, :nb].tolist(),
+                    )
+                )
+                for index, nb in enumerate(nbs_others.tolist())
+            ]
+            for index in errors:
+                other_peaks[index] = None
+
+        return deltaxs, deltays, correls_max, errors, other_peaks
+
     def apply_subpix(self, dx, dy, correl):
         """Compute the displacement with the subpix method."""
         ix, iy = self.compute_indices_from_displacement(dx, dy)
         ix, iy = self.subpix.compute_subpix(correl, ix, iy)
         return self.compute_displacement_from_indices(ix, iy)
 
+    def apply_subpix_stack(self, deltaxs, deltays, correls):
+        """Compute the displacements of a stack with the subpix method.
+
+        Returns
+        -------
+
+        deltaxs, deltays : np.ndarray
+
+        errors : dict
+
+          Explanations of the errors indexed by the indices in the stack.
+          For these vectors, the input displacements are returned.
+
+        """
+        ixs, iys = self.compute_indices_from_displacement(deltaxs, deltays)
+        ixs, iys, errors = self.subpix.compute_subpix_stack(correls, ixs, iys)
+        deltaxs, deltays = self.compute_displacement_from_indices(ixs, iys)
+        return deltaxs, deltays, errors
+
 
 @boost
 def correl_numpy(im0: A2df32, im1: A2df32, disp_max: int):
@@ -636,14 +936,139 @@ def _like_fftshift(arr: A2dC):
     return arr
 
 
+def _like_fftshift_stack(arr):
+    """Equivalent of :func:`_like_fftshift` for a stack of 2d arrays"""
+    return np.fft.fftshift(arr[:, ::-1, ::-1], axes=(1, 2))
+
+
 class CorrelFFTWithOperBase(CorrelFFTBase):
 
     FFTClass: object
+    FFTClassStack: object = None
 
     def _finalize_init(self):
         CorrelFFTBase._finalize_init(self)
-        n0, n1 = self.im0_shape
+        if self.pad_to_fast_sizes:
+            # even sizes since the energies computed from the half spectra
+            # (real FFTs) assume that the last mode is the Nyquist mode
+            self.shape_fft = tuple(
+                compute_fast_size(n, even=True) for n in self.im0_shape
+            )
+        else:
+            self.shape_fft = tuple(self.im0_shape)
+        self._is_padded = self.shape_fft != tuple(self.im0_shape)
+        # start indices of the correlation maps in the padded maps
+        self._start_crop_correl = tuple(
+            m // 2 - n // 2 for m, n in zip(self.shape_fft, self.im0_shape)
+        )
+        n0, n1 = self.shape_fft
         self.oper = self.FFTClass(n1, n0)
+        # operators of the current thread
+        self._local = local()
+
+    def _get_oper_stack(self, nb_fields, nb_fields_oper=None):
+        """Get (and create if needed) the operator for a stack of fields
+
+        The operators can transform stacks with less fields than their number
+        of fields, so `nb_fields_oper` (the size of the full batches) avoids
+        creating an operator (and a FFTW plan) for each length of stack.
+
+        The operators (and their buffers) are not shared between threads.
+
+        """
+        if nb_fields_oper is not None:
+            nb_fields = max(nb_fields, nb_fields_oper)
+        try:
+            opers_stack = self._local.opers_stack
+        except AttributeError:
+            # the operators are freed with their thread
+            opers_stack = self._local.opers_stack = {}
+        try:
+            return opers_stack[nb_fields]
+        except KeyError:
+            pass
+        n0, n1 = self.shape_fft
+        oper = opers_stack[nb_fields] = self.FFTClassStack(n1, n0, nb_fields)
+        return oper
+
+    def _pad_windows(self, ims):
+        """Pad (stacks of) windows with zeros to `self.shape_fft`
+
+        The mean of each window is removed before padding so that the result
+        is consistent with the correlations without padding (for which the
+        mean is removed by zeroing the mode (0, 0) of the spectra).
+
+        """
+        n0, n1 = self.im0_shape
+        padded = np.zeros(ims.shape[:-2] + self.shape_fft, dtype=np.float32)
+        padded[..., :n0, :n1] = ims
+        padded[..., :n0, :n1] -= ims.mean(axis=(-2, -1), keepdims=True)
+        return padded
+
+    def _crop_correls(self, correls):
+        """Crop (stacks of) padded correlation maps to `self.im0_shape`"""
+        start0, start1 = self._start_crop_correl
+        n0, n1 = self.im0_shape
+        return np.ascontiguousarray(
+            correls[..., start0 : start0 + n0, start1 : start1 + n1]
+        )
+
+    @property
+    def can_use_spectra(self):
+        """True if the correlations can be computed from stacks of spectra"""
+        return self.FFTClassStack is not None
+
+    def compute_spectra_stack(self, ims, nb_fields_oper=None):
+        """Compute the spectra (and their energies) of a stack of images.
+
+        The spectra can be used with
+        :meth:`compute_correls_stack_from_spectra`, for example to reuse the
+        spectra of windows of an image used for many correlations.
+
+        `nb_fields_oper` is the number of fields of the FFT operator (the size
+        of the full batches). The shorter stacks are padded with zeros.
+
+        """
+        if self._is_padded:
+            ims = self._pad_windows(ims)
+        oper = self._get_oper_stack(len(ims), nb_fields_oper)
+        spectra = oper.fft(ims)
+        spectra[:, 0, 0] = 0.0
+        energies = oper.compute_energies_from_fourier(spectra)
+        return spectra, energies
+
+    def compute_correls_stack_from_spectra(
+        self, spectra0, energies0, spectra1, energies1, nb_fields_oper=None
+    ):
+        """Compute the correlations from 2 stacks of spectra.
+
+        The input spectra are not modified.
+
+        """
+        oper = self._get_oper_stack(len(spectra0), nb_fields_oper)
+        norms = np.sqrt(4 * energies0 * energies1) * oper.coef_norm_correl
+        product = np.conjugate(spectra0)
+        product *= spectra1
+        correls = _like_fftshift_stack(oper.ifft(product))
+        if self._is_padded:
+            correls = self._crop_correls(correls)
+        return correls, norms
+
+    def compute_correls_stack(self, ims0, ims1, nb_fields_oper=None):
+        """Compute the correlations from 2 stacks of images.
+
+        All the forward and inverse FFTs of the stack are computed with one
+        call to the FFT library.
+
+        """
+        if not self.can_use_spectra or len(ims0) == 0:
+            return super().compute_correls_stack(ims0, ims1)
+
+        spectra0, energies0 = self.compute_spectra_stack(ims0, nb_fields_oper)
+        spectra1, energies1 = self.compute_spectra_stack(ims1, nb_fields_oper)
+        return self.compute_correls_stack_from_spectra(
+            spectra0, energies0, spectra1, energies1, nb_fields_oper
+        )
 
     def __call__(self, im0, im1):
         """Compute the correlation from images.
@@ -651,6 +1076,9 @@ class CorrelFFTWithOperBase(CorrelFFTBase):
         Warning: important for perf, so use Pythran
 
         """
+        if self._is_padded:
+            im0 = self._pad_windows(im0)
+            im1 = self._pad_windows(im1)
         fft_im0 = self.oper.fft(im0)
         fft_im0[0, 0] = 0.0
         fft_im1 = self.oper.fft(im1)
@@ -658,14 +1086,17 @@ class CorrelFFTWithOperBase(CorrelFFTBase):
         energy0 = self.oper.compute_energy_from_fourier(fft_im0)
         energy1 = self.oper.compute_energy_from_fourier(fft_im1)
         norm = sqrt(4 * energy0 * energy1) * self.oper.coef_norm_correl
-        correl = self.oper.ifft(fft_im0.conj() * fft_im1)
-        return _like_fftshift(correl), norm
+        correl = _like_fftshift(self.oper.ifft(fft_im0.conj() * fft_im1))
+        if self._is_padded:
+            correl = self._crop_correls(correl)
+        return correl, norm
 
 
 class CorrelFFTNumpy(CorrelFFTWithOperBase):
     """Correlations using numpy.fft."""
 
     FFTClass = NumpyFFT2DReal2Complex
+    FFTClassStack = NumpyFFT2DReal2ComplexStack
     _tag = "np.fft"
 
     def __call__(self, im0, im1):
@@ -674,6 +1105,9 @@ class CorrelFFTNumpy(CorrelFFTWithOperBase):
         Warning: important for perf, so use Pythran
 
         """
+        if self._is_padded:
+            im0 = self._pad_windows(im0)
+            im1 = self._pad_windows(im1)
         fft_im0 = self.oper.fft(im0)
         fft_im0[0, 0] = 0.0
         fft_im1 = self.oper.fft(im1)
@@ -682,13 +1116,17 @@ class CorrelFFTNumpy(CorrelFFTWithOperBase):
         energy0 = self.oper.compute_energy_from_fourier(fft_im0)
         energy1 = self.oper.compute_energy_from_fourier(fft_im1)
         norm = sqrt(4 * energy0 * energy1) * self.oper.coef_norm_correl
-        return _like_fftshift(np.ascontiguousarray(correl)), norm
+        correl = _like_fftshift(np.ascontiguousarray(correl))
+        if self._is_padded:
+            correl = self._crop_correls(correl)
+        return correl, norm
 
 
 class CorrelFFTW(CorrelFFTWithOperBase):
     """Correlations using fluidimage.fft.FFTW2DReal2Complex"""
 
     FFTClass = FFTW2DReal2Complex
+    FFTClassStack = FFTW2DReal2ComplexStack
     _tag = "fftw"
 
 
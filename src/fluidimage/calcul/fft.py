@@ -4,6 +4,16 @@
 Warning: it is more efficient to use not normalized FFT, so we'll do
 that.
 
+The FFTW wisdom (information on the plans already measured) can be kept on
+disk so that the plans are measured only once for all processes. This is
+enabled by setting the environment variable ``FLUIDIMAGE_FFTW_WISDOM`` to the
+path of the wisdom file (for example
+``~/.local/share/fluidimage/fftw_wisdom``). The wisdom is then loaded at
+import and saved once at the end of each process (see
+:func:`save_fftw_wisdom`). The planner effort can be chosen with the
+environment variable ``FLUIDIMAGE_FFTW_PLANNER_EFFORT`` (default
+``FFTW_MEASURE``, can be ``FFTW_PATIENT``).
+
 .. autoclass:: CUFFT2DReal2Complex
    :members:
    :private-members:
@@ -24,9 +34,24 @@ that.
    :members:
    :private-members:
 
+.. autoclass:: FFTW2DReal2ComplexStack
+   :members:
+   :private-members:
+
+.. autoclass:: NumpyFFT2DReal2ComplexStack
+   :members:
+   :private-members:
+
+.. autofunction:: compute_fast_size
+
+.. autofunction:: save_fftw_wisdom
+
 """
 
+import atexit
+import os
 from abc import ABC, abstractmethod
+from pathlib import Path
 
 import numpy as np
 import numpy.fft as np_fft
@@ -35,7 +60,7 @@ from transonic import Array, Type, boost
 try:
     import pyfftw
 except ImportError:
-    pass
+    pyfftw = None
 
 try:
     from reikna.cluda import any_api, cuda_api, ocl_api
@@ -65,8 +90,95 @@ else:
 # small size used for PIV
 nthreads = 1
 
+planner_effort = os.environ.get(
+    "FLUIDIMAGE_FFTW_PLANNER_EFFORT", "FFTW_MEASURE"
+)
+path_fftw_wisdom = os.environ.get("FLUIDIMAGE_FFTW_WISDOM")
+if path_fftw_wisdom:
+    path_fftw_wisdom = Path(path_fftw_wisdom).expanduser()
+else:
+    path_fftw_wisdom = None
+
+# wisdom already saved or loaded (to avoid useless writes)
+_fftw_wisdom_known = None
+
+
+def _get_fftw_wisdom_entries():
+    """Export the FFTW wisdom as sets of lines (the order is not stable)"""
+    return tuple(frozenset(part.splitlines()) for part in pyfftw.export_wisdom())
+
+
+def _load_fftw_wisdom():
+    """Import the FFTW wisdom saved on disk (if any)"""
+    global _fftw_wisdom_known
+    try:
+        wisdom = tuple(path_fftw_wisdom.read_bytes().split(b"\0"))
+    except OSError:
+        return
+    if len(wisdom) != 3:
+        return
+    pyfftw.import_wisdom(wisdom)
+    _fftw_wisdom_known = _get_fftw_wisdom_entries()
+
+
+def save_fftw_wisdom():
+    """Save the FFTW wisdom on disk if new plans have been measured
+
+    Nothing is done if the wisdom is not kept on disk (environment variable
+    ``FLUIDIMAGE_FFTW_WISDOM`` not set). Called at exit and by the executors
+    at the end of their computations.
+
+    The wisdom saved by other processes is merged before writing. The file is
+    replaced atomically so that concurrent processes never read a partial file.
+
+    """
+    global _fftw_wisdom_known
+    if pyfftw is None or path_fftw_wisdom is None:
+        return
+    if _get_fftw_wisdom_entries() == _fftw_wisdom_known:
+        return
+    _load_fftw_wisdom()
+    wisdom = pyfftw.export_wisdom()
+    path_tmp = path_fftw_wisdom.with_name(
+        f"{path_fftw_wisdom.name}.{os.getpid()}.tmp"
+    )
+    try:
+        path_fftw_wisdom.parent.mkdir(parents=True, exist_ok=True)
+        path_tmp.write_bytes(b"\0".join(wisdom))
+        os.replace(path_tmp, path_fftw_wisdom)
+    except OSError:
+        return
+    _fftw_wisdom_known = _get_fftw_wisdom_entries()
+
+
+def _create_fftw_plans(arrayX, arrayK, axes):
+    """Create the forward and backward FFTW plans"""
+    fftplan = pyfftw.FFTW(
+        input_array=arrayX,
+        output_array=arrayK,
+        axes=axes,
+        direction="FFTW_FORWARD",
+        flags=(planner_effort,),
+        threads=nthreads,
+    )
+    ifftplan = pyfftw.FFTW(
+        input_array=arrayK,
+        output_array=arrayX,
+        axes=axes,
+        direction="FFTW_BACKWARD",
+        flags=(planner_effort,),
+        threads=nthreads,
+    )
+    return fftplan, ifftplan
+
+
+if pyfftw is not None and path_fftw_wisdom is not None:
+    _load_fftw_wisdom()
+    atexit.register(save_fftw_wisdom)
+
 
 A2d_complex = Array[Type(np.complex64, np.complex128), "2d"]
+A3d_complex = Array[Type(np.complex64, np.complex128), "3d"]
 
 
 @boost
@@ -90,6 +202,24 @@ def _compute_energy_from_fourier(field_fft: A2d_complex, coef_norm: int):
     return 0.5 / coef_norm * result
 
 
+@boost
+def _compute_energies_from_fourier(fields_fft: A3d_complex, coef_norm: int):
+    """Pythran implementation of _compute_energy_from_fourier for a stack"""
+    nb_fields, n0, n1 = fields_fft.shape
+    energies = np.empty(nb_fields)
+    for i_field in range(nb_fields):
+        result = 0.0
+        for i0 in range(n0):
+            result += (
+                abs(fields_fft[i_field, i0, 0]) ** 2
+                + abs(fields_fft[i_field, i0, n1 - 1]) ** 2
+            )
+            for i1 in range(1, n1 - 1):
+                result += 2 * abs(fields_fft[i_field, i0, i1]) ** 2
+        energies[i_field] = 0.5 / coef_norm * result
+    return energies
+
+
 class OperatorFFTBase(ABC):
     """Abstract class for FFT operators"""
 
@@ -218,19 +348,8 @@ class FFTW2DReal2Complex(OperatorFFTBase):
         self.arrayX = pyfftw.empty_aligned(self.shapeX, self.type_real)
         self.arrayK = pyfftw.empty_aligned(self.shapeK, self.type_complex)
 
-        self.fftplan = pyfftw.FFTW(
-            input_array=self.arrayX,
-            output_array=self.arrayK,
-            axes=(0, 1),
-            direction="FFTW_FORWARD",
-            threads=nthreads,
-        )
-        self.ifftplan = pyfftw.FFTW(
-            input_array=self.arrayK,
-            output_array=self.arrayX,
-            axes=(0, 1),
-            direction="FFTW_BACKWARD",
-            threads=nthreads,
+        self.fftplan, self.ifftplan = _create_fftw_plans(
+            self.arrayX, self.arrayK, axes=(0, 1)
         )
 
     def fft(self, field):
@@ -276,9 +395,131 @@ class NumpyFFT2DReal2ComplexFloat64(NumpyFFT2DReal2Complex):
     type_complex = "complex128"
 
 
+class OperatorFFTStackBase(OperatorFFTBase):
+    """Abstract class for FFT operators working on stacks of 2d fields
+
+    The transforms are computed over the last 2 axes of arrays of shape
+    ``(nb_fields, ny, nx)``.
+
+    """
+
+    def __init__(self, nx, ny, nb_fields):
+        super().__init__(nx, ny)
+        self.nb_fields = nb_fields
+        self.shapeX_stack = [nb_fields] + self.shapeX
+        self.shapeK_stack = [nb_fields] + self.shapeK
+
+    def compute_energies_from_fourier(self, fields_fft):
+        """Compute the energies from a stack of fields in Fourier space"""
+        return _compute_energies_from_fourier(fields_fft, self.coef_norm_energy)
+
+    def compute_energy_from_fourier(self, field_fft):
+        return self.compute_energies_from_fourier(field_fft[np.newaxis])[0]
+
+    def compute_energy_from_spatial(self, field):
+        return np.mean(abs(field) ** 2, axis=(-2, -1)) / 2
+
+
+class FFTW2DReal2ComplexStack(OperatorFFTStackBase):
+    """A class to use fftw with float32 on stacks of fields.
+
+    One FFTW plan is used for the whole stack (``axes=(1, 2)``) so that the
+    overhead of the Python calls is paid once per stack. Stacks with less
+    than `nb_fields` fields are padded with zeros. These ffts are NOT
+    normalized (faster)!
+
+    """
+
+    type_real = "float32"
+    type_complex = "complex64"
+
+    def __init__(self, nx, ny, nb_fields):
+        super().__init__(nx, ny, nb_fields)
+
+        self.arrayX = pyfftw.empty_aligned(self.shapeX_stack, self.type_real)
+        self.arrayK = pyfftw.empty_aligned(self.shapeK_stack, self.type_complex)
+
+        self.fftplan, self.ifftplan = _create_fftw_plans(
+            self.arrayX, self.arrayK, axes=(1, 2)
+        )
+
+    def fft(self, fields):
+        nb_fields = len(fields)
+        self.arrayX[:nb_fields] = fields
+        self.arrayX[nb_fields:] = 0.0
+        self.fftplan()
+        return self.arrayK[:nb_fields].copy()
+
+    def ifft(self, fields_fft):
+        nb_fields = len(fields_fft)
+        self.arrayK[:nb_fields] = fields_fft
+        self.arrayK[nb_fields:] = 0.0
+        self.ifftplan(normalise_idft=False)
+        return self.arrayX[:nb_fields].copy()
+
+
+class FFTW2DReal2ComplexStackFloat64(FFTW2DReal2ComplexStack):
+    """A class to use fftw with float64 on stacks of fields."""
+
+    type_real = "float64"
+    type_complex = "complex128"
+
+
+class NumpyFFT2DReal2ComplexStack(OperatorFFTStackBase):
+    """FFT operator using numpy.fft on stacks of fields"""
+
+    def __init__(self, nx, ny, nb_fields):
+        super().__init__(nx, ny, nb_fields)
+        self.coef_norm_correl = self.coef_norm
+        self.coef_norm = 1
+
+    def fft(self, fields):
+        return np_fft.rfft2(fields).astype(self.type_complex, copy=False)
+
+    def ifft(self, fields_fft):
+        return np_fft.irfft2(fields_fft, s=self.shapeX).astype(
+            self.type_real, copy=False
+        )
+
+
+class NumpyFFT2DReal2ComplexStackFloat64(NumpyFFT2DReal2ComplexStack):
+    """FFT operator using numpy.fft on stacks of fields"""
+
+    type_real = "float64"
+    type_complex = "complex128"
+
+
+def compute_fast_size(size, even=False):
+    """Compute the smallest fast FFT size larger or equal to `size`
+
+    The fast sizes are of the form 2**a * 3**b * 5**c * 7**d. If `even` is
+    True, only even sizes are considered.
+
+    """
+    candidate = max(int(size), 1)
+    if even and candidate % 2:
+        candidate += 1
+    step = 2 if even else 1
+    while True:
+        remainder = candidate
+        for factor in (2, 3, 5, 7):
+            while remainder % factor == 0:
+                remainder //= factor
+        if remainder == 1:
+            return candidate
+        candidate += step
+
+
 classes = [
     FFTW2DReal2Complex,
     FFTW2DReal2ComplexFloat64,
     NumpyFFT2DReal2Complex,
     NumpyFFT2DReal2ComplexFloat64,
 ]
+
+classes_stack = [
+    FFTW2DReal2ComplexStack,
+    FFTW2DReal2ComplexStackFloat64,
+    NumpyFFT2DReal2ComplexStack,
+    NumpyFFT2DReal2ComplexStackFloat64,
+]
@@ -8,10 +8,20 @@
 """
 
 import numpy as np
-from transonic import boost
+from transonic import Array, Type, boost
 
 from .errors import PIVError
 
+A3dC = Array[Type(np.float32, np.float64), "3d", "C"]
+
+#: Explanations corresponding to the error codes returned by
+#: :func:`compute_subpix_stack` (0 means no error)
+subpix_error_explanations = {
+    1: "close boundary",
+    2: "wrong subpix",
+    3: "null correlation",
+}
+
 
 @boost
 def compute_subpix_2d_gaussian2(correl: "float32[][]", ix: int, iy: int):
@@ -61,6 +71,151 @@ def compute_subpix_2d_gaussian2(correl: "float32[][]", ix: int, iy: int):
     return deplx, deply, correl_crop
 
 
+def _subpix_centroid(correl, ix, iy, nsubpix):
+    sum_correl = 0.0
+    deplx = 0.0
+    deply = 0.0
+    for i0 in range(2 * nsubpix + 1):
+        for i1 in range(2 * nsubpix + 1):
+            value = correl[iy - nsubpix + i0, ix - nsubpix + i1]
+            sum_correl += value
+            deplx += (i1 - nsubpix) * value
+            deply += (i0 - nsubpix) * value
+    if sum_correl == 0.0:
+        return np.nan, np.nan
+    return deplx / sum_correl, deply / sum_correl
+
+
+def _subpix_2d_gaussian2(correl, ix, iy):
+    correl_crop = np.empty((3, 3))
+    for i0 in range(3):
+        for i1 in range(3):
+            correl_crop[i0, i1] = correl[iy - 1 + i0, ix - 1 + i1]
+
+    correl_crop -= correl_crop.min()
+    correl_crop /= correl_crop.max()
+
+    c10 = 0.0
+    c01 = 0.0
+    c11 = 0.0
+    c20 = 0.0
+    c02 = 0.0
+    for i0 in range(3):
+        for i1 in range(3):
+            value = correl_crop[i0, i1]
+            if value == 0:
+                value = 1e-8
+            log_value = np.log(value)
+            c10 += (i1 - 1) * log_value
+            c01 += (i0 - 1) * log_value
+            c11 += (i1 - 1) * (i0 - 1) * log_value
+            c20 += (3 * (i1 - 1) ** 2 - 2) * log_value
+            c02 += (3 * (i0 - 1) ** 2 - 2) * log_value
+
+    c10 /= 6
+    c01 /= 6
+    c11 /= 4
+    c20 /= 6
+    c02 /= 6
+    deplx = (c11 * c01 - 2 * c10 * c02) / (4 * c20 * c02 - c11**2)
+    deply = (c11 * c10 - 2 * c01 * c20) / (4 * c20 * c02 - c11**2)
+    return deplx, deply
+
+
+@boost
+def compute_subpix_stack(
+    correls: A3dC,
+    ixs: "int32[]",
+    iys: "int32[]",
+    method_index: int,
+    nsubpix: int,
+    matrix_inv: "float64[][]",
+):
+    """Compute the subpixel positions of the peaks of a stack of correlations
+
+    `method_index` is the index of the method in :attr:`SubPix.methods`. The
+    fallbacks are the same as in :meth:`SubPix.compute_subpix`.
+
+    Returns
+    -------
+
+    ixs_subpix, iys_subpix : positions of the peaks (equal to the input
+      indices if there is an error)
+
+    error_codes : 0 if no error (see subpix_error_explanations)
+
+    nb_too_large_depl : number of too large subpixel displacements
+
+    """
+    nb_correls, ny, nx = correls.shape
+    ixs_subpix = np.empty(nb_correls)
+    iys_subpix = np.empty(nb_correls)
+    error_codes = np.zeros(nb_correls, dtype=np.int32)
+    nb_too_large_depl = 0
+    size_crop = 2 * nsubpix + 1
+    log_crop = np.empty(size_crop * size_crop)
+    depl2_max = 2 * (0.5 + nsubpix) ** 2
+
+    for index in range(nb_correls):
+        ix = ixs[index]
+        iy = iys[index]
+        ixs_subpix[index] = ix
+        iys_subpix[index] = iy
+
+        if (
+            iy - nsubpix < 0
+            or iy + nsubpix + 1 > ny
+            or ix - nsubpix < 0
+            or ix + nsubpix + 1 > nx
+        ):
+            error_codes[index] = 1
+            continue
+
+        correl = correls[index]
+        method = method_index
+        deplx = 0.0
+        deply = 0.0
+
+        if method == 0:
+            # 2d_gaussian
+            for i0 in range(size_crop):
+                for i1 in range(size_crop):
+                    value = correl[iy - nsubpix + i0, ix - nsubpix + i1]
+                    if value <= 0.0:
+                        value = 1e-6
+                    log_crop[i0 * size_crop + i1] = np.log(value)
+            coef = np.dot(matrix_inv, log_crop)
+            if coef[0] > 0 or coef[1] > 0:
+                method = 2
+            else:
+                deplx = coef[2] / (-2 * coef[0])
+                deply = coef[3] / (-2 * coef[1])
+                if np.isnan(deplx) or np.isnan(deply):
+                    method = 2
+
+        if method == 1:
+            deplx, deply = _subpix_2d_gaussian2(correl, ix, iy)
+            if deplx**2 + deply**2 > depl2_max:
+                nb_too_large_depl += 1
+                method = 2
+
+        if method == 2:
+            deplx, deply = _subpix_centroid(correl, ix, iy, nsubpix)
+            if np.isnan(deplx):
+                error_codes[index] = 3
+                continue
+
+        if deplx**2 + deply**2 > depl2_max:
+            nb_too_large_depl += 1
+            error_codes[index] = 2
+            continue
+
+        ixs_subpix[index] = deplx + ix
+        iys_subpix[index] = deply + iy
+
+    return ixs_subpix, iys_subpix, error_codes, nb_too_large_depl
+
+
 class SubPix:
     """Subpixel finder
 
@@ -193,6 +348,11 @@ class SubPix:
             ny, nx = correl_crop.shape
 
             sum_correl = np.sum(correl_crop)
+            if sum_correl == 0:
+                raise PIVError(
+                    explanation="null correlation",
+                    result_compute_subpix=(iy, ix),
+                )
 
             deplx = np.sum(self.X_centroid * correl_crop) / sum_correl
             deply = np.sum(self.Y_centroid * correl_crop) / sum_correl
@@ -216,3 +376,47 @@ class SubPix:
             )
 
         return deplx + ix, deply + iy
+
+    def compute_subpix_stack(self, correls, ixs, iys):
+        """Find the peaks of a stack of correlations with subpixel accuracy
+
+        Parameters
+        ----------
+
+        correls: numpy.ndarray (3d)
+
+        ixs: numpy.ndarray of integers
+
+        iys: numpy.ndarray of integers
+
+        Returns
+        -------
+
+        ixs, iys : numpy.ndarray
+
+        errors : dict
+
+          Explanations of the errors indexed by the indices in the stack.
+
+        """
+        if self.method not in self.methods:
+            raise ValueError(f"method has to be in {self.methods}")
+
+        ixs_subpix, iys_subpix, error_codes, nb_too_large_depl = (
+            compute_subpix_stack(
+                np.ascontiguousarray(correls),
+                np.ascontiguousarray(ixs, dtype=np.int32),
+                np.ascontiguousarray(iys, dtype=np.int32),
+                self.methods.index(self.method),
+                self.n,
+                self.Minv_subpix,
+            )
+        )
+        self.count_too_large_depl += nb_too_large_depl
+
+        errors = {
+            index: subpix_error_explanations[code]
+            for index, code in enumerate(error_codes.tolist())
+            if code != 0
+        }
+        return ixs_subpix, iys_subpix, errors
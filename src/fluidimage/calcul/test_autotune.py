@@ -0,0 +1,36 @@
+from fluidimage.calcul.autotune import (
+    benchmark_methods_correl,
+    get_method_correl_auto,
+)
+from fluidimage.config import load_autotune_profile
+
+
+def test_benchmark_methods_correl():
+    timings = benchmark_methods_correl(
+        (16, 16), nb_windows=4, nb_repeat=1, methods=["np.fft", "oups"]
+    )
+    assert list(timings) == ["np.fft"]
+    assert timings["np.fft"] > 0
+
+
+def test_get_method_correl_auto(tmp_path, monkeypatch):
+    path_profile = tmp_path / "profile.json"
+    method = get_method_correl_auto(
+        (16, 16), nb_windows=4, path_profile=path_profile
+    )
+    profile = load_autotune_profile(path_profile)
+    (decision,) = profile["correl"].values()
+    assert decision["method"] == method
+    assert method in decision["timings"]
+
+    # the tuning is not done again
+    def benchmark(*args, **kwargs):
+        raise RuntimeError
+
+    monkeypatch.setattr(
+        "fluidimage.calcul.autotune.benchmark_methods_correl", benchmark
+    )
+    assert (
+        get_method_correl_auto((16, 16), nb_windows=4, path_profile=path_profile)
+        == method
+    )
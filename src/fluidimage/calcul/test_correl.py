@@ -1,7 +1,11 @@
+import gc
 import logging
 import unittest
+import weakref
+from threading import Thread
 
 import numpy as np
+import pytest
 
 from fluidimage.calcul.correl import (
     CorrelFFTBase,
@@ -11,6 +15,9 @@ from fluidimage.calcul.correl import (
     _like_fftshift,
     correlation_classes,
 )
+from fluidimage.calcul.errors import PIVError
+from fluidimage.calcul.fft import compute_fast_size
+from fluidimage.calcul.subpix import SubPix
 from fluidimage.synthetic import make_synthetic_images
 
 # config_logging('debug')
@@ -230,6 +237,236 @@ for method, cls in classes_real_space.items():
     exec("TestCorrel2.test_correl_images_diff_sizes_" + method + " = _test2")
 
 
+for method, cls in classes.items():
+
+    def _test_stack(self, cls=cls, name=method):
+        correl = cls(self.im0.shape, self.im1.shape)
+
+        ims0 = np.array([self.im0, self.im0, self.im1], dtype=np.float32)
+        ims1 = np.array([self.im0, self.im1, self.im0], dtype=np.float32)
+
+        correls, norms = correl.compute_correls_stack(ims0, ims1)
+        assert correls.shape[0] == norms.shape[0] == 3
+
+        for c_stack, norm_stack, im0, im1 in zip(correls, norms, ims0, ims1):
+            c, norm = correl(im0, im1)
+            assert np.allclose(norm_stack, norm, rtol=1e-4)
+            assert np.allclose(c_stack, c, rtol=1e-3, atol=1e-3 * abs(c).max())
+
+        # the stack is padded to the number of fields of the operator
+        correls_oper, norms_oper = correl.compute_correls_stack(
+            ims0, ims1, nb_fields_oper=8
+        )
+        assert np.allclose(norms_oper, norms, rtol=1e-4)
+        assert np.allclose(
+            correls_oper, correls, rtol=1e-3, atol=1e-3 * abs(correls).max()
+        )
+
+        correls, norms = correl.compute_correls_stack(ims0[:0], ims1[:0])
+        assert correls.shape[0] == norms.shape[0] == 0
+
+    exec("TestCorrel.test_correls_stack_" + method + " = _test_stack")
+
+
+for method, cls in classes.items():
+
+    def _test_peaks_stack(self, cls=cls, name=method):
+        kwargs = {"nb_peaks_to_search": 3, "particle_radius": 2}
+        if issubclass(cls, CorrelFFTBase):
+            kwargs["displacement_max"] = "40%"
+        correl = cls(self.im0.shape, self.im1.shape, **kwargs)
+
+        ims0 = np.array([self.im0, self.im1, self.im0], dtype=np.float32)
+        ims1 = np.array([self.im1, self.im0, self.im0], dtype=np.float32)
+        # a map with its maximum on the boundary
+        ims1[0, :, :] = 0.0
+        correls, norms = correl.compute_correls_stack(ims0, ims1)
+
+        (
+            deltaxs,
+            deltays,
+            correls_max,
+            errors,
+            other_peaks,
+        ) = correl.compute_displacements_from_correls_stack(correls, norms)
+
+        for index, (c, norm) in enumerate(zip(correls, norms)):
+            try:
+                (
+                    dx,
+                    dy,
+                    correl_max,
+                    other,
+                ) = correl.compute_displacements_from_correl(c.copy(), norm)
+            except PIVError as error:
+                assert errors[index] == error.explanation
+                dx, dy, correl_max = error.results
+                other = None
+            else:
+                assert index not in errors
+            assert (deltaxs[index], deltays[index]) == (dx, dy)
+            assert np.allclose(correls_max[index], correl_max, equal_nan=True)
+            assert other_peaks[index] == other
+
+        deltaxs_subpix, deltays_subpix, errors_subpix = correl.apply_subpix_stack(
+            deltaxs, deltays, correls
+        )
+        for index, c in enumerate(correls):
+            if index in errors:
+                continue
+            try:
+                dx, dy = correl.apply_subpix(deltaxs[index], deltays[index], c)
+            except PIVError as error:
+                assert errors_subpix[index] == error.explanation
+            else:
+                assert np.allclose(
+                    (deltaxs_subpix[index], deltays_subpix[index]),
+                    (dx, dy),
+                    atol=1e-4,
+                )
+
+    exec("TestCorrel.test_peaks_stack_" + method + " = _test_peaks_stack")
+
+
+def test_peak_near_edge():
+    correl = CorrelPythran(
+        (32, 32), (32, 32), particle_radius=3, nb_peaks_to_search=2
+    )
+    ims = np.ones((1, 32, 32), dtype=np.float32)
+    correls, _ = correl.compute_correls_stack(ims, ims)
+    # the maximum is on the edge, the second chance has to find the other peak
+    c = np.zeros_like(correls[0])
+    c[0, 5] = 10.0
+    c[12, 14] = 5.0
+    dx, dy, correl_max, other = correl.compute_displacements_from_correl(
+        c.copy(), 1.0
+    )
+    assert (dx, dy, correl_max) == (1, 3, 5.0)
+    assert other == []
+
+    (
+        deltaxs,
+        deltays,
+        correls_max,
+        errors,
+        other_peaks,
+    ) = correl.compute_displacements_from_correls_stack(c[None], np.ones(1))
+    assert (deltaxs[0], deltays[0], correls_max[0]) == (dx, dy, correl_max)
+    assert not errors
+    assert other_peaks[0] == other
+
+
+@pytest.mark.parametrize("method", SubPix.methods)
+def test_subpix_stack(method):
+    nsubpix = None if method == "2d_gaussian2" else 2
+    subpix = SubPix(method, nsubpix)
+
+    generator = np.random.default_rng(0)
+    n0, n1 = 24, 20
+    i0s, i1s = np.meshgrid(np.arange(n0), np.arange(n1), indexing="ij")
+    correls = []
+    ixs = []
+    iys = []
+    for _ in range(10):
+        x0 = generator.uniform(0, n1)
+        y0 = generator.uniform(0, n0)
+        correl = np.exp(-((i1s - x0) ** 2 + (i0s - y0) ** 2) / 4)
+        correl += 0.05 * generator.random(correl.shape)
+        correls.append(correl.astype(np.float32))
+        iy, ix = np.unravel_index(correl.argmax(), correl.shape)
+        ixs.append(ix)
+        iys.append(iy)
+    correls = np.array(correls)
+
+    ixs_subpix, iys_subpix, errors = subpix.compute_subpix_stack(
+        correls, ixs, iys
+    )
+
+    for index, (correl, ix, iy) in enumerate(zip(correls, ixs, iys)):
+        try:
+            ix_subpix, iy_subpix = subpix.compute_subpix(correl, ix, iy)
+        except PIVError as error:
+            assert errors[index] == error.explanation
+            assert (ixs_subpix[index], iys_subpix[index]) == (ix, iy)
+        else:
+            assert index not in errors
+            assert np.allclose(
+                (ixs_subpix[index], iys_subpix[index]),
+                (ix_subpix, iy_subpix),
+                atol=1e-4,
+            )
+
+
+def test_subpix_stack_null_correl():
+    subpix = SubPix("centroid", 1)
+    correls = np.zeros((2, 8, 8), dtype=np.float32)
+    correls[1, 3:6, 3:6] = 1.0
+
+    ixs_subpix, iys_subpix, errors = subpix.compute_subpix_stack(
+        correls, [2, 4], [2, 4]
+    )
+    assert errors == {0: "null correlation"}
+    assert (ixs_subpix[0], iys_subpix[0]) == (2, 2)
+    assert (ixs_subpix[1], iys_subpix[1]) == (4, 4)
+
+    with pytest.raises(PIVError):
+        subpix.compute_subpix(correls[0], 2, 2)
+
+
+@pytest.mark.parametrize("method", ["fftw", "np.fft"])
+def test_pad_to_fast_sizes(method):
+    # windows large enough (with enough particles) to get a reliable peak
+    np.random.seed(0)
+    shape = (45, 53)
+    displacements = np.array([2.3, -1.6])
+    im0, im1 = make_synthetic_images(
+        displacements, 200, shape_im0=shape, epsilon=0.0
+    )
+    cls = correlation_classes[method]
+    correl_ref = cls(shape, shape, displacement_max="40%")
+    correl = cls(shape, shape, displacement_max="40%", pad_to_fast_sizes=True)
+    assert correl.shape_fft == (48, 54)
+
+    map_ref, norm_ref = correl_ref(im0, im1)
+    map_padded, norm = correl(im0, im1)
+    assert map_padded.shape == map_ref.shape
+    # same normalization (up to the wrap-around avoided with padding)
+    assert np.allclose(
+        np.nanmax(map_padded) / norm, np.nanmax(map_ref) / norm_ref, atol=0.05
+    )
+
+    dx, dy, correl_max, _ = correl.compute_displacements_from_correl(
+        map_padded, norm
+    )
+    dx, dy = correl.apply_subpix(dx, dy, map_padded)
+    assert np.allclose((dx, dy), displacements, atol=0.5)
+    assert 0.5 < correl_max <= 1.0
+
+    correls, norms = correl.compute_correls_stack(
+        np.array([im0, im0]), np.array([im1, im1])
+    )
+    assert np.allclose(correls[1] / norms[1], map_padded / norm, atol=1e-4)
+
+    correl = cls((16, 16), (16, 16), pad_to_fast_sizes=True)
+    assert not correl._is_padded
+
+
+def test_opers_stack_freed_with_threads():
+    correl = correlation_classes["np.fft"]((16, 16), (16, 16))
+    ims = np.ones((3, 16, 16), dtype=np.float32)
+    refs_opers = []
+
+    def compute():
+        correl.compute_correls_stack(ims, ims)
+        refs_opers.append(weakref.ref(correl._local.opers_stack[3]))
+
+    thread = Thread(target=compute)
+    thread.start()
+    thread.join()
+    gc.collect()
+    assert refs_opers[0]() is None
+
+
 def _test_like_fftshift(n0, n1):
     correl = np.reshape(np.arange(n0 * n1, dtype=np.float32), (n0, n1))
     assert np.allclose(
@@ -238,6 +475,16 @@ def _test_like_fftshift(n0, n1):
     )
 
 
+def test_compute_fast_size():
+    sizes = (1, 11, 13, 16, 17, 23, 97)
+    assert [compute_fast_size(n) for n in sizes] == [1, 12, 14, 16, 18, 24, 98]
+    assert [compute_fast_size(n, even=True) for n in (13, 25, 27)] == [
+        14,
+        28,
+        28,
+    ]
+
+
 def test_like_fftshift():
     _test_like_fftshift(24, 32)
     _test_like_fftshift(21, 32)
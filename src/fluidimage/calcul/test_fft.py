@@ -2,7 +2,12 @@ import numpy as np
 import pytest
 from numpy.random import PCG64, Generator
 
-from fluidimage.calcul.fft import _compute_energy_from_fourier, classes
+from fluidimage.calcul.fft import (
+    _compute_energies_from_fourier,
+    _compute_energy_from_fourier,
+    classes,
+    classes_stack,
+)
 
 
 @pytest.mark.parametrize("cls", classes)
@@ -87,3 +92,71 @@ def test_compute_energy_from_fourier(dtype):
 
     energy = _compute_energy_from_fourier(field_fft, coef_norm)
     assert energy == pytest.approx(expected)
+
+
+@pytest.mark.parametrize("cls", classes_stack)
+def test_fft_stack(cls):
+    nx, ny, nb_fields = 20, 24, 5
+    oper = cls(nx, ny, nb_fields)
+
+    generator = Generator(PCG64())
+    arrs = generator.random(nb_fields * nx * ny, dtype=oper.type_real)
+    arrs = arrs.reshape(oper.shapeX_stack)
+
+    arrs_fft = oper.fft(arrs)
+    assert list(arrs_fft.shape) == oper.shapeK_stack
+    assert np.allclose(arrs_fft[2], np.fft.rfft2(arrs[2]), rtol=1e-4, atol=1e-4)
+
+    energiesX = oper.compute_energy_from_spatial(arrs)
+    energiesK = oper.compute_energies_from_fourier(arrs_fft)
+    assert np.allclose(energiesX, energiesK, rtol=1e-4)
+
+    back = oper.ifft(arrs_fft) / oper.coef_norm
+    assert np.allclose(arrs, back, rtol=8e-05, atol=1e-04)
+
+    # stacks with less fields than the operator
+    arrs_fft = oper.fft(arrs[:3])
+    assert arrs_fft.shape[0] == 3
+    assert np.allclose(arrs_fft[2], np.fft.rfft2(arrs[2]), rtol=1e-4, atol=1e-4)
+    back = oper.ifft(arrs_fft) / oper.coef_norm
+    assert np.allclose(arrs[:3], back, rtol=8e-05, atol=1e-04)
+
+
+def test_compute_energies_from_fourier():
+    coef_norm = 10
+    generator = Generator(PCG64())
+    fields_fft = generator.random((3, 12, 8)) + 1j * generator.random((3, 12, 8))
+    fields_fft = fields_fft.astype(np.complex64)
+    energies = _compute_energies_from_fourier(fields_fft, coef_norm)
+    for field_fft, energy in zip(fields_fft, energies):
+        assert energy == pytest.approx(
+            _compute_energy_from_fourier(field_fft, coef_norm)
+        )
+
+
+def test_fftw_wisdom(tmp_path, monkeypatch):
+    from fluidimage.calcul import fft
+
+    path_wisdom = tmp_path / "fftw_wisdom"
+    monkeypatch.setattr(fft, "path_fftw_wisdom", path_wisdom)
+    monkeypatch.setattr(fft, "_fftw_wisdom_known", None)
+
+    # the wisdom is saved only once per process
+    fft.FFTW2DReal2ComplexStack(18, 22, 3)
+    assert not path_wisdom.exists()
+    fft.save_fftw_wisdom()
+    assert path_wisdom.exists()
+    wisdom = fft.pyfftw.export_wisdom()
+    entries = fft._get_fftw_wisdom_entries()
+    assert len(path_wisdom.read_bytes().split(b"\0")) == 3
+
+    # nothing new: the file is not written again
+    path_wisdom.unlink()
+    fft.FFTW2DReal2ComplexStack(18, 22, 3)
+    fft.save_fftw_wisdom()
+    assert not path_wisdom.exists()
+
+    fft.pyfftw.forget_wisdom()
+    path_wisdom.write_bytes(b"\0".join(wisdom))
+    fft._load_fftw_wisdom()
+    assert fft._get_fftw_wisdom_entries() == entries
@@ -1,7 +1,10 @@
 """Handle Fluidimage configuration"""
 
+import json
 import os
+import platform
 from configparser import ConfigParser
+from pathlib import Path
 
 
 def get_config():
@@ -26,3 +29,57 @@ def get_config():
         config_dict[section] = section_dict
 
     return config_dict
+
+
+def get_path_autotune_profile():
+    """Get the path of the autotuning profile of this machine
+
+    The default path (in the user data directory) can be changed in
+    .fluidimagerc with::
+
+      [autotune]
+      path_profile = ~/path/to/profile.json
+
+    """
+    try:
+        path = get_config()["autotune"]["path_profile"]
+    except KeyError:
+        # local import to avoid a circular import
+        from fluidimage import _get_user_data_dir
+
+        name = f"autotune_{platform.node() or 'unknown'}.json"
+        return _get_user_data_dir("fluidimage") / name
+    return Path(path).expanduser()
+
+
+def load_autotune_profile(path=None):
+    """Load the autotuning profile of this machine (empty dict if absent)"""
+    if path is None:
+        path = get_path_autotune_profile()
+    try:
+        with open(path, encoding="utf-8") as file:
+            profile = json.load(file)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(profile, dict):
+        return {}
+    return profile
+
+
+def save_autotune_profile(profile, path=None):
+    """Save the autotuning profile of this machine
+
+    The file is replaced atomically (processes can tune concurrently).
+
+    """
+    if path is None:
+        path = get_path_autotune_profile()
+    path = Path(path)
+    path_tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path_tmp, "w", encoding="utf-8") as file:
+            json.dump(profile, file, indent=2, sort_keys=True)
+        os.replace(path_tmp, path)
+    except OSError:
+        pass
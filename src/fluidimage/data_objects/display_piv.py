@@ -50,8 +50,8 @@ class DisplayPIV:
 
         if (
             show_correl
-            and hasattr(piv_results, "correls")
-            and piv_results.correls
+            and getattr(piv_results, "correls", None) is not None
+            and len(piv_results.correls) > 0
         ):
             self.show_correl = True
         else:
@@ -342,7 +342,7 @@ class DisplayPIV:
             ax2 = self.ax1
             ax2.cla()
             alphac = result.correls[ind_all]
-            alphac_max = alphac.max()
+            alphac_max = np.nanmax(alphac)
             correl = correl_max / alphac_max * alphac
 
             ax2.imshow(correl, origin="lower", interpolation="none", vmin=0)
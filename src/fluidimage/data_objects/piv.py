@@ -5,6 +5,10 @@
    :members:
    :private-members:
 
+.. autoclass:: CorrelPatches
+   :members:
+   :private-members:
+
 .. autoclass:: HeavyPIVResults
    :members:
    :private-members:
@@ -24,12 +28,14 @@ import os
 import h5netcdf
 import h5py
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 
 from fluidimage import ParamContainer
 from fluidimage import __version__ as fluidimage_version
 from fluidimage import imread
 from fluidimage._version import hg_rev
 from fluidimage.util import safe_eval
+from fluidimage.util.containers import split_name_frame
 
 from .display_piv import DisplayPIV
 
@@ -58,9 +64,13 @@ def get_name_piv(serie, prefix="piv"):
 
 
 def get_name_bos(name, serie):
+    # frame of a container (for example "movie.h5[0042]")
+    name, index_frame = split_name_frame(name)
     name = name[len(serie.base_name) :]
     if serie.extension_file is not None:
         name = name[: -len(serie.extension_file) - 1]
+    if index_frame is not None:
+        name += f"_{index_frame}"
     return "bos" + name + ".h5"
 
 
@@ -165,6 +175,15 @@ class ArrayCouple(DataObject):
 
         return self.arrays
 
+    @property
+    def nbytes(self):
+        """Number of bytes of the arrays kept in memory"""
+        try:
+            arrays = self.arrays
+        except AttributeError:
+            return 0
+        return sum(arr.nbytes for arr in arrays)
+
     def save(self, path=None, hdf5_parent=None):
         if path is not None:
             raise NotImplementedError
@@ -211,6 +230,105 @@ class ArrayCoupleBOS(ArrayCouple):
         return self.names[-1]
 
 
+class CorrelPatches(DataObject):
+    """Patches of the correlation maps around the correlation peaks.
+
+    Memory-lean alternative to the list of the full correlation maps. Only
+    small patches centered on the main and secondary peaks are kept.
+    Indexing returns a full correlation map filled with nan outside the
+    patches (or None if no correlation was computed for this vector), so
+    that the subpixel methods and the viewers can use it as a normal map.
+
+    Parameters
+    ----------
+
+    nb_vectors : int
+
+    nb_peaks : int
+
+      Number of patches per vector (main peak + secondary peaks).
+
+    radius : int
+
+      Half size of the patches (shape ``(2*radius+1, 2*radius+1)``).
+
+    """
+
+    def __init__(self, nb_vectors, nb_peaks, radius):
+        self.radius = radius
+        self.shape_correl = None
+        size = 2 * radius + 1
+        self.patches = np.full(
+            (nb_vectors, nb_peaks, size, size), np.nan, dtype=np.float32
+        )
+        self.indices = np.full((nb_vectors, nb_peaks, 2), -1, dtype=np.int32)
+
+    def __len__(self):
+        return self.patches.shape[0]
+
+    @property
+    def nbytes(self):
+        """Number of bytes used by the patches"""
+        return self.patches.nbytes + self.indices.nbytes
+
+    def set_patches(self, ivecs, correls, i0s, i1s, index_peak=0):
+        """Keep the patches centered on the peaks of a stack of maps
+
+        Parameters
+        ----------
+
+        ivecs : sequence of int
+
+          Indices of the vectors corresponding to the maps of the stack.
+
+        correls : np.ndarray (3d)
+
+        i0s, i1s : np.ndarray
+
+          Indices of the peaks in the correlation maps.
+
+        index_peak : int
+
+          0 for the main peak, 1 for the first secondary peak, etc.
+
+        """
+        if len(ivecs) == 0:
+            return
+        self.shape_correl = correls.shape[1:]
+        radius = self.radius
+        size = 2 * radius + 1
+        correls = np.pad(
+            correls,
+            ((0, 0), (radius, radius), (radius, radius)),
+            constant_values=np.nan,
+        )
+        windows = sliding_window_view(correls, (size, size), axis=(1, 2))
+        self.patches[ivecs, index_peak] = windows[
+            np.arange(len(ivecs)), i0s, i1s
+        ]
+        self.indices[ivecs, index_peak, 0] = i0s
+        self.indices[ivecs, index_peak, 1] = i1s
+
+    def __getitem__(self, ivec):
+        if self.indices[ivec, 0, 0] < 0:
+            return None
+        n0, n1 = self.shape_correl
+        radius = self.radius
+        correl = np.full(self.shape_correl, np.nan, dtype=np.float32)
+        for patch, (i0, i1) in zip(self.patches[ivec], self.indices[ivec]):
+            if i0 < 0:
+                continue
+            i0_start = max(i0 - radius, 0)
+            i1_start = max(i1 - radius, 0)
+            i0_stop = min(i0 + radius + 1, n0)
+            i1_stop = min(i1 + radius + 1, n1)
+            correl[i0_start:i0_stop, i1_start:i1_stop] = patch[
+                i0_start - i0 + radius : i0_stop - i0 + radius,
+                i1_start - i1 + radius : i1_stop - i1 + radius,
+            ]
+        return correl
+
+
 class HeavyPIVResults(DataObject):
     """Heavy PIV results containing displacements and correlation.
 
@@ -225,9 +343,10 @@ class HeavyPIVResults(DataObject):
 
       Raw PIV results.
 
-    correls: list of `num_vectors` 2d arrays
+    correls: list of `num_vectors` 2d arrays, :class:`CorrelPatches` or None
 
-      Correlation matrices for each vector.
+      Correlation matrices for each vector (depends on
+      ``params.piv0.store_correls``).
 
     correls_max: 1d array of size `num_vectors`
 
@@ -320,6 +439,23 @@ class HeavyPIVResults(DataObject):
     def get_images(self):
         return self.couple.read_images()
 
+    @property
+    def nbytes(self):
+        """Number of bytes of the arrays of the results (without the images)"""
+        nbytes = sum(
+            value.nbytes
+            for value in vars(self).values()
+            if isinstance(value, np.ndarray)
+        )
+        correls = getattr(self, "correls", None)
+        if isinstance(correls, CorrelPatches):
+            nbytes += correls.nbytes
+        elif correls is not None:
+            nbytes += sum(
+                correl.nbytes for correl in correls if correl is not None
+            )
+        return nbytes
+
     def display(
         self,
         show_interp=False,
@@ -576,6 +712,17 @@ class MultipassPIVResults(DataObject):
         self.passes.append(results)
         self.__dict__[f"piv{i}"] = results
 
+    @property
+    def nbytes(self):
+        """Number of bytes of the arrays of the results (with the images)"""
+        nbytes = sum(piv.nbytes for piv in self.passes)
+        couples = {id(piv.couple): piv.couple for piv in self.passes}
+        return nbytes + sum(
+            couple.nbytes
+            for couple in couples.values()
+            if isinstance(couple, ArrayCouple)
+        )
+
     def _get_name(self, kind):
         if hasattr(self, "file_name"):
             return self.file_name
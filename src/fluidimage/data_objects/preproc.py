@@ -18,6 +18,7 @@ import h5py
 
 from fluiddyn.util.serieofarrays import SerieOfArraysFromFiles
 from fluidimage.util import imsave, imsave_h5
+from fluidimage.util.containers import get_name_file_frame
 
 from .piv import ArrayCouple, LightPIVResults
 
@@ -72,11 +73,14 @@ def get_name_preproc(serie, name_files, ind_serie, nb_series, out_format):
     else:
         s = ind_middle_start
 
+    # the frames of containers are saved in image files
+    name_file = get_name_file_frame(name_files[s])
+
     if out_format == "img":
-        return name_files[s]
+        return name_file
 
     else:
-        fname, ext = os.path.splitext(name_files[s])
+        fname, ext = os.path.splitext(name_file)
         fname += "." + out_format
         return fname
 
@@ -154,7 +158,7 @@ class PreprocResults(LightPIVResults):
     def save(self, path=None):
         out_format = self.params.saving.format
         for k, v in self.data.items():
-            path_file = os.path.join(path, k)
+            path_file = os.path.join(path, get_name_file_frame(k))
             if out_format == "img":
                 imsave(path_file, v, as_int=True)
             elif out_format == "h5":
@@ -27,6 +27,8 @@ an executor compared to another.
    exec_async_multiproc
    exec_async_servers
    servers
+   shared_memory
+   cpu_affinity
 
 .. autofunction:: get_entry_points
 
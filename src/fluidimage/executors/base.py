@@ -1,6 +1,14 @@
 """Base class for executors
 ===========================
 
+.. autofunction:: parse_nbytes
+
+.. autofunction:: probe_latency_storage
+
+.. autofunction:: get_default_nb_max_workers_io
+
+.. autofunction:: save_fftw_wisdom
+
 .. autoclass:: ExecutorBase
    :members:
    :private-members:
@@ -18,8 +26,9 @@ import signal
 import sys
 import traceback
 from abc import ABC, abstractmethod
+from itertools import islice
 from pathlib import Path
-from time import sleep, time
+from time import perf_counter, sleep, time
 
 from rich.console import Console
 from rich.progress import Progress
@@ -28,7 +37,7 @@ from fluiddyn import time_as_str
 from fluiddyn.io.tee import MultiFile
 from fluiddyn.util.paramcontainer import ParamContainer
 from fluidimage.config import get_config
-from fluidimage.topologies.nb_cpu_cores import nb_cores
+from fluidimage.topologies.nb_cpu_cores import memory_limit, nb_cores
 from fluidimage.util import (
     get_txt_memory_usage,
     log_error,
@@ -39,10 +48,99 @@ from fluidimage.util import (
     str_short,
 )
 
+from .cpu_affinity import split_cpus
+
 config = get_config()
 
+_units_nbytes = {"k": 1e3, "M": 1e6, "G": 1e9, "T": 1e12}
+
+# rough estimate of the memory needed by a worker (used to limit the default
+# number of workers when the memory is limited, for example in containers)
+_memory_per_worker = 500e6
+
+
+def parse_nbytes(nbytes):
+    """Get a number of bytes from an int or a str (for example "500M", "8G")"""
+    if nbytes is None or isinstance(nbytes, int):
+        return nbytes
+    if isinstance(nbytes, float):
+        return int(nbytes)
+    nbytes = nbytes.strip().rstrip("Bb")
+    if nbytes and nbytes[-1] in _units_nbytes:
+        return int(float(nbytes[:-1]) * _units_nbytes[nbytes[-1]])
+    return int(float(nbytes))
+
+
+def probe_latency_storage(path_dir, nb_files=4):
+    """Measure the latency (in s) of the storage of a directory
+
+    A few files of the directory are opened and their first bytes are read.
+    Returns None if the directory does not contain files.
+
+    """
+    try:
+        with os.scandir(path_dir) as entries:
+            paths = [
+                entry.path
+                for entry in islice(entries, 16 * nb_files)
+                if entry.is_file()
+            ][:nb_files]
+    except OSError:
+        return None
+
+    durations = []
+    for path in paths:
+        t_start = perf_counter()
+        try:
+            with open(path, "rb") as file:
+                file.read(4096)
+        except OSError:
+            continue
+        durations.append(perf_counter() - t_start)
+
+    if not durations:
+        return None
+    return sorted(durations)[len(durations) // 2]
+
+
+def get_default_nb_max_workers_io(latency_storage):
+    """Default number of concurrent io works from the latency of the storage"""
+    if latency_storage is None:
+        return None
+    # local storage: few concurrent requests are enough
+    if latency_storage < 1e-3:
+        return 4
+    # slow storage (for example network file systems): the latency has to be
+    # hidden by more concurrent requests
+    return int(min(32, max(8, 4 * latency_storage / 1e-3)))
+
+
 _omp_num_threads_equal_1_at_import = os.environ.get("OMP_NUM_THREADS") == "1"
 
+# OMP_NUM_THREADS != 1 can be allowed in .fluidimagerc (section topology),
+# for example for computations with multithreaded works (params.piv0.nb_threads)
+allow_omp_num_threads = False
+if config is not None:
+    try:
+        allow_omp_num_threads = safe_eval(
+            config["topology"]["allow_omp_num_threads"]
+        )
+    except KeyError:
+        pass
+
+
+def save_fftw_wisdom():
+    """Save the FFTW wisdom (if the FFT module has been used in this process)
+
+    See :func:`fluidimage.calcul.fft.save_fftw_wisdom`. Useful for the
+    processes which do not run the ``atexit`` functions (started with
+    :class:`multiprocessing.Process`).
+
+    """
+    fft = sys.modules.get("fluidimage.calcul.fft")
+    if fft is not None:
+        fft.save_fftw_wisdom()
+
 
 class ExecutorBase(ABC):
     """Base class for executors.
@@ -60,6 +158,9 @@ class ExecutorBase(ABC):
 
     nb_max_workers : int, optional (None)
 
+      By default, computed from the number of cores available and the memory
+      limit of the cgroup (see :mod:`fluidimage.topologies.nb_cpu_cores`).
+
     nb_items_queue_max : int, optional (None),
 
     logging_level : str, optional {"info"},
@@ -68,6 +169,25 @@ class ExecutorBase(ABC):
 
     stop_if_error : bool, optional {False}
 
+    memory_max : None, int or str, optional {None}
+
+      Memory budget (in bytes, or str like "8G") for the items in the queues.
+      When it is reached, the async executors throttle the launches of the
+      upstream works (see :func:`parse_nbytes`). By default, half of the
+      memory limit of the cgroup (if any).
+
+    nb_max_workers_io : None, int, optional {None}
+
+      Maximum number of io works running at the same time. By default, it is
+      equal to ``nb_max_workers`` if ``nb_max_workers`` is given, otherwise it
+      is computed from a quick probe of the latency of the input storage (see
+      :func:`get_default_nb_max_workers_io`).
+
+    nb_max_workers_cpu : None, int, optional {None}
+
+      Maximum number of cpu works running at the same time (default
+      ``nb_max_workers``).
+
     """
 
     info_job: dict
@@ -77,6 +197,12 @@ class ExecutorBase(ABC):
     time_start: str
     _final_seq_work_run: bool
 
+    # the multi executors split the items of the first queue
+    _needs_all_items_first_queue = False
+
+    # mode used to open the log file
+    _mode_log_file = "w"
+
     # for results log
     _path_results: Path
     _path_num_results: Path
@@ -111,12 +237,17 @@ class ExecutorBase(ABC):
         sleep_time=None,
         stop_if_error=False,
         path_log=None,
+        memory_max=None,
+        nb_max_workers_io=None,
+        nb_max_workers_cpu=None,
     ):
-        if not _omp_num_threads_equal_1_at_import:
+        if not (_omp_num_threads_equal_1_at_import or allow_omp_num_threads):
             raise SystemError(
                 "For performance reason,"
                 'the environment variable OMP_NUM_THREADS has to be set to "1" '
-                "before executing a Fluidimage topology."
+                "before executing a Fluidimage topology (or this check can be "
+                "disabled with `allow_omp_num_threads = True` in the section "
+                "[topology] of ~/.fluidimagerc)."
             )
 
         del sleep_time
@@ -131,7 +262,9 @@ class ExecutorBase(ABC):
         self._init_log_path()
         if path_log is not None:
             self._log_path = path_log
-        self._log_file = open(self._log_path, "w", encoding="utf-8")
+        self._log_file = open(
+            self._log_path, self._mode_log_file, encoding="utf-8"
+        )
 
         stdout = sys.stdout
         if isinstance(stdout, MultiFile):
@@ -164,6 +297,8 @@ class ExecutorBase(ABC):
                 except KeyError:
                     pass
 
+        nb_max_workers_given = nb_max_workers is not None
+
         # default nb_max_workers
         # Difficult: trade off between overloading and limitation due to input
         # output.  The user can do much better for a specific case.
@@ -172,14 +307,63 @@ class ExecutorBase(ABC):
                 nb_max_workers = nb_cores + 2
             else:
                 nb_max_workers = nb_cores
+            if memory_limit is not None:
+                nb_max_workers = max(
+                    1,
+                    min(nb_max_workers, int(memory_limit / _memory_per_worker)),
+                )
 
         self.nb_max_workers = nb_max_workers
 
+        if config is not None:
+            if nb_max_workers_io is None:
+                try:
+                    nb_max_workers_io = safe_eval(
+                        config["topology"]["nb_max_workers_io"]
+                    )
+                except KeyError:
+                    pass
+            if nb_max_workers_cpu is None:
+                try:
+                    nb_max_workers_cpu = safe_eval(
+                        config["topology"]["nb_max_workers_cpu"]
+                    )
+                except KeyError:
+                    pass
+
+        if nb_max_workers_cpu is None:
+            nb_max_workers_cpu = nb_max_workers
+        self.nb_max_workers_cpu = nb_max_workers_cpu
+
+        self.latency_storage = None
+        if nb_max_workers_io is None and not nb_max_workers_given:
+            path_dir_src = getattr(topology, "path_dir_src", None)
+            if path_dir_src is not None:
+                self.latency_storage = probe_latency_storage(path_dir_src)
+            nb_max_workers_io = get_default_nb_max_workers_io(
+                self.latency_storage
+            )
+        if nb_max_workers_io is None:
+            nb_max_workers_io = nb_max_workers
+        self.nb_max_workers_io = nb_max_workers_io
+
         if nb_items_queue_max is None:
             nb_items_queue_max = max(4 * nb_max_workers, 8)
         self.nb_items_queue_max = nb_items_queue_max
 
+        if memory_max is None and config is not None:
+            try:
+                memory_max = config["topology"]["memory_max"]
+            except KeyError:
+                pass
+        # with a memory limit (cgroup), the items in the queues should not use
+        # more than half of the memory
+        if memory_max is None and memory_limit is not None:
+            memory_max = memory_limit // 2
+        self.memory_max = parse_nbytes(memory_max)
+
         self._has_to_stop = False
+        self._stopped_by_signal = False
         if sys.platform != "win32":
 
             def handler_signals(signal_number, stack):
@@ -189,6 +373,7 @@ class ExecutorBase(ABC):
                     f"({type(self).__name__})."
                 )
                 self._has_to_stop = True
+                self._stopped_by_signal = True
 
             signal.signal(12, handler_signals)
 
@@ -224,7 +409,15 @@ class ExecutorBase(ABC):
         print("  topology:", topology_name)
         print("  executor:", executor_name)
         print("  nb_cpus_allowed =", nb_cores)
+        if memory_limit is not None:
+            print("  memory_limit =", memory_limit)
         print("  nb_max_workers =", self.nb_max_workers)
+        print("  nb_max_workers_io =", self.nb_max_workers_io)
+        print("  nb_max_workers_cpu =", self.nb_max_workers_cpu)
+        if self.latency_storage is not None:
+            print(f"  latency_storage = {self.latency_storage:.2e} s")
+        if self.memory_max is not None:
+            print("  memory_max =", self.memory_max)
         print("  num_expected_results =", self.num_expected_results)
         print("  path_dir_result =", self.path_dir_result)
         print(
@@ -236,6 +429,8 @@ class ExecutorBase(ABC):
             "executor": executor_name,
             "nb_cpus_allowed": nb_cores,
             "nb_max_workers": self.nb_max_workers,
+            "nb_max_workers_io": self.nb_max_workers_io,
+            "nb_max_workers_cpu": self.nb_max_workers_cpu,
             "path_dir_result": self.path_dir_result,
             "num_expected_results": self.num_expected_results,
             "time_start": self.time_start_str,
@@ -293,6 +488,7 @@ class ExecutorBase(ABC):
 
     def _finalize_compute(self):
         self._run_final_seq_work()
+        save_fftw_wisdom()
         log_memory_usage(time_as_str(2) + ": end of `compute`. mem usage")
         self.topology.print_at_exit(time() - self.t_start)
         self._reset_std_as_default()
@@ -372,6 +568,19 @@ class ExecutorBase(ABC):
         first_work.func_or_cls(
             input_queue=None, output_queue=first_work.output_queue
         )
+        source = first_work.output_queue.source
+        if (
+            not self._needs_all_items_first_queue
+            and source is not None
+            and source.nb_items is not None
+        ):
+            # the queue is filled lazily (see LazySource) and is filled again
+            # by the "one shot" work
+            self.num_expected_results = source.nb_items
+            first_work.output_queue.source = None
+            first_work.output_queue.clear()
+            return
+        first_work.output_queue.fill_from_source()
         self._first_queue = copy.copy(first_work.output_queue)
         # split the first queue
         self._keys_first_queue = list(self._first_queue.keys())
@@ -433,13 +642,36 @@ class MultiExecutorBase(ExecutorBase):
 
     sleep_time : None, float
 
-      Defines the waiting time (from trio.sleep) of a function. Async functions
-      await `trio.sleep(sleep_time)` when they have done a work on an item, and
-      when there is nothing in their input_queue.
+      Waiting time (from trio.sleep) used by some executors when there is
+      nothing to do. The async executors do not poll the queues: they are
+      notified of their changes.
+
+    pin_cpus : bool, optional {False}
+
+      If True, each process is pinned to a disjoint set of cores (taken if
+      possible in one NUMA node, see
+      :func:`fluidimage.executors.cpu_affinity.split_cpus`).
+
+    nb_threads_per_process : None, int, optional {None}
+
+      Number of threads used in each process by the BLAS libraries and the
+      FFTW plans (see
+      :func:`fluidimage.executors.cpu_affinity.set_cpus_and_threads`) and
+      number of cores per process when ``pin_cpus`` is True. The PIV works can
+      use these threads with the parameter ``params.piv0.nb_threads``.
+
+    size_batches : None, int
+
+      If not None (only for topologies with a Splitter), the work is split in
+      batches of approximately ``size_batches`` items. Instead of computing one
+      large slice, each process pulls the batches one after the other until
+      there is no more batch (dynamic scheduling). The total duration then no
+      longer depends on the slowest slice.
 
     """
 
     errors: dict
+    _needs_all_items_first_queue = True
 
     def __init__(
         self,
@@ -450,9 +682,15 @@ class MultiExecutorBase(ExecutorBase):
         sleep_time=0.01,
         logging_level="info",
         stop_if_error=False,
+        memory_max=None,
+        pin_cpus=False,
+        nb_threads_per_process=None,
+        size_batches=None,
     ):
         if stop_if_error:
             raise NotImplementedError
+        if size_batches is not None and size_batches < 1:
+            raise ValueError(f"size_batches has to be positive ({size_batches=})")
 
         super().__init__(
             topology,
@@ -460,12 +698,23 @@ class MultiExecutorBase(ExecutorBase):
             nb_max_workers,
             nb_items_queue_max,
             logging_level=logging_level,
+            memory_max=memory_max,
         )
 
         self.sleep_time = sleep_time
         self.nb_processes = self.nb_max_workers
         self.processes = []
 
+        self.pin_cpus = pin_cpus
+        self.nb_threads_per_process = nb_threads_per_process
+        self.size_batches = size_batches
+        if pin_cpus:
+            self._cpus_processes = split_cpus(
+                self.nb_processes, nb_threads_per_process
+            )
+        else:
+            self._cpus_processes = None
+
         # to avoid a pylint warning
         self.log_paths = None
 
@@ -475,6 +724,26 @@ class MultiExecutorBase(ExecutorBase):
         path_dir_log.mkdir(exist_ok=True)
         self._log_path = path_dir_log / (path_dir_log.name + ".txt")
 
+    def _init_compute_log(self):
+        super()._init_compute_log()
+        if self.pin_cpus:
+            print("  cpus_processes =", self._cpus_processes)
+        if self.nb_threads_per_process is not None:
+            print("  nb_threads_per_process =", self.nb_threads_per_process)
+        self.info_job["nb_threads_per_process"] = self.nb_threads_per_process
+
+    def _get_cpus_process(self, idx_process):
+        """CPUs of a process (None if the processes are not pinned)"""
+        if self._cpus_processes is None:
+            return None
+        return self._cpus_processes[idx_process]
+
+    def _get_memory_max_per_process(self):
+        """The memory budget is shared between the processes"""
+        if self.memory_max is None:
+            return None
+        return self.memory_max // max(self.nb_processes, 1)
+
     @abstractmethod
     def _start_processes(self):
         """Start the processes doing the hard work"""
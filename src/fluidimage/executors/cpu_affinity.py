@@ -0,0 +1,162 @@
+"""CPU affinity and threads of the processes
+==========================================
+
+The multi executors can pin each process to a disjoint set of cores and set
+the number of threads used in each process by the BLAS libraries (with
+`threadpoolctl <https://github.com/joblib/threadpoolctl>`_, if installed) and
+by the FFTW plans (see :mod:`fluidimage.calcul.fft`). This allows
+configurations like 4 processes with 8 threads each.
+
+The sets of cores are taken (if possible) in one NUMA node, as described in
+``/sys/devices/system/node``.
+
+.. autofunction:: parse_cpulist
+
+.. autofunction:: get_cpus_numa_nodes
+
+.. autofunction:: split_cpus
+
+.. autofunction:: set_cpus_and_threads
+
+"""
+
+import os
+from multiprocessing import cpu_count
+from pathlib import Path
+
+from fluidimage.util import logger
+
+try:
+    from threadpoolctl import threadpool_limits
+except ImportError:
+    threadpool_limits = None
+
+
+def parse_cpulist(cpulist):
+    """Parse a list of CPUs in the Linux format (for example "0-3,8,10-11")"""
+    cpus = []
+    for part in cpulist.strip().split(","):
+        if not part:
+            continue
+        start, _, stop = part.partition("-")
+        if stop:
+            cpus.extend(range(int(start), int(stop) + 1))
+        else:
+            cpus.append(int(start))
+    return cpus
+
+
+def _get_cpus_allowed():
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(cpu_count()))
+
+
+def get_cpus_numa_nodes(path_dir_nodes="/sys/devices/system/node"):
+    """Get the CPUs allowed for the process grouped by NUMA node
+
+    The CPUs which are not in a NUMA node (or all CPUs if the nodes are not
+    described) form an additional group.
+
+    """
+    cpus_allowed = _get_cpus_allowed()
+    set_cpus_allowed = set(cpus_allowed)
+
+    cpus_nodes = []
+    paths_nodes = sorted(
+        Path(path_dir_nodes).glob("node[0-9]*"),
+        key=lambda path: int(path.name[4:]),
+    )
+    for path_node in paths_nodes:
+        try:
+            cpulist = (path_node / "cpulist").read_text(encoding="utf-8")
+        except OSError:
+            continue
+        cpus = [cpu for cpu in parse_cpulist(cpulist) if cpu in set_cpus_allowed]
+        if cpus:
+            cpus_nodes.append(cpus)
+
+    cpus_in_nodes = set(cpu for cpus in cpus_nodes for cpu in cpus)
+    cpus_others = [cpu for cpu in cpus_allowed if cpu not in cpus_in_nodes]
+    if cpus_others:
+        cpus_nodes.append(cpus_others)
+    return cpus_nodes
+
+
+def split_cpus(nb_processes, nb_threads=None, cpus_nodes=None):
+    """Split the CPUs in disjoint sets (one per process)
+
+    The processes are distributed over the NUMA nodes and the CPUs of a
+    process are taken in one node if possible.
+
+    Parameters
+    ----------
+
+    nb_processes : int
+
+    nb_threads : None, int
+
+      Number of CPUs per process (by default, all CPUs are used).
+
+    cpus_nodes : None, list of lists
+
+      The CPUs grouped by NUMA node (by default given by
+      :func:`get_cpus_numa_nodes`).
+
+    """
+    if cpus_nodes is None:
+        cpus_nodes = get_cpus_numa_nodes()
+    nb_cpus = sum(len(cpus) for cpus in cpus_nodes)
+    if nb_threads is None:
+        nb_threads = max(1, nb_cpus // nb_processes)
+    if nb_processes * nb_threads > nb_cpus:
+        raise ValueError(
+            f"Cannot pin {nb_processes} processes with {nb_threads} threads "
+            f"to {nb_cpus} CPUs."
+        )
+
+    cpus_free = [list(cpus) for cpus in cpus_nodes]
+    cpus_processes = []
+    for _ in range(nb_processes):
+        # the node with the largest number of free CPUs
+        cpus_node = max(cpus_free, key=len)
+        if len(cpus_node) >= nb_threads:
+            cpus_process = cpus_node[:nb_threads]
+            del cpus_node[:nb_threads]
+        else:
+            # the process has to use CPUs of different nodes
+            cpus_process = []
+            for cpus_node in sorted(cpus_free, key=len, reverse=True):
+                nb_missing = nb_threads - len(cpus_process)
+                cpus_process.extend(cpus_node[:nb_missing])
+                del cpus_node[:nb_missing]
+        cpus_processes.append(sorted(cpus_process))
+    return cpus_processes
+
+
+def set_cpus_and_threads(cpus=None, nb_threads=None):
+    """Set the CPU affinity and the number of threads of the current process
+
+    The number of threads is set for the BLAS libraries (only if threadpoolctl
+    is installed) and for the FFTW plans created afterwards.
+
+    """
+    if cpus is not None:
+        if hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(0, cpus)
+        else:
+            logger.warning("CPU affinity cannot be set on this platform")
+
+    if nb_threads is None:
+        return
+
+    from fluidimage.calcul import fft
+
+    fft.nthreads = nb_threads
+    if threadpool_limits is not None:
+        threadpool_limits(limits=nb_threads)
+    else:
+        logger.warning(
+            "threadpoolctl is not installed: the number of threads of the "
+            "BLAS libraries cannot be set"
+        )
@@ -11,6 +11,10 @@ This means that the work will run on one CPU at a time, except if the topology
 uses compiled code releasing the GIL. In this case, the GIL can be bypassed and
 computation can use many CPU at a time.
 
+The async functions do not poll the queues: they wait until they are notified
+of a change of the queues (see :class:`fluidimage.topologies.base.Queue`) or
+of the number of working workers.
+
 .. autoclass:: ExecutorAsync
    :members:
    :private-members:
@@ -23,7 +27,7 @@ from collections import OrderedDict
 
 import trio
 
-from fluidimage.util import log_debug, logger
+from fluidimage.util import get_txt_memory_usage, log_debug, logger
 
 from .base import ExecutorBase
 
@@ -33,8 +37,35 @@ class ExecutorAsync(ExecutorBase):
 
     The work in performed in a single process.
 
+    Parameters
+    ----------
+
+    priority_sink_first : bool, optional {False}
+
+      If True, the works closer to the end of the topology (the sink) are
+      launched first, and the number of items in flight for each work (being
+      computed or in its output queue) is limited by ``nb_items_queue_max``.
+      The upstream works (for example reading images) cannot fill the queues
+      while the downstream works lag behind.
+
+    nb_max_workers_io, nb_max_workers_cpu : None, int, optional {None}
+
+      Maximum numbers of io and cpu works running at the same time (see
+      :class:`fluidimage.executors.base.ExecutorBase`). The number of workers
+      for one work can also be limited with the argument ``nb_max_workers``
+      of :func:`fluidimage.topologies.base.TopologyBase.add_work`.
+
+    The works with a ``batch_size`` (see
+    :func:`fluidimage.topologies.base.TopologyBase.add_work`) are launched on
+    batches of items, which are computed in one thread (see
+    :func:`_async_run_work_batch`).
+
     """
 
+    # maximum waiting time without notification (for example to take into
+    # account self._has_to_stop set by a signal handler)
+    _timeout_wait_change = 1.0
+
     def __init__(
         self,
         topology,
@@ -45,6 +76,10 @@ class ExecutorAsync(ExecutorBase):
         logging_level="info",
         stop_if_error=False,
         path_log=None,
+        memory_max=None,
+        priority_sink_first=False,
+        nb_max_workers_io=None,
+        nb_max_workers_cpu=None,
     ):
         super().__init__(
             topology,
@@ -54,6 +89,9 @@ class ExecutorAsync(ExecutorBase):
             logging_level=logging_level,
             stop_if_error=stop_if_error,
             path_log=path_log,
+            memory_max=memory_max,
+            nb_max_workers_io=nb_max_workers_io,
+            nb_max_workers_cpu=nb_max_workers_cpu,
         )
 
         self.nb_working_workers_cpu = 0
@@ -61,6 +99,7 @@ class ExecutorAsync(ExecutorBase):
 
         # Executor parameters
         self.sleep_time = sleep_time
+        self.priority_sink_first = priority_sink_first
 
         # function containers
         self.async_funcs = OrderedDict()
@@ -68,6 +107,7 @@ class ExecutorAsync(ExecutorBase):
 
         # Functions definition
         self.define_functions()
+        self._init_work_graph()
 
         def signal_handler(sig, frame):
             del sig, frame  # unused
@@ -81,6 +121,8 @@ class ExecutorAsync(ExecutorBase):
 
         # to avoid a pylint warning
         self.nursery = None
+        self._parking_lot = None
+        self._trio_token = None
 
     def compute(self):
         """Compute the whole topology.
@@ -98,11 +140,211 @@ class ExecutorAsync(ExecutorBase):
 
     async def start_async_works(self):
         """Create a trio nursery and start all async functions."""
-        async with trio.open_nursery() as self.nursery:
-            for af in self.async_funcs.values():
-                self.nursery.start_soon(af)
+        self._init_notifications()
+        # the works are run in threads (at most 40 by default)
+        limiter = trio.to_thread.current_default_thread_limiter()
+        limiter.total_tokens = max(
+            limiter.total_tokens, self.nb_max_workers_io + self.nb_max_workers_cpu
+        )
+        try:
+            async with trio.open_nursery() as self.nursery:
+                for af in self.async_funcs.values():
+                    self.nursery.start_soon(af)
+
+                self.nursery.start_soon(self.update_has_to_stop)
+        finally:
+            self._reset_notifications()
+
+    def _init_notifications(self):
+        """Connect the queues to the notification of changes (in trio)"""
+        self._parking_lot = trio.lowlevel.ParkingLot()
+        self._trio_token = trio.lowlevel.current_trio_token()
+        for queue in self.topology.queues:
+            if hasattr(queue, "callback_change"):
+                queue.callback_change = self._notify_change
+
+    def _reset_notifications(self):
+        for queue in self.topology.queues:
+            if hasattr(queue, "callback_change"):
+                queue.callback_change = None
+        self._parking_lot = None
+        self._trio_token = None
+
+    def _notify_change(self):
+        """Wake up the tasks waiting for a change (can be called from threads)"""
+        parking_lot = self._parking_lot
+        if parking_lot is None:
+            return
+        try:
+            trio.lowlevel.current_task()
+        except RuntimeError:
+            # not in the trio thread
+            try:
+                self._trio_token.run_sync_soon(parking_lot.unpark_all)
+            except trio.RunFinishedError:
+                pass
+        else:
+            parking_lot.unpark_all()
+
+    async def _wait_for_change(self):
+        """Wait for a change of the queues or of the numbers of workers"""
+        with trio.move_on_after(self._timeout_wait_change):
+            await self._parking_lot.park()
+
+    async def _start_work(self, async_run_work, work, *args):
+        """Start a task running a work on an item
+
+        Contrary to ``nursery.start_soon``, it returns only when the task has
+        taken its item (and updated the numbers of working workers).
+
+        """
+        self._nb_items_running[work.name] += 1
+        await self.nursery.start(self._run_work, async_run_work, work, *args)
+
+    async def _run_work(
+        self, async_run_work, work, *args, task_status=trio.TASK_STATUS_IGNORED
+    ):
+        task_status.started()
+        try:
+            await async_run_work(work, *args)
+        finally:
+            self._nb_items_running[work.name] -= 1
+            self._notify_change()
+
+    def _init_work_graph(self):
+        """Compute the graph of the works (as in ``make_code_graphviz``)
+
+        For each work, we compute the works downstream and the distance to the
+        sink (number of works on the longest path to the end of the topology).
+
+        """
+
+        def as_tuple(queue):
+            if queue is None:
+                return ()
+            if isinstance(queue, (tuple, list)):
+                return tuple(queue)
+            return (queue,)
+
+        consumers = {}
+        for work in self.works:
+            for queue in as_tuple(work.input_queue):
+                consumers.setdefault(id(queue), []).append(work)
+
+        children = {
+            work.name: [
+                consumer
+                for queue in as_tuple(work.output_queue)
+                for consumer in consumers.get(id(queue), [])
+                if consumer is not work
+            ]
+            for work in self.works
+        }
+
+        self._downstream_works = {}
+        for work in self.works:
+            downstream = []
+            to_visit = list(children[work.name])
+            while to_visit:
+                child = to_visit.pop()
+                if child is work or child in downstream:
+                    continue
+                downstream.append(child)
+                to_visit.extend(children[child.name])
+            self._downstream_works[work.name] = downstream
+
+        distances = self._distances_to_sink = {}
+
+        def compute_distance(work, visiting=()):
+            if work.name in distances:
+                return distances[work.name]
+            distance = 0
+            for child in children[work.name]:
+                if child.name in visiting:
+                    continue
+                distance = max(
+                    distance,
+                    1 + compute_distance(child, visiting + (work.name,)),
+                )
+            distances[work.name] = distance
+            return distance
 
-            self.nursery.start_soon(self.update_has_to_stop)
+        for work in self.works:
+            compute_distance(work)
+
+        self._nb_items_running = {work.name: 0 for work in self.works}
+
+    def _get_pool(self, work):
+        """Kind of workers used by a work ("global", "io" or "cpu")"""
+        if work.kind is not None and "global" in work.kind:
+            return "global"
+        if work.kind is not None and "io" in work.kind:
+            return "io"
+        return "cpu"
+
+    def _is_output_queue_full(self, work):
+        """Check if the output queue of a work is full
+
+        With ``priority_sink_first``, the items being computed by the work are
+        also counted so that the number of items in flight for each stage of
+        the topology is limited.
+
+        """
+        if work.output_queue is None:
+            return False
+        nb_items = len(work.output_queue)
+        if self.priority_sink_first:
+            nb_items += self._nb_items_running[work.name]
+        return nb_items >= self.nb_items_queue_max
+
+    def _has_reached_nb_max_workers(self, work):
+        """Check if the limit of workers specific to a work is reached"""
+        return (
+            work.nb_max_workers is not None
+            and self._nb_items_running[work.name] >= work.nb_max_workers
+        )
+
+    def _has_to_give_way(self, work):
+        """Check if a work closer to the sink can be launched instead"""
+        if not self.priority_sink_first:
+            return False
+        pool = self._get_pool(work)
+        distance = self._distances_to_sink[work.name]
+        for other in self.works:
+            if (
+                self._distances_to_sink[other.name] < distance
+                and self._get_pool(other) == pool
+                and other.input_queue
+                and not self._has_reached_nb_max_workers(other)
+                and not self._is_output_queue_full(other)
+                and not self._is_throttled_by_memory(other)
+            ):
+                return True
+        return False
+
+    def _get_nbytes_queues(self):
+        return sum(getattr(queue, "nbytes", 0) for queue in self.topology.queues)
+
+    def _is_throttled_by_memory(self, work):
+        """Check if the launch of a work has to wait because of memory_max
+
+        When the items in the queues reach the memory budget, a work producing
+        items waits if works downstream can reduce the memory (running works or
+        not "global" works with items to process).
+
+        """
+        if self.memory_max is None or work.output_queue is None:
+            return False
+        if self._get_nbytes_queues() < self.memory_max:
+            return False
+        if self.nb_working_workers_cpu > 0 or self.nb_working_workers_io > 0:
+            return True
+        for work_down in self._downstream_works[work.name]:
+            if work_down.kind is not None and "global" in work_down.kind:
+                continue
+            if work_down.input_queue:
+                return True
+        return False
 
     def define_functions(self):
         """Define sync and async functions.
@@ -130,7 +372,7 @@ class ExecutorAsync(ExecutorBase):
                             isinstance(work.input_queue, tuple)
                             and all(not q for q in work.input_queue)
                         ) or not work.input_queue:
-                            await trio.sleep(self.sleep_time)
+                            await self._wait_for_change()
                             if self._has_to_stop:
                                 return
                         t_start = time.time()
@@ -142,14 +384,16 @@ class ExecutorAsync(ExecutorBase):
                         work.func_or_cls(work.input_queue, work.output_queue)
                         if self._has_to_stop:
                             return
-                        await trio.sleep(self.sleep_time)
 
                         self.log_in_file(
                             f"work {work.name_no_space} (kind='global') "
                             f"done in {time.time() - t_start:.3f} s"
                         )
 
-                        await trio.sleep(self.sleep_time)
+                        # the items which are ready have been processed
+                        await self._wait_for_change()
+                        if self._has_to_stop:
+                            return
 
             # I/O
             elif work.kind is not None and (
@@ -170,17 +414,16 @@ class ExecutorAsync(ExecutorBase):
             while True:
                 while (
                     not work.input_queue
-                    or self.nb_working_workers_io >= self.nb_max_workers
-                    or (
-                        work.output_queue is not None
-                        and len(work.output_queue) >= self.nb_items_queue_max
-                    )
+                    or self.nb_working_workers_io >= self.nb_max_workers_io
+                    or self._has_reached_nb_max_workers(work)
+                    or self._is_output_queue_full(work)
+                    or self._is_throttled_by_memory(work)
+                    or self._has_to_give_way(work)
                 ):
                     if self._has_to_stop:
                         return
-                    await trio.sleep(self.sleep_time)
-                self.nursery.start_soon(self.async_run_work_io, work)
-                await trio.sleep(self.sleep_time)
+                    await self._wait_for_change()
+                await self._start_work(self.async_run_work_io, work)
 
         return func
 
@@ -191,20 +434,134 @@ class ExecutorAsync(ExecutorBase):
             while True:
                 while (
                     not work.input_queue
-                    or self.nb_working_workers_cpu >= self.nb_max_workers
-                    or (
-                        work.output_queue is not None
-                        and len(work.output_queue) >= self.nb_items_queue_max
-                    )
+                    or self.nb_working_workers_cpu >= self.nb_max_workers_cpu
+                    or self._has_reached_nb_max_workers(work)
+                    or self._is_output_queue_full(work)
+                    or self._is_throttled_by_memory(work)
+                    or self._has_to_give_way(work)
                 ):
                     if self._has_to_stop:
                         return
-                    await trio.sleep(self.sleep_time)
-                self.nursery.start_soon(self.async_run_work_cpu, work)
-                await trio.sleep(self.sleep_time)
+                    await self._wait_for_change()
+                await self._start_work(self.async_run_work_cpu, work)
 
         return func
 
+    def _get_size_batch_max(self, work):
+        """Maximum number of items of a batch (room left for the work)
+
+        The batch does not overshoot the limits checked before the launch of
+        the task (``nb_items_queue_max``, ``nb_max_workers`` of the work and
+        ``memory_max``). The task running the batch is already counted in the
+        running items.
+
+        """
+        nb_running_others = self._nb_items_running[work.name] - 1
+        size = work.batch_size
+        if work.nb_max_workers is not None:
+            size = min(size, work.nb_max_workers - nb_running_others)
+        if work.output_queue is not None:
+            nb_items_output = len(work.output_queue)
+            size = min(
+                size,
+                self.nb_items_queue_max - nb_items_output - nb_running_others,
+            )
+            nbytes_output = getattr(work.output_queue, "nbytes", 0)
+            if self.memory_max is not None and nbytes_output:
+                # estimated with the items already in the output queue
+                nbytes_item = nbytes_output / nb_items_output
+                size = min(
+                    size,
+                    int(
+                        (self.memory_max - self._get_nbytes_queues())
+                        // nbytes_item
+                    ),
+                )
+        return max(size, 1)
+
+    def _pop_batch(self, work):
+        """Pop the items of a batch from the input queue of a work
+
+        The items containing exceptions are directly forwarded.
+
+        """
+        size_batch = self._get_size_batch_max(work)
+        items = []
+        while len(items) < size_batch:
+            try:
+                key, obj = work.input_queue.pop_first_item()
+            except KeyError:
+                break
+            if not work.check_exception(key, obj):
+                items.append((key, obj))
+        return items
+
+    def _run_batch(self, work, items):
+        """Run a work on the items of a batch (usually called in a thread)
+
+        Returns the results and the lines to be written in the log file (the
+        same lines as for items computed one by one).
+
+        """
+        results = []
+        lines_log = []
+        for key, obj in items:
+            t_start = time.time()
+            lines_log.append(
+                get_txt_memory_usage(
+                    f"{t_start - self.t_start:.2f} s. Launch work "
+                    + work.name_no_space
+                    + f" ({key}). mem usage"
+                )
+            )
+            arg = work.prepare_argument(key, obj)
+            # pylint: disable=W0703
+            try:
+                ret = work.func_or_cls(arg)
+            except Exception as error:
+                self.log_exception(error, work.name_no_space, key)
+                if self.stop_if_error:
+                    raise
+                ret = error
+            else:
+                lines_log.append(
+                    f"work {work.name_no_space} ({key}) "
+                    f"done in {time.time() - t_start:.3f} s"
+                )
+            results.append((key, ret))
+        return results, lines_log
+
+    async def _async_run_work_batch(self, work, in_thread=True):
+        """Run a work on a batch of items (at most ``work.batch_size``)
+
+        The per item overhead of the executor (in particular the launch of a
+        thread) is paid only once per batch. The results, the exceptions and
+        the logs are the same as for items computed one by one.
+
+        """
+        items = self._pop_batch(work)
+        if not items:
+            return
+
+        # the items of the batch are counted as running items
+        nb_items_more = len(items) - 1
+        self._nb_items_running[work.name] += nb_items_more
+        try:
+            if in_thread:
+                results, lines_log = await trio.to_thread.run_sync(
+                    self._run_batch, work, items
+                )
+            else:
+                results, lines_log = self._run_batch(work, items)
+        finally:
+            self._nb_items_running[work.name] -= nb_items_more
+
+        for line in lines_log:
+            self.log_in_file(line)
+        if work.output_queue is not None:
+            for key, ret in results:
+                work.output_queue[key] = ret
+
     async def async_run_work_io(self, work):
         """Is destined to be started with a "trio.start_soon".
 
@@ -221,6 +578,13 @@ class ExecutorAsync(ExecutorBase):
         """
         self.nb_working_workers_io += 1
 
+        if work.batch_size is not None:
+            try:
+                await self._async_run_work_batch(work)
+            finally:
+                self.nb_working_workers_io -= 1
+            return
+
         try:
             key, obj = work.input_queue.pop_first_item()
         except KeyError:
@@ -274,6 +638,13 @@ class ExecutorAsync(ExecutorBase):
         """
         self.nb_working_workers_cpu += 1
 
+        if work.batch_size is not None:
+            try:
+                await self._async_run_work_batch(work)
+            finally:
+                self.nb_working_workers_cpu -= 1
+            return
+
         try:
             key, obj = work.input_queue.pop_first_item()
         except KeyError:
@@ -329,6 +700,7 @@ class ExecutorAsync(ExecutorBase):
             if result:
                 self._has_to_stop = True
                 log_debug(f"has_to_stop!")
+                self._notify_change()
 
             if self.logging_level == "debug":
                 log_debug(f"self.topology.queues: {self.topology.queues}")
@@ -339,7 +711,7 @@ class ExecutorAsync(ExecutorBase):
                     f"self.nb_working_workers_io: {self.nb_working_workers_io}"
                 )
 
-            await trio.sleep(self.sleep_time)
+            await self._wait_for_change()
 
 
 Executor = ExecutorAsync
@@ -7,6 +7,9 @@ A executor using async for IO and multiprocessing for CPU bounded tasks.
    :members:
    :private-members:
 
+.. autoclass:: WorkerProcess
+   :members:
+
 """
 
 import time
@@ -16,24 +19,180 @@ import trio
 
 from fluidimage.util import log_debug, logger
 
+from .base import save_fftw_wisdom
 from .exec_async import ExecutorAsync
 
 
-def exec_work_and_comm(func, obj, child_conn, event):
-    # log_debug(f"process ({key}) started")
+def exec_works_and_comm(funcs, child_conn, event):
+    """Loop of a worker process: compute the items sent by the executor"""
     event.set()
-    # pylint: disable=W0703
-    try:
-        result = func(obj)
-    except Exception as error:
-        result = error
+    while True:
+        try:
+            message = child_conn.recv()
+        except EOFError:
+            break
+        if message is None:
+            break
+        work_name, _, arg = message
+        # pylint: disable=W0703
+        try:
+            result = funcs[work_name](arg)
+        except Exception as error:
+            result = error
+        child_conn.send(result)
+    save_fftw_wisdom()
+
+
+class WorkerProcess:
+    """Long-lived process computing the CPU-bounded works of a topology
+
+    The functions of the works are inherited by the process (fork) so that the
+    work objects (and for example their FFT plans) stay in memory between the
+    items. Only the name of the work, the key and the argument are sent.
+
+    """
+
+    def __init__(self, funcs, index):
+        self.funcs = funcs
+        self.index = index
+        self.process = None
+        self.conn = None
+        self.start()
+
+    def start(self):
+        """Start the process (and check that it has really started)"""
+        # we do this complicate thing because there may be a strange bug
+        for index_attempt in range(10):
+            parent_conn, child_conn = Pipe()
+            event = Event()
+            process = Process(
+                target=exec_works_and_comm,
+                args=(self.funcs, child_conn, event),
+            )
+            process.daemon = True
+            process.start()
+            # so that the death of the process is seen as EOF in the parent
+            child_conn.close()
+            # check whether the process has really started (possible bug!)
+            if event.wait(1):
+                self.process = process
+                self.conn = parent_conn
+                return
+            log_debug(
+                f"problem: worker process {self.index} "
+                f"has not really started... (attempt {index_attempt})"
+            )
+            process.terminate()
+            parent_conn.close()
+
+        raise RuntimeError(
+            f"Worker process {self.index} has not started after 10 attempts"
+        )
+
+    def compute(self, work_name, key, arg, timeout_check=0.5):
+        """Compute one item (blocking)
+
+        If the process dies during the computation, it is restarted and an
+        exception is returned.
 
-    # log_debug(f"in process, send result ({key}): {result}")
-    child_conn.send(result)
+        """
+        try:
+            self.conn.send((work_name, key, arg))
+            while not self.conn.poll(timeout_check):
+                if not self.process.is_alive():
+                    raise EOFError
+            return self.conn.recv()
+        except (EOFError, OSError):
+            self.process.join(timeout_check)
+            exitcode = self.process.exitcode
+            logger.error(
+                "worker process %s died (exitcode %s), restart it",
+                self.index,
+                exitcode,
+            )
+            self.conn.close()
+            self.start()
+            return RuntimeError(
+                f"Worker process died (exitcode {exitcode}) "
+                f"during work {work_name} ({key})"
+            )
+
+    def stop(self, timeout=1.0):
+        """Stop the process"""
+        if self.process.is_alive():
+            try:
+                self.conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+            self.process.join(timeout)
+        if self.process.exitcode is None:
+            self.process.terminate()
+        self.conn.close()
 
 
 class ExecutorAsyncMultiproc(ExecutorAsync):
-    """Async executor using multiprocessing to launch CPU-bounded tasks"""
+    """Async executor using multiprocessing to launch CPU-bounded tasks
+
+    The CPU-bounded works are computed by long-lived worker processes (at most
+    ``nb_max_workers_cpu``), which are started when needed and reused for the
+    next items.
+
+    """
+
+    def __init__(
+        self,
+        topology,
+        path_dir_result,
+        nb_max_workers=None,
+        nb_items_queue_max=None,
+        sleep_time=0.01,
+        logging_level="info",
+        stop_if_error=False,
+        path_log=None,
+        memory_max=None,
+        priority_sink_first=False,
+        nb_max_workers_io=None,
+        nb_max_workers_cpu=None,
+    ):
+        super().__init__(
+            topology,
+            path_dir_result,
+            nb_max_workers=nb_max_workers,
+            nb_items_queue_max=nb_items_queue_max,
+            sleep_time=sleep_time,
+            logging_level=logging_level,
+            stop_if_error=stop_if_error,
+            path_log=path_log,
+            memory_max=memory_max,
+            priority_sink_first=priority_sink_first,
+            nb_max_workers_io=nb_max_workers_io,
+            nb_max_workers_cpu=nb_max_workers_cpu,
+        )
+        self._funcs_cpu = {work.name: work.func_or_cls for work in self.works}
+        self._workers = []
+        self._idle_workers = []
+
+    def compute(self):
+        try:
+            super().compute()
+        finally:
+            self._stop_workers()
+
+    def _stop_workers(self):
+        for worker in self._workers:
+            worker.stop()
+        self._workers.clear()
+        self._idle_workers.clear()
+
+    def _get_idle_worker(self):
+        """Get an idle worker (started if needed, called in a thread)"""
+        try:
+            return self._idle_workers.pop()
+        except IndexError:
+            pass
+        worker = WorkerProcess(self._funcs_cpu, len(self._workers))
+        self._workers.append(worker)
+        return worker
 
     async def async_run_work_cpu(self, work):
         """Is destined to be started with a "trio.start_soon".
@@ -70,54 +229,12 @@ class ExecutorAsyncMultiproc(ExecutorAsync):
             + f" ({key}). mem usage"
         )
 
-        parent_conn, child_conn = Pipe()
-        event = Event()
-
         def run_process():
-            # we do this complicate thing because there may be a strange bug
-
-            def start_process_and_check(index_attempt):
-                process = Process(
-                    target=exec_work_and_comm,
-                    args=(work.func_or_cls, arg, child_conn, event),
-                )
-                process.daemon = True
-                process.start()
-                # check whether the process has really started (possible bug!)
-                if not event.wait(1):
-                    log_debug(
-                        f"problem: process {work.name_no_space} ({key}) "
-                        f"has not really started... (attempt {index_attempt})"
-                    )
-                    process.terminate()
-                    return False
-                return process
-
-            really_started = False
-            for index_attempt in range(10):
-                process = start_process_and_check(index_attempt)
-                if process:
-                    really_started = True
-                    break
-
-            if not really_started:
-                raise RuntimeError(
-                    f"A process {work.name_no_space} ({key}) "
-                    "has not started after 10 attempts"
-                )
-
-            # todo: use parent_conn.poll to implement a timeout
-
-            # log_debug(f"waiting for result ({key})")
-            result = parent_conn.recv()
-            # log_debug(f"result ({key}) received")
-
-            process.join(10 * self.sleep_time)
-            if process.exitcode != 0:
-                logger.error("process.exitcode: %s", process.exitcode)
-                process.terminate()
-
-            return result
+            worker = self._get_idle_worker()
+            try:
+                return worker.compute(work.name, key, arg)
+            finally:
+                self._idle_workers.append(worker)
 
         ret = await trio.to_thread.run_sync(run_process)
 
@@ -14,12 +14,18 @@ import trio
 
 from fluiddyn import time_as_str
 
+from .base import save_fftw_wisdom
+from .cpu_affinity import set_cpus_and_threads
 from .exec_async_sequential import ExecutorAsyncSequential
 
 
 class ExecutorAsyncSeqForMulti(ExecutorAsyncSequential):
     """Slightly modified ExecutorAsyncSequential"""
 
+    # with dynamic scheduling (size_batches), the executors of the batches
+    # computed by a process write in the same log file
+    _mode_log_file = "a"
+
     def __init__(
         self,
         topology,
@@ -31,12 +37,18 @@ class ExecutorAsyncSeqForMulti(ExecutorAsyncSequential):
         path_log=None,
         t_start=None,
         index_process=None,
+        memory_max=None,
+        cpus=None,
+        nb_threads=None,
     ):
         if stop_if_error:
             raise NotImplementedError(
                 "stop_if_error not implemented for ExecutorAsyncForMulti"
             )
 
+        # CPU affinity and threads of this process (see MultiExecutorBase)
+        set_cpus_and_threads(cpus, nb_threads)
+
         self._log_path = path_log
         topology.executor = self
         super().__init__(
@@ -47,6 +59,7 @@ class ExecutorAsyncSeqForMulti(ExecutorAsyncSequential):
             sleep_time=sleep_time,
             logging_level=logging_level,
             path_log=path_log,
+            memory_max=memory_max,
         )
 
         self.t_start = t_start
@@ -64,6 +77,9 @@ class ExecutorAsyncSeqForMulti(ExecutorAsyncSequential):
                 "job" + path_log_dir.name[3:]
             )
             self._init_results_log(self.path_job_data)
+            # with dynamic scheduling, the results of the batches previously
+            # computed by this process are already saved
+            self._len_saved_results = len(self.topology.results)
 
             sys.stdout = self._log_file
 
@@ -79,12 +95,13 @@ class ExecutorAsyncSeqForMulti(ExecutorAsyncSequential):
         if hasattr(self, "_path_results"):
             self._path_results.touch()
             with open(self._path_num_results, "w", encoding="utf-8") as file:
-                file.write("0\n")
+                file.write(f"{self._len_saved_results}\n")
 
     def _init_num_expected_results(self):
         pass
 
     def _finalize_compute(self):
+        save_fftw_wisdom()
         self._reset_std_as_default()
 
         txt = self.topology.make_text_at_exit(time() - self.t_start)
@@ -39,6 +39,13 @@ class ExecutorAsyncSequential(ExecutorAsync):
         """
         self.nb_working_workers_cpu += 1
 
+        if work.batch_size is not None:
+            try:
+                await self._async_run_work_batch(work, in_thread=False)
+            finally:
+                self.nb_working_workers_cpu -= 1
+            return
+
         try:
             key, obj = work.input_queue.pop_first_item()
         except KeyError:
@@ -32,15 +32,19 @@ class ExecutorAsyncServers(ExecutorAsync):
 
       Limits the numbers of workers working in the same time.
 
+    nb_max_workers_io, nb_max_workers_cpu : None, int
+
+      Limits the numbers of io works running in the same time and the number
+      of servers (for the cpu works).
+
     nb_items_queue_max : None, int
 
       Limits the numbers of items that can be in a output_queue.
 
     sleep_time : None, float
 
-      Defines the waiting time (from trio.sleep) of a function. Functions await
-      "trio.sleep" when they have done a work on an item, and when there is
-      nothing in there input_queue.
+      Defines the waiting time (from trio.sleep) of the servers when there is
+      nothing to do.
 
     """
 
@@ -61,6 +65,10 @@ class ExecutorAsyncServers(ExecutorAsync):
         sleep_time=0.01,
         logging_level="info",
         stop_if_error=False,
+        memory_max=None,
+        priority_sink_first=False,
+        nb_max_workers_io=None,
+        nb_max_workers_cpu=None,
     ):
         if stop_if_error:
             raise NotImplementedError
@@ -72,12 +80,16 @@ class ExecutorAsyncServers(ExecutorAsync):
             nb_items_queue_max,
             sleep_time=sleep_time,
             logging_level=logging_level,
+            memory_max=memory_max,
+            priority_sink_first=priority_sink_first,
+            nb_max_workers_io=nb_max_workers_io,
+            nb_max_workers_cpu=nb_max_workers_cpu,
         )
 
-        # create nb_max_workers servers
+        # create nb_max_workers_cpu servers
         self.workers = []
 
-        for ind_worker in range(self.nb_max_workers):
+        for ind_worker in range(self.nb_max_workers_cpu):
             log_path = self._log_path.parent / f"process_{ind_worker:03d}.txt"
             self.workers.append(
                 launch_server(
@@ -120,11 +132,15 @@ class ExecutorAsyncServers(ExecutorAsync):
 
     async def start_async_works(self):
         """Create a trio nursery and start all async functions."""
-        async with trio.open_nursery() as self.nursery:
-            for af in reversed(self.async_funcs.values()):
-                self.nursery.start_soon(af)
+        self._init_notifications()
+        try:
+            async with trio.open_nursery() as self.nursery:
+                for af in reversed(self.async_funcs.values()):
+                    self.nursery.start_soon(af)
 
-            self.nursery.start_soon(self.update_has_to_stop)
+                self.nursery.start_soon(self.update_has_to_stop)
+        finally:
+            self._reset_notifications()
 
         logger.info("terminate the servers")
         for worker in self.workers:
@@ -148,6 +164,7 @@ class ExecutorAsyncServers(ExecutorAsync):
             if result:
                 self._has_to_stop = True
                 log_debug("has_to_stop!")
+                self._notify_change()
 
             if self.logging_level == "debug":
                 log_debug(f"self.topology.queues: {self.topology.queues}")
@@ -167,7 +184,7 @@ class ExecutorAsyncServers(ExecutorAsync):
                     f"self.nb_working_workers_io: {self.nb_working_workers_io}"
                 )
 
-            await trio.sleep(self.sleep_time)
+            await self._wait_for_change()
 
     async def async_run_work_cpu(self, work, worker):
         """Is destined to be started with a "trio.start_soon".
@@ -201,10 +218,13 @@ class ExecutorAsyncServers(ExecutorAsync):
             # create a communication channel
             parent_conn, child_conn = worker.new_pipe()
             # send (work, key, obj, comm) to the server
-            worker.send_job((work.name, key, obj, child_conn))
+            message = worker.send_job((work.name, key, obj, child_conn))
             worker.is_available = True
+            self._notify_change()
             # wait for the end of the computation
-            work_name_received, key_received, result = parent_conn.recv()
+            work_name_received, key_received, result = worker.receive_result(
+                parent_conn, message
+            )
             assert work.name == work_name_received
             assert key == key_received
             return result
@@ -217,25 +237,27 @@ class ExecutorAsyncServers(ExecutorAsync):
     def def_async_func_work_cpu(self, work):
         async def func(work=work):
             while True:
-                while not work.input_queue or (
-                    work.output_queue is not None
-                    and len(work.output_queue) >= self.nb_items_queue_max
+                while (
+                    not work.input_queue
+                    or self._has_reached_nb_max_workers(work)
+                    or self._is_output_queue_full(work)
+                    or self._is_throttled_by_memory(work)
+                    or self._has_to_give_way(work)
                 ):
                     if self._has_to_stop:
                         return
-                    await trio.sleep(self.sleep_time)
+                    await self._wait_for_change()
 
-                available_worker = False
+                available_worker = self.get_available_worker()
                 while not available_worker:
                     if self._has_to_stop:
                         return
+                    await self._wait_for_change()
                     available_worker = self.get_available_worker()
-                    await trio.sleep(self.sleep_time)
 
-                self.nursery.start_soon(
+                await self._start_work(
                     self.async_run_work_cpu, work, available_worker
                 )
-                await trio.sleep(self.sleep_time)
 
         return func
 
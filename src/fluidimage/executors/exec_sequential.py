@@ -77,6 +77,7 @@ class ExecutorSequential(ExecutorBase):
 
     def _init_compute_log(self):
         self.nb_max_workers = 1
+        self.nb_max_workers_io = self.nb_max_workers_cpu = 1
         super()._init_compute_log()
 
     def _save_job_data(self):
@@ -9,7 +9,8 @@ Multi executors async
 """
 
 import copy
-from multiprocessing import Process
+from math import ceil
+from multiprocessing import Process, Value
 
 from fluidimage.topologies.splitters import split_list
 
@@ -36,14 +37,54 @@ class MultiExecutorAsync(MultiExecutorBase):
 
     sleep_time : None, float
 
-      Defines the waiting time (from trio.sleep) of a function. Async functions
-      await `trio.sleep(sleep_time)` when they have done a work on an item, and
-      when there is nothing in their input_queue.
+      Waiting time (from trio.sleep) used by some executors when there is
+      nothing to do. The async executors do not poll the queues: they are
+      notified of their changes.
+
+    size_batches : None, int
+
+      If not None (only for topologies with a "series" attribute), the series
+      are split in batches of approximately ``size_batches`` items. Instead of
+      computing one large slice, each process pulls the batches one after the
+      other from a counter in shared memory until there is no more batch
+      (dynamic scheduling). The total duration then no longer depends on the
+      slowest slice.
 
     """
 
     ExecutorForMulti = ExecutorAsyncSeqForMulti
 
+    def __init__(
+        self,
+        topology,
+        path_dir_result,
+        nb_max_workers=None,
+        nb_items_queue_max=None,
+        sleep_time=0.01,
+        logging_level="info",
+        stop_if_error=False,
+        size_batches=None,
+        memory_max=None,
+        pin_cpus=False,
+        nb_threads_per_process=None,
+    ):
+        super().__init__(
+            topology,
+            path_dir_result,
+            nb_max_workers=nb_max_workers,
+            nb_items_queue_max=nb_items_queue_max,
+            sleep_time=sleep_time,
+            logging_level=logging_level,
+            stop_if_error=stop_if_error,
+            memory_max=memory_max,
+            pin_cpus=pin_cpus,
+            nb_threads_per_process=nb_threads_per_process,
+            size_batches=size_batches,
+        )
+        self._batches = None
+        self._batches_are_ranges = None
+        self._counter_batches = None
+
     def _start_processes(self):
         """
         There are two ways to split self.topology work:
@@ -122,9 +163,14 @@ class MultiExecutorAsync(MultiExecutorBase):
                 "topologies with a Splitter."
             ) from error
 
+        if self.size_batches is None:
+            num_parts = self.nb_processes
+        else:
+            num_parts = ceil(self.num_expected_results / self.size_batches)
+
         params = copy.deepcopy(self.topology.params)
         splitter = splitter_cls(
-            params, self.nb_processes, self.topology, self._indices_to_be_computed
+            params, num_parts, self.topology, self._indices_to_be_computed
         )
         assert self.num_expected_results == splitter.num_expected_results
 
@@ -138,24 +184,45 @@ class MultiExecutorAsync(MultiExecutorBase):
             )
             path_dir_indices.mkdir(exist_ok=True)
             splitter.save_indices_files(path_dir_indices)
+            self._batches_are_ranges = False
+            batches = [indices for indices in splitter.indices_lists if indices]
+        else:
+            self._batches_are_ranges = True
+            batches = [sss for sss in splitter.ranges if len(range(*sss)) > 0]
 
-            for idx_process, index_series in enumerate(splitter.indices_lists):
-                if not index_series:
-                    continue
+        if self.size_batches is None:
+            for idx_process, batch in enumerate(batches):
                 new_topology = copy.copy(self.topology)
-                new_topology.series.set_index_series(index_series)
+                self._set_batch(new_topology, batch)
                 self.launch_process(new_topology, idx_process)
+            return
+
+        # dynamic scheduling: the batches are inherited by the forked processes
+        self._batches = batches
+        self._counter_batches = Value("i", 0)
+        for idx_process in range(min(self.nb_processes, len(batches))):
+            self.launch_process(
+                copy.copy(self.topology),
+                idx_process,
+                target=self.init_and_compute_batches,
+            )
 
+    def _set_batch(self, topology, batch):
+        """Restrict the series of a topology to a batch"""
+        series = topology.series
+        if self._batches_are_ranges:
+            series.ind_start, series.ind_stop, series.ind_step = batch
+            # index_series is computed at the first iteration over the series
+            series.set_index_series(range(*batch))
         else:
-            for idx_process, start_stop_step in enumerate(splitter.ranges):
-                if len(range(*start_stop_step)) == 0:
-                    continue
-                new_topology = copy.copy(self.topology)
-                series = new_topology.series
-                series.ind_start, series.ind_stop, series.ind_step = (
-                    start_stop_step
-                )
-                self.launch_process(new_topology, idx_process)
+            series.set_index_series(batch)
+
+    def _get_next_batch(self):
+        """Get the index of the next batch (shared between the processes)"""
+        with self._counter_batches.get_lock():
+            index_batch = self._counter_batches.value
+            self._counter_batches.value += 1
+        return index_batch
 
     def init_and_compute(self, topology_this_process, log_path, idx_process):
         """Create an executor and start it in a process"""
@@ -167,17 +234,39 @@ class MultiExecutorAsync(MultiExecutorBase):
             logging_level=self.logging_level,
             t_start=self.t_start,
             index_process=idx_process,
+            memory_max=self._get_memory_max_per_process(),
+            cpus=self._get_cpus_process(idx_process),
+            nb_threads=self.nb_threads_per_process,
         )
         executor.compute()
+        return executor
+
+    def init_and_compute_batches(
+        self, topology_this_process, log_path, idx_process
+    ):
+        """Compute in a process the batches pulled from the shared counter"""
+        index_batch = self._get_next_batch()
+        while index_batch < len(self._batches):
+            self._set_batch(topology_this_process, self._batches[index_batch])
+            # the executors of the batches append to the log of the process
+            executor = self.init_and_compute(
+                topology_this_process, log_path, idx_process
+            )
+            if executor._stopped_by_signal:
+                break
+            index_batch = self._get_next_batch()
 
-    def launch_process(self, topology, idx_process):
+    def launch_process(self, topology, idx_process, target=None):
         """Launch one process"""
 
+        if target is None:
+            target = self.init_and_compute
+
         log_path = self._log_path.parent / f"process_{idx_process:03d}.txt"
         self.log_paths.append(log_path)
 
         process = Process(
-            target=self.init_and_compute,
+            target=target,
             args=(topology, log_path, idx_process),
         )
         process.daemon = True
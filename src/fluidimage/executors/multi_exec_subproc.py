@@ -1,14 +1,20 @@
 """Multi executor based on subprocesses
 
+.. autofunction:: iter_paths_batches
+
 .. autoclass:: MultiExecutorSubproc
    :members:
    :private-members:
 
 """
 
+import os
 import subprocess
 import sys
 from copy import deepcopy
+from math import ceil
+from multiprocessing.connection import AuthenticationError, Client, Listener
+from threading import Thread
 from time import sleep
 
 from fluiddyn import time_as_str
@@ -17,12 +23,40 @@ from fluidimage.util import logger
 
 from .base import MultiExecutorBase
 
+# environment variable used to give to the subprocesses the key of the listener
+name_env_authkey = "FLUIDIMAGE_AUTHKEY_BATCHES"
+
+
+def iter_paths_batches(address, index_process):
+    """Iterate over the paths of the batches given by a MultiExecutorSubproc
+
+    Used in the subprocesses (see :mod:`fluidimage.run_from_xml`) to pull the
+    xml files of the batches one after the other from the listener of the
+    multi executor.
+
+    """
+    authkey = bytes.fromhex(os.environ[name_env_authkey])
+    while True:
+        with Client(address, authkey=authkey) as conn:
+            conn.send(index_process)
+            path_params = conn.recv()
+        if path_params is None:
+            return
+        yield path_params
+
 
 class MultiExecutorSubproc(MultiExecutorBase):
-    """Multi executor based on subprocesses and splitters"""
+    """Multi executor based on subprocesses and splitters
+
+    With ``size_batches``, the parent process owns a
+    :class:`multiprocessing.connection.Listener`. Each subprocess asks it for
+    the xml file of its next batch until there is no more batch.
+
+    """
 
     splitter: Splitter
     executor_for_multi = "exec_async_seq_for_multi"
+    _listener = None
 
     def _init_num_expected_results(self):
 
@@ -55,10 +89,21 @@ class MultiExecutorSubproc(MultiExecutorBase):
                     "path_log": None,
                     "t_start": self.t_start,
                     "index_process": None,
+                    "memory_max": self._get_memory_max_per_process(),
+                    "cpus": None,
+                    "nb_threads": self.nb_threads_per_process,
                 },
             )
         except ValueError:
-            params.compute_kwargs.kwargs_executor.t_start = self.t_start
+            kwargs_executor = params.compute_kwargs.kwargs_executor
+            kwargs_executor.t_start = self.t_start
+            kwargs_executor._set_attrib(
+                "memory_max", self._get_memory_max_per_process()
+            )
+            kwargs_executor._set_attrib("cpus", None)
+            kwargs_executor._set_attrib(
+                "nb_threads", self.nb_threads_per_process
+            )
 
         if hasattr(self.topology, "how_saving"):
             params.saving.how = self.topology.how_saving
@@ -71,6 +116,41 @@ class MultiExecutorSubproc(MultiExecutorBase):
         )
         self.num_expected_results = self.splitter.num_expected_results
 
+        if self.size_batches is not None and self.num_expected_results:
+            # dynamic scheduling: the work is split in many small batches
+            indices = self.splitter.indices_lists
+            if indices is not None:
+                indices = [index for part in indices for index in part]
+            self.splitter = splitter_cls(
+                params,
+                ceil(self.num_expected_results / self.size_batches),
+                self.topology,
+                indices,
+            )
+
+    def _set_params_process(self, params, index_process):
+        """Set the parameters of the executor used in a process"""
+        kwargs_executor = params.compute_kwargs.kwargs_executor
+        kwargs_executor.path_log = (
+            self._log_path.parent / f"process_{index_process:03d}.txt"
+        )
+        kwargs_executor.index_process = index_process
+        kwargs_executor.cpus = self._get_cpus_process(index_process)
+
+    def _launch_subprocess(self, args, env=None):
+        """Launch a subprocess running fluidimage.run_from_xml"""
+        process = subprocess.Popen(
+            [sys.executable, "-m", "fluidimage.run_from_xml"] + args,
+            text=True,
+            encoding="utf-8",
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            env=env,
+        )
+        self.processes.append(process)
+        # shift a bit the imports
+        sleep(0.2)
+
     def _start_processes(self):
 
         splitter = self.splitter
@@ -78,6 +158,7 @@ class MultiExecutorSubproc(MultiExecutorBase):
             self.path_dir_result / f"params_files_{self._unique_postfix}"
         )
         path_dir_params.mkdir(exist_ok=True)
+        self._path_dir_params = path_dir_params
 
         if (
             hasattr(self.topology, "how_saving")
@@ -86,33 +167,16 @@ class MultiExecutorSubproc(MultiExecutorBase):
         ):
             splitter.save_indices_files(path_dir_params)
 
-        for index_process, params_split in enumerate(
-            splitter.iter_over_new_params()
-        ):
-            kwargs_executor = params_split.compute_kwargs.kwargs_executor
-            kwargs_executor.path_log = (
-                self._log_path.parent / f"process_{index_process:03d}.txt"
-            )
-            kwargs_executor.index_process = index_process
-
-            path_params = path_dir_params / f"params{index_process:00d}.xml"
-            params_split._save_as_xml(path_params)
-
-            process = subprocess.Popen(
-                [
-                    sys.executable,
-                    "-m",
-                    "fluidimage.run_from_xml",
-                    str(path_params),
-                ],
-                text=True,
-                encoding="utf-8",
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-            )
-            self.processes.append(process)
-            # shift a bit the imports
-            sleep(0.2)
+        if self.size_batches is None:
+            for index_process, params_split in enumerate(
+                splitter.iter_over_new_params()
+            ):
+                self._set_params_process(params_split, index_process)
+                path_params = path_dir_params / f"params{index_process:00d}.xml"
+                params_split._save_as_xml(path_params)
+                self._launch_subprocess([str(path_params)])
+        else:
+            self._start_processes_batches()
 
         logger.info(
             "%s: %s sequential executors launched in parallel",
@@ -120,5 +184,66 @@ class MultiExecutorSubproc(MultiExecutorBase):
             len(self.processes),
         )
 
+    def _start_processes_batches(self):
+        """Start the listener and the processes pulling the batches"""
+        num_batches = self.splitter.num_processes
+        self._params_batches = enumerate(self.splitter.iter_over_new_params())
+
+        authkey = os.urandom(32)
+        self._listener = Listener(("localhost", 0), authkey=authkey)
+        self._authkey = authkey
+        self._thread_batches = Thread(target=self._serve_batches, daemon=True)
+        self._thread_batches.start()
+
+        host, port = self._listener.address
+        env = dict(os.environ)
+        env[name_env_authkey] = authkey.hex()
+        for index_process in range(min(self.nb_processes, num_batches)):
+            self._launch_subprocess(
+                [
+                    "--address-batches",
+                    f"{host}:{port}",
+                    "--index-process",
+                    str(index_process),
+                ],
+                env=env,
+            )
+
+    def _serve_batches(self):
+        """Give the batches to the processes (run in a thread)"""
+        while True:
+            try:
+                conn = self._listener.accept()
+            except AuthenticationError:
+                continue
+            with conn:
+                index_process = conn.recv()
+                if index_process is None:
+                    return
+                conn.send(self._save_params_next_batch(index_process))
+
+    def _save_params_next_batch(self, index_process):
+        """Save the xml file of the next batch (None if there is no batch)"""
+        if self._has_to_stop:
+            return None
+        try:
+            index_batch, params_batch = next(self._params_batches)
+        except StopIteration:
+            return None
+        self._set_params_process(params_batch, index_process)
+        path_params = self._path_dir_params / f"params_batch{index_batch:04d}.xml"
+        params_batch._save_as_xml(path_params)
+        return str(path_params)
+
+    def _join_processes(self):
+        """Stop the thread giving the batches"""
+        if self._listener is None:
+            return
+        with Client(self._listener.address, authkey=self._authkey) as conn:
+            conn.send(None)
+        self._thread_batches.join()
+        self._listener.close()
+        self._listener = None
+
 
 Executor = MultiExecutorSubproc
@@ -3,6 +3,9 @@
 
 .. autofunction:: launch_server
 
+Large arrays are sent between the executor and the servers through shared
+memory (see :mod:`fluidimage.executors.shared_memory`).
+
 .. autoclass:: Worker
    :members:
    :private-members:
@@ -21,10 +24,11 @@
 
 """
 
+import os
 import signal
 import sys
 import time
-from multiprocessing import Event, Pipe, Process
+from multiprocessing import Event, Pipe, Process, resource_tracker
 from threading import Thread
 
 import trio
@@ -32,6 +36,9 @@ import trio
 from fluiddyn.io.tee import MultiFile
 from fluidimage.util import cstring, get_txt_memory_usage, log_debug, logger
 
+from .base import save_fftw_wisdom
+from .shared_memory import SharedMemoryTransport
+
 
 def launch_server(
     topology,
@@ -56,6 +63,13 @@ def launch_server(
 
     in_process = Process_ == Process
 
+    if in_process:
+        # the resource tracker (shared memory) has to be shared with the server
+        resource_tracker.ensure_running()
+        transport = SharedMemoryTransport()
+    else:
+        transport = None
+
     process = Process_(
         target=WorkerServerMultiprocessing,
         args=(
@@ -72,16 +86,19 @@ def launch_server(
     process.daemon = True
 
     process.start()
-    worker = WorkerMultiprocessing(parent_conn, event_has_to_stop, process)
+    worker = WorkerMultiprocessing(
+        parent_conn, event_has_to_stop, process, transport
+    )
 
     return worker
 
 
 class Worker:
-    def __init__(self, conn, event_has_to_stop, process):
+    def __init__(self, conn, event_has_to_stop, process, transport=None):
         self.conn = conn
         self.event_has_to_stop = event_has_to_stop
         self.process = process
+        self.transport = transport
         self.nb_items_to_process = 0
         self.is_available = True
         self.is_unoccupied = True
@@ -97,13 +114,40 @@ class Worker:
 
 class WorkerMultiprocessing(Worker):
     def send_job(self, obj):
+        """Send a job and return the message sent through shared memory"""
         self.is_unoccupied = False
         self.nb_items_to_process += 1
-        self.send(obj)
+        if self.transport is None:
+            self.send(obj)
+            return None
+        work_name, key, arg, child_conn = obj
+        message = self.transport.dumps(arg)
+        try:
+            self.send((work_name, key, message, child_conn))
+        except BaseException:
+            self.transport.release(message)
+            raise
+        return message
 
     def send(self, obj):
         self.conn.send(obj)
 
+    def receive_result(self, conn, message_sent=None):
+        """Receive the result of a job (work_name, key, result)
+
+        If the server does not answer, the blocks of the message sent with
+        :func:`send_job` are released.
+        """
+        try:
+            work_name, key, result = conn.recv()
+        except (EOFError, OSError):
+            if message_sent is not None:
+                self.transport.release(message_sent)
+            raise
+        if self.transport is not None:
+            result = self.transport.loads(result)
+        return work_name, key, result
+
     def new_pipe(self):
         return Pipe()
 
@@ -112,6 +156,8 @@ class WorkerMultiprocessing(Worker):
         self.event_has_to_stop.set()
         if hasattr(self.process, "terminate"):
             self.process.terminate()
+        if self.transport is not None:
+            self.transport.close()
 
 
 class WorkerServer:
@@ -175,6 +221,20 @@ class WorkerServerMultiprocessing(WorkerServer):
 
             signal.signal(signal.SIGINT, signal_handler)
 
+            def handler_sigterm(sig, frame):
+                del sig, frame
+                # unlink the blocks of shared memory created by this server
+                self.transport.close()
+                # os._exit does not run the atexit functions
+                save_fftw_wisdom()
+                os._exit(0)
+
+            signal.signal(signal.SIGTERM, handler_sigterm)
+
+            self.transport = SharedMemoryTransport()
+        else:
+            self.transport = None
+
         self.conn = conn
         self.event_has_to_stop = event_has_to_stop
 
@@ -245,6 +305,8 @@ class WorkerServerMultiprocessing(WorkerServer):
 
             work_name, key, obj, child_conn = self.to_be_processed.pop(0)
             work = self.topology.works_dict[work_name]
+            if self.transport is not None:
+                obj = self.transport.loads(obj)
 
             t_start = time.time()
 
@@ -282,6 +344,14 @@ class WorkerServerMultiprocessing(WorkerServer):
             work_name, key, result, child_conn = self.to_be_resent.pop(0)
 
             log_debug(f"send {work_name}, {key}")
-            await trio.to_thread.run_sync(
-                child_conn.send, (work_name, key, result)
-            )
+            if self.transport is not None:
+                result = self.transport.dumps(result)
+            try:
+                await trio.to_thread.run_sync(
+                    child_conn.send, (work_name, key, result)
+                )
+            except BaseException:
+                # the blocks would never be released by the client
+                if self.transport is not None:
+                    self.transport.release(result)
+                raise
@@ -0,0 +1,179 @@
+"""Transport of arrays through shared memory
+============================================
+
+The objects sent between the processes (for example couples of images and
+PIV results) can contain large arrays. Sending them through
+:func:`multiprocessing.Pipe` implies a full pickle and copy in each direction.
+
+With :class:`SharedMemoryTransport`, the buffers of the large arrays are taken
+out of band (pickle protocol 5) and copied in blocks of shared memory. Only
+the pickle of the object without these buffers and small descriptors of the
+blocks are sent through the pipes.
+
+The blocks are created by the sending process and reused. The header of a
+block contains a token (nonzero integer) written by the sender when it takes
+the block and reset to 0 by the receiver when it has copied the data. A
+message which is never loaded (for example because the receiver died) has to
+be released by the sender with :func:`SharedMemoryTransport.release`.
+
+The receiver attaches the blocks without registering them in the resource
+tracker: they are owned (and unlinked) by the sender.
+
+.. autoclass:: SharedMemoryTransport
+   :members:
+
+"""
+
+import pickle
+import sys
+import threading
+from itertools import count
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+
+# the data are written after a header of 8 bytes (token and alignment)
+_size_header = 8
+
+# protects the creation and the attachment of the blocks (see _attach_block)
+_lock_blocks = threading.Lock()
+
+
+def _read_token(block):
+    return int.from_bytes(block.buf[:_size_header], "little")
+
+
+def _write_token(block, token):
+    block.buf[:_size_header] = token.to_bytes(_size_header, "little")
+
+
+def _attach_block(name):
+    """Attach a block without registering it in the resource tracker
+
+    The block is registered by the process which created it. With Python <
+    3.13, the (process wide) registration function is disabled during the
+    attachment, which is done with the lock held by all the creations and
+    attachments of this module.
+    """
+    if sys.version_info >= (3, 13):
+        return SharedMemory(name, track=False)
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None
+    try:
+        return SharedMemory(name)
+    finally:
+        resource_tracker.register = register
+
+
+class SharedMemoryTransport:
+    """Serialize objects with their large buffers in shared memory
+
+    The object returned by :func:`dumps` is small and can be sent through a
+    pipe. It can be deserialized in another process with :func:`loads`.
+
+    Parameters
+    ----------
+
+    nbytes_min : int
+
+      Buffers smaller than ``nbytes_min`` are serialized in the pickle.
+
+    """
+
+    def __init__(self, nbytes_min=65536):
+        self.nbytes_min = nbytes_min
+        self._blocks = []
+        self._attached = {}
+        self._tokens = count(1)
+        self._lock = threading.Lock()
+
+    def _get_free_block(self, nbytes):
+        """Get a free block (reused or created) and mark it as used"""
+        size = _size_header + nbytes
+        with self._lock:
+            free_blocks = [
+                block
+                for block in self._blocks
+                if _read_token(block) == 0 and size <= block.size <= 2 * size
+            ]
+            if free_blocks:
+                block = min(free_blocks, key=lambda block: block.size)
+            else:
+                with _lock_blocks:
+                    block = SharedMemory(create=True, size=size)
+                self._blocks.append(block)
+            token = next(self._tokens)
+            _write_token(block, token)
+        return block, token
+
+    def _attach(self, name):
+        with self._lock:
+            try:
+                return self._attached[name]
+            except KeyError:
+                with _lock_blocks:
+                    block = self._attached[name] = _attach_block(name)
+        return block
+
+    def dumps(self, obj):
+        """Serialize an object (large buffers copied in shared memory)"""
+        buffers = []
+
+        def buffer_callback(buffer):
+            if buffer.raw().nbytes < self.nbytes_min:
+                # serialized in-band
+                return True
+            buffers.append(buffer)
+            return False
+
+        data = pickle.dumps(obj, protocol=5, buffer_callback=buffer_callback)
+
+        descriptors = []
+        try:
+            for buffer in buffers:
+                with buffer.raw() as raw:
+                    nbytes = raw.nbytes
+                    block, token = self._get_free_block(nbytes)
+                    descriptors.append((block.name, nbytes, token))
+                    block.buf[_size_header : _size_header + nbytes] = raw
+        except BaseException:
+            self.release((data, descriptors))
+            raise
+
+        return data, descriptors
+
+    def release(self, message):
+        """Release the blocks of a message which is not going to be loaded
+
+        The blocks already reused for another message are not released.
+        """
+        _, descriptors = message
+        with self._lock:
+            blocks = {block.name: block for block in self._blocks}
+            for name, _, token in descriptors:
+                block = blocks.get(name)
+                if block is not None and _read_token(block) == token:
+                    _write_token(block, 0)
+
+    def loads(self, message):
+        """Deserialize an object and release the blocks of shared memory"""
+        data, descriptors = message
+        buffers = []
+        for name, nbytes, _ in descriptors:
+            block = self._attach(name)
+            buffers.append(
+                bytearray(block.buf[_size_header : _size_header + nbytes])
+            )
+            # the block can be reused by the sender
+            _write_token(block, 0)
+        return pickle.loads(data, buffers=buffers)
+
+    def close(self):
+        """Close the attached blocks and unlink the created blocks"""
+        with self._lock:
+            for block in self._attached.values():
+                block.close()
+            self._attached.clear()
+            for block in self._blocks:
+                block.close()
+                block.unlink()
+            self._blocks.clear()
@@ -0,0 +1,67 @@
+import os
+
+import pytest
+
+from fluidimage.executors.cpu_affinity import (
+    get_cpus_numa_nodes,
+    parse_cpulist,
+    set_cpus_and_threads,
+    split_cpus,
+)
+
+
+def test_parse_cpulist():
+    assert parse_cpulist("0-3,8,10-11\n") == [0, 1, 2, 3, 8, 10, 11]
+    assert parse_cpulist("") == []
+
+
+linux_only = pytest.mark.skipif(
+    not hasattr(os, "sched_getaffinity"), reason="no CPU affinity"
+)
+
+
+@linux_only
+def test_get_cpus_numa_nodes(tmp_path):
+    cpus_allowed = sorted(os.sched_getaffinity(0))
+    path_node = tmp_path / "node0"
+    path_node.mkdir()
+    (path_node / "cpulist").write_text(f"{cpus_allowed[0]}\n")
+    cpus_nodes = get_cpus_numa_nodes(tmp_path)
+    assert cpus_nodes[0] == [cpus_allowed[0]]
+    assert sum(cpus_nodes, []) == cpus_allowed
+
+
+def test_split_cpus():
+    cpus_nodes = [list(range(8)), list(range(8, 16))]
+
+    # the processes are distributed over the nodes
+    cpus_processes = split_cpus(4, 4, cpus_nodes)
+    assert cpus_processes == [
+        [0, 1, 2, 3],
+        [8, 9, 10, 11],
+        [4, 5, 6, 7],
+        [12, 13, 14, 15],
+    ]
+    assert split_cpus(2, cpus_nodes=cpus_nodes) == cpus_nodes
+
+    # a process using CPUs of 2 nodes
+    cpus_processes = split_cpus(3, 5, cpus_nodes)
+    assert len(set(sum(cpus_processes, []))) == 15
+
+    with pytest.raises(ValueError):
+        split_cpus(4, 5, cpus_nodes)
+
+
+@linux_only
+def test_set_cpus_and_threads():
+    from fluidimage.calcul import fft
+
+    cpus_allowed = os.sched_getaffinity(0)
+    nthreads = fft.nthreads
+    try:
+        set_cpus_and_threads(sorted(cpus_allowed)[:1], 2)
+        assert len(os.sched_getaffinity(0)) == 1
+        assert fft.nthreads == 2
+    finally:
+        os.sched_setaffinity(0, cpus_allowed)
+        fft.nthreads = nthreads
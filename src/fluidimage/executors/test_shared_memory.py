@@ -0,0 +1,110 @@
+from multiprocessing import Pipe, Process
+
+import numpy as np
+
+from fluidimage.executors.shared_memory import SharedMemoryTransport
+
+
+def _receive_and_send_back(conn):
+    transport = SharedMemoryTransport()
+    arrays = transport.loads(conn.recv())
+    conn.send(transport.dumps([2 * arr for arr in arrays]))
+    # wait for the parent before unlinking the blocks
+    conn.recv()
+    transport.close()
+
+
+def test_shared_memory_transport():
+    transport = SharedMemoryTransport(nbytes_min=1000)
+
+    arrays = [
+        np.arange(10, dtype=np.uint16),
+        np.ones((100, 100), dtype=np.uint16),
+        np.ones((100, 100), dtype=np.float32).T,
+    ]
+    data, descriptors = message = transport.dumps(arrays)
+    assert len(descriptors) == 2
+    assert len(data) < 1000
+
+    result = transport.loads(message)
+    for arr, arr_back in zip(arrays, result):
+        assert np.array_equal(arr, arr_back)
+        assert arr.dtype == arr_back.dtype
+    # the blocks are released and reused
+    transport.dumps(arrays)
+    assert len(transport._blocks) == 2
+
+    parent_conn, child_conn = Pipe()
+    process = Process(target=_receive_and_send_back, args=(child_conn,))
+    process.start()
+    parent_conn.send(transport.dumps(arrays))
+    result = transport.loads(parent_conn.recv())
+    parent_conn.send(None)
+    process.join()
+    assert process.exitcode == 0
+    for arr, arr_back in zip(arrays, result):
+        assert np.array_equal(2 * arr, arr_back)
+
+    transport.close()
+
+
+def test_shared_memory_release():
+    transport = SharedMemoryTransport(nbytes_min=1000)
+    arrays = [np.ones((100, 100), dtype=np.uint16)]
+
+    # a message never loaded (for example the receiver died)
+    message = transport.dumps(arrays)
+    transport.release(message)
+    message = transport.dumps(arrays)
+    assert len(transport._blocks) == 1
+
+    # the block has been reused so the old message is not released anymore
+    transport.loads(message)
+    message_new = transport.dumps(arrays)
+    transport.release(message)
+    transport.dumps(arrays)
+    assert len(transport._blocks) == 2
+    transport.release(message_new)
+
+    # error during the serialization: no block taken
+    class NotSerializable:
+        def __reduce__(self):
+            raise TypeError
+
+    try:
+        transport.dumps([arrays[0], NotSerializable()])
+    except TypeError:
+        pass
+    else:
+        raise AssertionError
+    transport.dumps(arrays)
+    assert len(transport._blocks) == 2
+
+    transport.close()
+
+
+def _attach_and_exit(conn):
+    transport = SharedMemoryTransport()
+    transport.loads(conn.recv())
+    # exit without closing: the block must not be unlinked
+    conn.send(None)
+
+
+def test_shared_memory_attach_untracked():
+    transport = SharedMemoryTransport(nbytes_min=1000)
+    arrays = [np.ones((100, 100), dtype=np.uint16)]
+
+    parent_conn, child_conn = Pipe()
+    process = Process(target=_attach_and_exit, args=(child_conn,))
+    process.start()
+    parent_conn.send(transport.dumps(arrays))
+    parent_conn.recv()
+    process.join()
+    assert process.exitcode == 0
+
+    # the block still exists and is reused
+    result = transport.loads(transport.dumps(arrays))
+    assert np.array_equal(result[0], arrays[0])
+    assert len(transport._blocks) == 1
+
+    transport.close()
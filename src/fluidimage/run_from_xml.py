@@ -29,6 +29,21 @@ def parse_args():
         type=str,
         default=None,
     )
+    parser.add_argument(
+        "--address-batches",
+        help=(
+            "Address (host:port) of the multi executor giving the xml files "
+            "of the batches (internal use)."
+        ),
+        type=str,
+        default=None,
+    )
+    parser.add_argument(
+        "--index-process",
+        help="Index of the process computing the batches (internal use).",
+        type=int,
+        default=None,
+    )
 
     return parser.parse_args()
 
@@ -47,7 +62,37 @@ def main():
 
     args = parse_args()
 
-    path_instructions_xml = args.path
+    if args.address_batches is not None:
+        return compute_batches(args)
+
+    return compute_from_xml(args.path, args)
+
+
+def compute_batches(args):
+    """Compute the batches pulled from a multi executor
+
+    The results of the previous batches are kept in the results of the
+    topologies, as in the processes of
+    :class:`fluidimage.executors.multi_exec_async.MultiExecutorAsync`, so that
+    the numbers of results saved by the executors are cumulative.
+
+    """
+    # pylint: disable=import-outside-toplevel
+    from fluidimage.executors.multi_exec_subproc import iter_paths_batches
+
+    host, port = args.address_batches.rsplit(":", 1)
+    results = []
+    action = None
+    for path_params in iter_paths_batches((host, int(port)), args.index_process):
+        action = compute_from_xml(path_params, args, results)
+        if action.executor._stopped_by_signal:
+            break
+        results = getattr(action, "results", results)
+    return action
+
+
+def compute_from_xml(path_instructions_xml, args, results=None):
+    """Compute with the instructions of a xml file"""
 
     params = ParamContainer(path_file=path_instructions_xml)
 
@@ -93,6 +138,9 @@ def main():
     modif_params_with_args(params, args)
     action = cls(params)
 
+    if results and hasattr(action, "results"):
+        action.results.extend(results)
+
     try:
         compute_kwargs = params.compute_kwargs
     except AttributeError:
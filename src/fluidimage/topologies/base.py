@@ -9,6 +9,14 @@
    :members:
    :private-members:
 
+.. autoclass:: JoinByNames
+   :members:
+   :private-members:
+
+.. autoclass:: LazySource
+   :members:
+   :private-members:
+
 .. autoclass:: TopologyBase
    :members:
    :private-members:
@@ -34,7 +42,13 @@ from warnings import warn
 
 from fluiddyn.io.query import query
 from fluidimage import ParamContainer, SerieOfArraysFromFiles, SeriesOfArrays
-from fluidimage.util import DEBUG, cstring, logger
+from fluidimage.util import (
+    DEBUG,
+    ImageLoader,
+    cstring,
+    estimate_nbytes,
+    logger,
+)
 
 from ..executors import (
     ExecutorBase,
@@ -118,6 +132,14 @@ class Work:
 
     - "eat key value": the work takes as argument a tuple ``(key, value)``.
 
+    The number of items processed at the same time by a work can be limited
+    with ``nb_max_workers`` (the limits of the executor for the io and cpu
+    works also apply).
+
+    For cheap works, the overhead of the executors for each item can be
+    amortized by computing the items by batches of ``batch_size`` items (only
+    for the async executors computing the works in threads).
+
     """
 
     def __init__(
@@ -128,6 +150,8 @@ class Work:
         input_queue=None,
         output_queue=None,
         kind: Union[str, Sequence[str]] = None,
+        nb_max_workers: int = None,
+        batch_size: int = None,
     ):
         self._kwargs = dict(
             name=name,
@@ -136,6 +160,8 @@ class Work:
             input_queue=input_queue,
             output_queue=output_queue,
             kind=kind,
+            nb_max_workers=nb_max_workers,
+            batch_size=batch_size,
         )
         # to avoid a pylint warning
         self.name = None
@@ -178,19 +204,86 @@ class Work:
 
 
 class Queue(OrderedDict):
-    """Represent a queue"""
+    """Represent a queue
+
+    The approximate number of bytes of the items is stored in the attribute
+    ``nbytes`` (see :func:`fluidimage.util.estimate_nbytes`).
+
+    If ``callback_change`` is not None, it is called when an item is added or
+    removed (used by the async executors to wake up the waiting tasks).
+
+    A queue can be filled lazily by a :class:`LazySource`, which adds new
+    items when items are removed.
+
+    """
 
     def __init__(self, name, kind=None):
         self.name = name
         self.kind = kind
+        self.callback_change = None
+        self.nbytes = 0
+        self._nbytes_items = {}
+        self.source = None
         super().__init__()
 
+    def _notify_change(self):
+        if self.callback_change is not None:
+            self.callback_change()
+
+    def _refill(self):
+        if self.source is not None:
+            self.source.refill()
+
+    def fill_from_source(self):
+        """Add all the remaining items of the source (if any)"""
+        if self.source is not None:
+            self.source.refill(exhaust=True)
+
+    def _forget_nbytes(self, key):
+        self.nbytes -= self._nbytes_items.pop(key, 0)
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self._forget_nbytes(key)
+        nbytes = self._nbytes_items[key] = estimate_nbytes(value)
+        self.nbytes += nbytes
+        self._notify_change()
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self._forget_nbytes(key)
+        self._notify_change()
+        self._refill()
+
+    def pop(self, key, *args):
+        result = super().pop(key, *args)
+        self._forget_nbytes(key)
+        self._notify_change()
+        self._refill()
+        return result
+
+    def popitem(self, last=True):
+        key, value = super().popitem(last=last)
+        self._forget_nbytes(key)
+        self._notify_change()
+        self._refill()
+        return key, value
+
+    def clear(self):
+        super().clear()
+        self._nbytes_items.clear()
+        self.nbytes = 0
+        self._notify_change()
+
     def __repr__(self):
         return f'\nqueue "{self.name}": ' + super().__repr__()
 
     def __copy__(self):
         new_one = type(self)(self.name, kind=self.kind)
         new_one.__dict__.update(self.__dict__)
+        new_one.nbytes = 0
+        new_one._nbytes_items = {}
+        new_one.source = None
 
         for key, values in self.items():
             new_one[key] = values
@@ -216,6 +309,178 @@ class QueueList(list):
         super().__init__()
 
 
+class LazySource:
+    """Fill queues lazily from an iterable
+
+    Instead of adding all items at startup, the items of ``iterable`` (for
+    example the indices of the series) are given one by one to the function
+    ``fill``, which adds items to the queues. The queue ``queue`` is refilled
+    when items are removed from it, so that it contains (while the iterable is
+    not exhausted) at least ``nb_items_lookahead`` items.
+
+    Parameters
+    ----------
+
+    iterable : iterable
+
+    fill : callable
+
+      Called with the items of the iterable.
+
+    queue : Queue
+
+      The queue refilled when it is consumed.
+
+    nb_items_lookahead : int
+
+    nb_items : None, int
+
+      Total number of items in the iterable (if known).
+
+    """
+
+    def __init__(self, iterable, fill, queue, nb_items_lookahead, nb_items=None):
+        self._iterator = iter(iterable)
+        self._fill = fill
+        self.queue = queue
+        self.nb_items_lookahead = nb_items_lookahead
+        self.nb_items = nb_items
+        self._is_refilling = False
+        queue.source = self
+        self.refill()
+
+    def refill(self, exhaust=False):
+        """Fill the queues until the look-ahead is reached"""
+        if self._is_refilling or self._iterator is None:
+            return
+        self._is_refilling = True
+        try:
+            while exhaust or len(self.queue) < self.nb_items_lookahead:
+                try:
+                    item = next(self._iterator)
+                except StopIteration:
+                    self._iterator = None
+                    if self.queue.source is self:
+                        self.queue.source = None
+                    break
+                self._fill(item)
+        finally:
+            self._is_refilling = False
+
+
+class JoinByNames:
+    """Join the arrays of a queue into subsets (for example couples)
+
+    The subsets of names (values of a queue of names) are indexed by name, so
+    that a subset is ready as soon as its last array arrives. The arrays are
+    reference-counted and removed from their queue when they are no longer
+    used by the pending subsets.
+
+    The cost of a call of :func:`pop_ready` is proportional to the number of
+    new items (and not to the number of pending subsets). The queues should
+    only be modified by adding items (and by this object).
+
+    """
+
+    def __init__(self):
+        # names of the arrays in the queue of arrays
+        self._names_available = set()
+        # names and number of missing arrays of the pending subsets
+        self._subsets = {}
+        self._nb_missing = {}
+        # keys of the pending subsets waiting for an array
+        self._keys_waiting = {}
+        # number of pending subsets using an array
+        self._refcounts = {}
+        self._keys_ready = []
+
+    def _index_subsets(self, queue_names, queue_arrays):
+        keys_removed = self._nb_missing.keys() - queue_names.keys()
+        for key in keys_removed:
+            del self._nb_missing[key]
+            for name in set(self._subsets.pop(key)):
+                self._release(name, queue_arrays)
+
+        for key, names in queue_names.items():
+            if key in self._nb_missing:
+                continue
+            nb_missing = 0
+            for name in set(names):
+                self._refcounts[name] = self._refcounts.get(name, 0) + 1
+                if name not in self._names_available:
+                    nb_missing += 1
+                    self._keys_waiting.setdefault(name, []).append(key)
+            self._subsets[key] = names
+            self._nb_missing[key] = nb_missing
+            if nb_missing == 0:
+                self._keys_ready.append(key)
+
+    def _index_arrays(self, queue_arrays):
+        self._names_available.intersection_update(queue_arrays.keys())
+        for name in queue_arrays.keys():
+            if name in self._names_available:
+                continue
+            self._names_available.add(name)
+            for key in self._keys_waiting.pop(name, ()):
+                if key not in self._nb_missing:
+                    continue
+                self._nb_missing[key] -= 1
+                if self._nb_missing[key] == 0:
+                    self._keys_ready.append(key)
+
+    def _release(self, name, queue_arrays):
+        self._refcounts[name] -= 1
+        if self._refcounts[name] == 0:
+            del self._refcounts[name]
+            self._names_available.discard(name)
+            queue_arrays.pop(name, None)
+
+    def is_name_used(self, name, queue_names):
+        """Check if an array is used by a pending subset of ``queue_names``
+
+        Such an array is not removed from its queue before the pending subsets
+        are ready. Only the subsets not yet indexed (the last items of
+        ``queue_names``) are looked at.
+
+        """
+        if name in self._refcounts:
+            return True
+        for key in reversed(queue_names.keys()):
+            if key in self._nb_missing:
+                break
+            if name in queue_names[key]:
+                return True
+        return False
+
+    def pop_ready(self, queue_names, queue_arrays):
+        """Pop the subsets for which all arrays are available
+
+        Returns a list of tuples ``(key, names, arrays)``. The subsets are
+        removed from ``queue_names`` and the arrays no longer used by the
+        pending subsets are removed from ``queue_arrays``.
+
+        """
+        # the items are indexed only if the queues have new items
+        if len(queue_names) != len(self._nb_missing):
+            self._index_subsets(queue_names, queue_arrays)
+        if len(queue_arrays) != len(self._names_available):
+            self._index_arrays(queue_arrays)
+
+        ready = []
+        keys_ready = self._keys_ready
+        self._keys_ready = []
+        for key in keys_ready:
+            if self._nb_missing.pop(key, None) != 0:
+                continue
+            names = self._subsets.pop(key)
+            del queue_names[key]
+            arrays = tuple(queue_arrays[name] for name in names)
+            ready.append((key, names, arrays))
+            for name in set(names):
+                self._release(name, queue_arrays)
+        return ready
+
+
 class TopologyBase:
     """Base class for topologies of processing.
 
@@ -233,6 +498,7 @@ class TopologyBase:
     """
 
     _short_name = "base"
+    _name_manifest_results = ".manifest_results.txt"
 
     @classmethod
     def _add_default_params_saving(cls, params):
@@ -268,6 +534,36 @@ class TopologyBase:
             ),
         )
 
+    @classmethod
+    def _add_default_params_loader(cls, params):
+        params._set_child(
+            "loader",
+            attribs={
+                "nb_items_read_ahead": 0,
+                "max_nbytes_cache": 0,
+                "drop_page_cache": False,
+            },
+            doc="""Reading of the images.
+
+- nb_items_read_ahead : int (0)
+
+  Minimum number of items (images or series) added in advance in the first
+  queues (at least `nb_items_queue_max` of the executor). If larger than 0,
+  the files of these items are read ahead by the kernel (``posix_fadvise``).
+  If 0, the files are not read ahead.
+
+- max_nbytes_cache : int (0)
+
+  Maximum number of bytes of the decoded images kept in a cache (0 for no
+  cache).
+
+- drop_page_cache : bool (False)
+
+  If True, the files are dropped from the page cache of the system after
+  reading (similar to direct I/O).
+""",
+        )
+
     def __init__(
         self,
         params=None,
@@ -289,6 +585,17 @@ class TopologyBase:
         self.works = []
         self.works_dict = {}
         self.executor = None
+        self._names_results_saved = None
+
+        p_loader = getattr(params, "loader", None)
+        if p_loader is None:
+            self._nb_items_read_ahead = 0
+            self.image_loader = ImageLoader()
+        else:
+            self._nb_items_read_ahead = p_loader.nb_items_read_ahead
+            self.image_loader = ImageLoader(
+                p_loader.max_nbytes_cache, p_loader.drop_page_cache
+            )
 
     def _init_path_dir_result(self, path_dir_src):
         p_saving = self.params.saving
@@ -297,6 +604,95 @@ class TopologyBase:
         )
         p_saving.path = self.path_dir_result
 
+    def _add_to_manifest_results(self, *names):
+        """Append the names of saved results to the manifest of the results
+
+        The manifest is an append-only text file (one name per line) in the
+        result directory. It is written with one call to ``write`` in append
+        mode so that the lines written by different workers do not mix.
+
+        """
+        text = "".join(f"{Path(name).name}\n" for name in names)
+        path_manifest = Path(self.path_dir_result) / self._name_manifest_results
+        with open(path_manifest, "a", encoding="utf-8") as file:
+            file.write(text)
+
+    def _is_name_result(self, name):
+        """Check if the name of a file in the result directory is a result
+
+        Used to build the manifest from the content of the directory. The
+        files written by the executors (logs and job data) are not results.
+
+        """
+        return not name.startswith(
+            (".", "log_", "job_", "indices_files_", "params_files_")
+        )
+
+    def get_names_results_saved(self):
+        """Get the set of the names of the results in the result directory
+
+        Used for the "complete" mode. The manifest of the results (written by
+        the save works, see :func:`_add_to_manifest_results`) is read and only
+        the files that it lists are checked (so that removed results are
+        recomputed). If there is no manifest (results computed by an older
+        version), the directory is listed with one call to :func:`os.scandir`
+        and the manifest is written.
+
+        The set is computed once per call of :func:`compute`.
+
+        """
+        if self._names_results_saved is not None:
+            return self._names_results_saved
+
+        path_dir = Path(self.path_dir_result)
+        path_manifest = path_dir / self._name_manifest_results
+        try:
+            with open(path_manifest, encoding="utf-8") as file:
+                names = set(line.strip() for line in file)
+            names.discard("")
+            names = set(name for name in names if (path_dir / name).exists())
+        except FileNotFoundError:
+            try:
+                with os.scandir(path_dir) as entries:
+                    names = set(
+                        entry.name
+                        for entry in entries
+                        if entry.is_file() and self._is_name_result(entry.name)
+                    )
+            except FileNotFoundError:
+                names = set()
+            else:
+                self._write_manifest_results(names)
+
+        self._names_results_saved = names
+        return names
+
+    def _write_manifest_results(self, names):
+        """Rewrite atomically the manifest of the results"""
+        path_manifest = Path(self.path_dir_result) / self._name_manifest_results
+        path_tmp = path_manifest.with_name(
+            f"{path_manifest.name}.{os.getpid()}.tmp"
+        )
+        try:
+            with open(path_tmp, "w", encoding="utf-8") as file:
+                file.write("".join(f"{name}\n" for name in sorted(names)))
+            os.replace(path_tmp, path_manifest)
+        except OSError as error:
+            logger.warning("Cannot write the manifest of the results: %s", error)
+
+    def _get_nb_items_lookahead(self):
+        """Number of items kept in advance in the queues filled lazily"""
+        try:
+            nb_items = self.executor.nb_items_queue_max
+        except AttributeError:
+            nb_items = 8
+        return max(nb_items, self._nb_items_read_ahead, 2)
+
+    def _read_ahead(self, path):
+        """Read ahead a file which is going to be read (if enabled)"""
+        if self._nb_items_read_ahead:
+            self.image_loader.read_ahead(path)
+
     def add_queue(self, name: str, kind: str = None):
         """Create a new queue."""
         if kind == "list":
@@ -314,8 +710,18 @@ class TopologyBase:
         input_queue=None,
         output_queue=None,
         kind: str = None,
+        nb_max_workers: int = None,
+        batch_size: int = None,
     ):
-        """Create a new work relating queues."""
+        """Create a new work relating queues.
+
+        ``nb_max_workers`` limits the number of items processed at the same
+        time by this work (by default only the limits of the executor apply).
+
+        With ``batch_size``, the async executors launch the work on batches of
+        at most ``batch_size`` items (see :class:`Work`).
+
+        """
         if func_or_cls is None:
             warn(f'func_or_cls is None for work "{name}"')
 
@@ -326,6 +732,8 @@ class TopologyBase:
             params_cls=params_cls,
             output_queue=output_queue,
             kind=kind,
+            nb_max_workers=nb_max_workers,
+            batch_size=batch_size,
         )
         self.works.append(work)
 
@@ -341,6 +749,7 @@ class TopologyBase:
         sequential=False,
         stop_if_error=False,
         kwargs_executor=None,
+        memory_max=None,
     ):
         """Compute (run the works until all queues are empty).
 
@@ -359,6 +768,14 @@ class TopologyBase:
 
         stop_if_error : bool, optional {False}
 
+        kwargs_executor : dict, optional
+
+        memory_max : int or str, optional
+
+          Memory budget for the items in the queues (in bytes, or str like
+          "8G"). The launches of the upstream works are throttled when it is
+          reached.
+
         """
 
         if sequential:
@@ -385,6 +802,9 @@ class TopologyBase:
             if kwargs_executor is None:
                 kwargs_executor = {}
 
+            if memory_max is not None:
+                kwargs_executor = {**kwargs_executor, "memory_max": memory_max}
+
             exec_class = import_executor_class(executor)
             self.executor = exec_class(
                 self,
@@ -396,6 +816,7 @@ class TopologyBase:
                 **kwargs_executor,
             )
 
+        self._names_results_saved = None
         self.executor.compute()
 
     def make_text_at_exit(self, time_since_start):
@@ -582,6 +1003,38 @@ class TopologyBaseFromSeries(TopologyBase, ABC):
 
         logger.info("Add %s image serie%s to compute.", nb_series, plural)
 
+    def fill_queues_from_series(
+        self, queue_subsets_of_names, queue_paths, join_subsets
+    ):
+        """Fill lazily the queues of the subsets of names and of the paths
+
+        The series are added when the queue of the paths is consumed (see
+        :class:`LazySource`). A path is not added again if its array is going
+        to be used by a pending subset (it is then still in the queue of the
+        paths, being read or in the queue of the arrays, see
+        :func:`JoinByNames.is_name_used`).
+
+        """
+
+        def fill_serie(item):
+            ind_serie, serie = item
+            for name, path in serie.get_name_path_arrays():
+                if name in queue_paths or join_subsets.is_name_used(
+                    name, queue_subsets_of_names
+                ):
+                    continue
+                queue_paths[name] = path
+                self._read_ahead(path)
+            queue_subsets_of_names[ind_serie] = serie.get_name_arrays()
+
+        LazySource(
+            self.series.items(),
+            fill_serie,
+            queue_paths,
+            self._get_nb_items_lookahead(),
+            nb_items=len(self.series),
+        )
+
 
 def _tuple_ints_from_str(line):
     return tuple(int(c.strip()) for c in line.strip()[1:-1].split(",") if c)
@@ -599,13 +1052,11 @@ class TopologyBaseFromImages(TopologyBase):
 
     def compute_indices_to_be_computed(self):
         """Compute the indices corresponding to the images to be computed"""
+        names_saved = self.get_names_results_saved()
         indices_images = []
         for indices in self.serie.iter_indices():
             name = self.serie.compute_name_from_indices(*indices)
-            path_im_output = (
-                self.path_dir_result / self._get_name_result_from_name(name)
-            )
-            if path_im_output.exists():
+            if self._get_name_result_from_name(name) in names_saved:
                 continue
             indices_images.append(indices)
         self._fix_indices_images(indices_images)
@@ -644,15 +1095,30 @@ class TopologyBaseFromImages(TopologyBase):
                 logger.warning("Nothing to do")
             return
 
-        names = []
-        for indices in indices_images:
+        def fill_image(indices):
             name = serie.compute_name_from_indices(*indices)
-            names.append(name)
-            path_im_input = str(self.path_dir_src / name)
-            output_queue[name] = path_im_input
-
-        nb_names = len(names)
-        logger.info("Add %s images to compute.", nb_names)
-        logger.info("First files to process: %s", names[:4])
+            path = str(self.path_dir_src / name)
+            output_queue[name] = path
+            self._read_ahead(path)
+
+        LazySource(
+            indices_images,
+            fill_image,
+            output_queue,
+            self._get_nb_items_lookahead(),
+            nb_items=len(indices_images),
+        )
 
-        logger.debug("All files: %s", names)
+        names = [
+            serie.compute_name_from_indices(*indices)
+            for indices in indices_images[:4]
+        ]
+        logger.info("Add %s images to compute.", len(indices_images))
+        logger.info("First files to process: %s", names)
+
+        if logger.isEnabledFor(DEBUG):
+            names = [
+                serie.compute_name_from_indices(*indices)
+                for indices in indices_images
+            ]
+            logger.debug("All files: %s", names)
@@ -14,7 +14,6 @@ from fluidimage import ParamContainer
 from fluidimage.data_objects.piv import get_name_bos
 from fluidimage.topologies.base import TopologyBaseFromImages
 from fluidimage.topologies.splitters import SplitterFromImages
-from fluidimage.util import imread
 from fluidimage.works import image2image
 from fluidimage.works.bos import WorkBOS
 
@@ -32,11 +31,6 @@ class SplitterBos(SplitterFromImages):
         self.params.reference = topology.path_reference
 
 
-def _imread(path):
-    image = imread(path)
-    return image, Path(path).name
-
-
 class TopologyBOS(TopologyBaseFromImages):
     """Topology for BOS computation.
 
@@ -85,6 +79,7 @@ class TopologyBOS(TopologyBaseFromImages):
         params = ParamContainer(tag="params")
 
         super()._add_default_params_saving(params)
+        super()._add_default_params_loader(params)
         WorkBOS._complete_params_with_default(params)
 
         params._set_child("preproc")
@@ -120,7 +115,7 @@ class TopologyBOS(TopologyBaseFromImages):
 
         self.add_work(
             "read array",
-            func_or_cls=_imread,
+            func_or_cls=self.imread,
             input_queue=queue_paths,
             output_queue=queue_arrays,
             kind="io",
@@ -158,12 +153,20 @@ class TopologyBOS(TopologyBaseFromImages):
     def save_bos_object(self, obj):
         """Save a BOS object"""
         ret = obj.save(self.path_dir_result, kind="bos")
+        self._add_to_manifest_results(ret)
         self.results.append(ret)
 
+    def imread(self, path):
+        """Read an image (with the image loader)"""
+        return self.image_loader(path), Path(path).name
+
     def calcul(self, tuple_image_path):
         """Compute a BOS field"""
         return self.main_work.calcul(tuple_image_path)
 
+    def _is_name_result(self, name):
+        return name.startswith("bos") and name.endswith(".h5")
+
     def _get_name_result_from_name(self, name):
         return get_name_bos(name, self.serie)
 
@@ -126,6 +126,7 @@ class TopologyImage2Image(TopologyBaseFromImages):
         name_file = Path(path).name
         path_out = self.path_dir_result / name_file
         imsave(path_out, image)
+        self._add_to_manifest_results(name_file)
         self.results.append(name_file)
 
 
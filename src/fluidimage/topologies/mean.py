@@ -15,11 +15,11 @@ import numpy as np
 from PIL import Image
 
 import fluidimage
-from fluiddyn.util.serieofarrays import SerieOfArraysFromFiles
 from fluidimage import ParamContainer
 from fluidimage.topologies.base import TopologyBaseFromImages
 from fluidimage.topologies.splitters import SplitterFromImages
 from fluidimage.util import imread
+from fluidimage.util.containers import create_serie
 from fluidimage.works import BaseWorkFromImage
 
 # from transonic import boost, Array
@@ -59,7 +59,7 @@ class TopologyMeanImage(TopologyBaseFromImages):
     def __init__(self, params, logging_level="info", nb_max_workers=None):
 
         p_images = params.images
-        self.serie = SerieOfArraysFromFiles(p_images.path, p_images.str_subset)
+        self.serie = create_serie(p_images.path, p_images.str_subset)
 
         super().__init__(
             params=params,
@@ -1,9 +1,15 @@
 """Utility to obtain the number of cores available
 
+The number of cores is limited by the CPUs allowed for the process and by the
+CPU quota of its cgroup (v1 or v2, for example in containers or Slurm jobs).
+The memory limit of the cgroup is also detected (``memory_limit``, None if
+there is no limit).
+
 """
 
 import re
 from multiprocessing import cpu_count
+from pathlib import Path, PurePosixPath
 
 from simpleeval import simple_eval
 
@@ -11,6 +17,127 @@ from fluidimage.config import get_config
 
 config = get_config()
 
+# values of the v1 memory limits meaning "no limit"
+_memory_limit_v1_max = 2**60
+
+
+def _read_text(path):
+    try:
+        return Path(path).read_text(encoding="utf-8").strip()
+    except OSError:
+        return None
+
+
+def _read_int(path):
+    text = _read_text(path)
+    try:
+        return int(text)
+    except (TypeError, ValueError):
+        return None
+
+
+def _get_paths_cgroups(path_proc_cgroup):
+    """Paths of the cgroups of the process for each controller
+
+    The path for cgroup v2 (unified hierarchy) is associated with "".
+
+    """
+    paths = {}
+    text = _read_text(path_proc_cgroup)
+    if text is None:
+        return paths
+    for line in text.splitlines():
+        try:
+            _, controllers, path = line.split(":", 2)
+        except ValueError:
+            continue
+        for controller in controllers.split(","):
+            paths[controller] = path
+    return paths
+
+
+def _get_dirs_cgroup(path_root, path_cgroup):
+    """Existing directories of a cgroup and of its parents
+
+    The limits of the parents also apply. If the cgroup is not visible (no
+    cgroup namespace), only the root of the hierarchy is used.
+
+    """
+    path_root = Path(path_root)
+    parts = [part for part in PurePosixPath(path_cgroup).parts if part != "/"]
+    dirs = [
+        path_root.joinpath(*parts[:index])
+        for index in range(len(parts), -1, -1)
+    ]
+    return [path_dir for path_dir in dirs if path_dir.is_dir()]
+
+
+def get_cpu_quota_cgroup(
+    path_root="/sys/fs/cgroup", path_proc_cgroup="/proc/self/cgroup"
+):
+    """Get the CPU quota of the process (in number of cores, None if no quota)
+
+    Supports cgroup v2 (``cpu.max``) and v1 (``cpu.cfs_quota_us`` and
+    ``cpu.cfs_period_us``).
+
+    """
+    paths = _get_paths_cgroups(path_proc_cgroup)
+    path_root = Path(path_root)
+    quotas = []
+
+    if "" in paths:
+        for path_dir in _get_dirs_cgroup(path_root, paths[""]):
+            text = _read_text(path_dir / "cpu.max")
+            if text is None:
+                continue
+            words = text.split()
+            if words[0] == "max":
+                continue
+            try:
+                period = int(words[1]) if len(words) > 1 else 100000
+                quotas.append(int(words[0]) / period)
+            except ValueError:
+                continue
+
+    if "cpu" in paths:
+        for name_dir in ("cpu", "cpu,cpuacct"):
+            for path_dir in _get_dirs_cgroup(path_root / name_dir, paths["cpu"]):
+                quota = _read_int(path_dir / "cpu.cfs_quota_us")
+                period = _read_int(path_dir / "cpu.cfs_period_us")
+                if quota is not None and quota > 0 and period:
+                    quotas.append(quota / period)
+
+    return min(quotas, default=None)
+
+
+def get_memory_limit_cgroup(
+    path_root="/sys/fs/cgroup", path_proc_cgroup="/proc/self/cgroup"
+):
+    """Get the memory limit of the process (in bytes, None if no limit)
+
+    Supports cgroup v2 (``memory.max``) and v1 (``memory.limit_in_bytes``).
+
+    """
+    paths = _get_paths_cgroups(path_proc_cgroup)
+    path_root = Path(path_root)
+    limits = []
+
+    if "" in paths:
+        for path_dir in _get_dirs_cgroup(path_root, paths[""]):
+            limit = _read_int(path_dir / "memory.max")
+            if limit is not None:
+                limits.append(limit)
+
+    if "memory" in paths:
+        path_root_memory = path_root / "memory"
+        for path_dir in _get_dirs_cgroup(path_root_memory, paths["memory"]):
+            limit = _read_int(path_dir / "memory.limit_in_bytes")
+            if limit is not None and limit < _memory_limit_v1_max:
+                limits.append(limit)
+
+    return min(limits, default=None)
+
+
 nb_cores = cpu_count()
 
 allow_hyperthreading = False
@@ -52,3 +179,11 @@ try:  # should work on UNIX
 
 except IOError:
     pass
+
+# CPU quota (for example in containers): more workers than the quota would
+# only oversubscribe the allowed CPU time
+cpu_quota = get_cpu_quota_cgroup()
+if cpu_quota is not None:
+    nb_cores = max(1, min(nb_cores, int(cpu_quota)))
+
+memory_limit = get_memory_limit_cgroup()
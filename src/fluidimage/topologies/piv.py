@@ -14,9 +14,11 @@ from pathlib import Path
 from fluidimage import ParamContainer, SeriesOfArrays
 from fluidimage.data_objects.piv import ArrayCouple, get_name_piv
 from fluidimage.topologies import TopologyBaseFromSeries
+from fluidimage.topologies.base import JoinByNames
 from fluidimage.topologies.nb_cpu_cores import nb_cores
 from fluidimage.topologies.splitters import SplitterFromSeries
-from fluidimage.util import imread, logger
+from fluidimage.util import logger
+from fluidimage.util.containers import create_serie
 from fluidimage.works import image2image
 from fluidimage.works.piv import WorkPIV
 
@@ -69,6 +71,7 @@ class TopologyPIV(TopologyBaseFromSeries):
         params = ParamContainer(tag="params")
 
         super()._add_default_params_saving(params)
+        super()._add_default_params_loader(params)
 
         cls.WorkVelocimetry._complete_params_with_default(params)
 
@@ -81,7 +84,7 @@ class TopologyPIV(TopologyBaseFromSeries):
         self.params = params
 
         self.series = SeriesOfArrays(
-            params.series.path,
+            create_serie(params.series.path),
             params.series.str_subset,
             ind_start=params.series.ind_start,
             ind_stop=params.series.ind_stop,
@@ -95,6 +98,9 @@ class TopologyPIV(TopologyBaseFromSeries):
             nb_max_workers=nb_max_workers,
         )
 
+        # index of the couples of names waiting for their arrays
+        self._join_couples = JoinByNames()
+
         queue_couples_of_names = self.add_queue("couples of names")
         queue_paths = self.add_queue("paths")
         queue_arrays = queue_arrays1 = self.add_queue("arrays")
@@ -112,7 +118,7 @@ class TopologyPIV(TopologyBaseFromSeries):
         )
         self.add_work(
             "read array",
-            func_or_cls=imread,
+            func_or_cls=self.image_loader,
             input_queue=queue_paths,
             output_queue=queue_arrays,
             kind="io",
@@ -157,40 +163,52 @@ class TopologyPIV(TopologyBaseFromSeries):
             kind="io",
         )
         self.results = []
+        self._nbytes_result_max = 0
 
     def save_piv_object(self, obj):
         """Save a PIV object"""
         ret = obj.save(self.path_dir_result)
+        self._add_to_manifest_results(ret)
         self.results.append(ret)
+        nbytes = getattr(obj, "nbytes", None)
+        if nbytes is not None:
+            self._nbytes_result_max = max(self._nbytes_result_max, nbytes)
+            logger.debug(
+                "Result %s saved (%.2f MB in memory)", Path(ret).name, nbytes / 1e6
+            )
+
+    def _is_name_result(self, name):
+        return name.startswith("piv_") and name.endswith(".h5")
 
     def compute_indices_to_be_computed(self):
         """Compute the indices corresponding to the series to be computed"""
+        names_saved = self.get_names_results_saved()
         index_series = []
         for ind_serie, serie in self.series.items():
             name_piv = get_name_piv(serie, prefix="piv")
-            if not (self.path_dir_result / name_piv).exists():
+            if name_piv not in names_saved:
                 index_series.append(ind_serie)
         return index_series
 
     _message_empty_series = "add 0 couple. No PIV to compute."
 
     def fill_couples_of_names_and_paths(self, input_queue, output_queues):
-        """Fill the two first queues"""
+        """Fill the two first queues (lazily)"""
         assert input_queue is None
         queue_couples_of_names = output_queues[0]
         queue_paths = output_queues[1]
 
         self.init_series()
+        self._join_couples = JoinByNames()
 
         for iserie, serie in enumerate(self.series):
             if iserie > 1:
                 break
             logger.info("Files of serie %s: %s", iserie, serie.get_name_arrays())
 
-        for ind_serie, serie in self.series.items():
-            queue_couples_of_names[ind_serie] = serie.get_name_arrays()
-            for name, path in serie.get_name_path_arrays():
-                queue_paths[name] = path
+        self.fill_queues_from_series(
+            queue_couples_of_names, queue_paths, self._join_couples
+        )
 
     def make_couples(self, input_queues, output_queue):
         """Make the couples of arrays"""
@@ -201,36 +219,23 @@ class TopologyPIV(TopologyBaseFromSeries):
             params_mask = self.params.mask
         except AttributeError:
             params_mask = None
-        # for each name couple
-        for key, couple in tuple(queue_couples_of_names.items()):
-            # if correspondant arrays are available, make an array couple
-            if (
-                couple[0] in queue_arrays.keys()
-                and couple[1] in queue_arrays.keys()
-            ):
+        for key, couple, arrays in self._join_couples.pop_ready(
+            queue_couples_of_names, queue_arrays
+        ):
+            array1, array2 = arrays
+            if isinstance(array1, Exception):
+                array_couple = array1
+            elif isinstance(array2, Exception):
+                array_couple = array2
+            else:
                 serie = copy.copy(self.series.get_serie_from_index(key))
-                array1 = queue_arrays[couple[0]]
-                array2 = queue_arrays[couple[1]]
-
-                if isinstance(array1, Exception):
-                    array_couple = array1
-                elif isinstance(array2, Exception):
-                    array_couple = array2
-                else:
-                    array_couple = ArrayCouple(
-                        names=(couple[0], couple[1]),
-                        arrays=(array1, array2),
-                        params_mask=params_mask,
-                        serie=serie,
-                    )
-
-                output_queue[key] = array_couple
-                del queue_couples_of_names[key]
-                # remove the image_array if it not will be used anymore
-                if not queue_couples_of_names.is_name_in_values(couple[0]):
-                    del queue_arrays[couple[0]]
-                if not queue_couples_of_names.is_name_in_values(couple[1]):
-                    del queue_arrays[couple[1]]
+                array_couple = ArrayCouple(
+                    names=(couple[0], couple[1]),
+                    arrays=(array1, array2),
+                    params_mask=params_mask,
+                    serie=serie,
+                )
+            output_queue[key] = array_couple
 
     def make_text_at_exit(self, time_since_start):
         """Make a text printed at exit"""
@@ -249,6 +254,11 @@ class TopologyPIV(TopologyBaseFromSeries):
                 f" ({nb_results} piv fields, {time_since_start / nb_results:.2f} s/field,"
                 f" {time_since_start * num_cores_used / nb_results:.2f} s.CPU/field)."
             )
+            if self._nbytes_result_max:
+                txt += (
+                    "\nmemory used by the largest result: "
+                    f"{self._nbytes_result_max / 1e6:.2f} MB"
+                )
         else:
             txt += "."
         txt += "\npath results:\n" + str(Path(self.path_dir_result).resolve())
@@ -17,8 +17,9 @@ from fluidimage import SeriesOfArrays
 from fluidimage.data_objects.preproc import ArraySerie as ArraySubset
 from fluidimage.data_objects.preproc import PreprocResults, get_name_preproc
 from fluidimage.topologies import TopologyBaseFromSeries
+from fluidimage.topologies.base import JoinByNames
 from fluidimage.topologies.splitters import SplitterFromSeries
-from fluidimage.util import imread
+from fluidimage.util.containers import create_serie, get_name_file_frame
 from fluidimage.works import image2image
 from fluidimage.works.preproc import (
     WorkPreproc,
@@ -125,6 +126,7 @@ Parameters describing image loading prior to preprocessing.
         )
 
         super()._add_default_params_saving(params)
+        super()._add_default_params_loader(params)
 
         params.saving._set_attribs(
             {
@@ -177,7 +179,7 @@ Parameters describing image saving after preprocessing.
         self.display = self.preproc_work.display
 
         self.series = SeriesOfArrays(
-            params.series.path,
+            create_serie(params.series.path),
             params.series.str_subset,
             ind_start=params.series.ind_start,
             ind_stop=params.series.ind_stop,
@@ -199,6 +201,9 @@ Parameters describing image saving after preprocessing.
             nb_max_workers=nb_max_workers,
         )
 
+        # index of the subsets of names waiting for their arrays
+        self._join_subsets = JoinByNames()
+
         # Define waiting queues
         queue_subsets_of_names = self.add_queue("subsets of filenames")
         queue_paths = self.add_queue("image paths")
@@ -219,7 +224,7 @@ Parameters describing image saving after preprocessing.
 
         self.add_work(
             "imread",
-            func_or_cls=imread,
+            func_or_cls=self.image_loader,
             input_queue=queue_paths,
             output_queue=queue_arrays,
             kind="io",
@@ -261,11 +266,16 @@ Parameters describing image saving after preprocessing.
 
     def save_preproc_object(self, obj: PreprocResults):
         """Save a preprocessing object"""
+        names = [get_name_file_frame(key) for key in obj.data]
+        if self.params.saving.format == "h5":
+            names = [os.path.splitext(name)[0] + ".h5" for name in names]
         ret = obj.save(path=self.path_dir_result)
+        self._add_to_manifest_results(*names)
         self.results.append(ret)
 
     def compute_indices_to_be_computed(self):
         """Compute the indices corresponding to the series to be computed"""
+        names_saved = self.get_names_results_saved()
         index_subsets = []
         for ind_subset, subset in self.series.items():
             names_serie = subset.get_name_arrays()
@@ -276,46 +286,33 @@ Parameters describing image saving after preprocessing.
                 self.series.nb_series,
                 self.params.saving.format,
             )
-            if not (self.path_dir_result / name_preproc).exists():
+            if name_preproc not in names_saved:
                 index_subsets.append(ind_subset)
         return index_subsets
 
     def fill_subsets_of_names_and_paths(
         self, input_queue: None, output_queues: Tuple[Dict]
     ) -> None:
-        """Fill the two first queues"""
+        """Fill the two first queues (lazily)"""
         assert input_queue is None
         queue_subsets_of_names, queue_paths = output_queues
 
         self.init_series()
+        self._join_subsets = JoinByNames()
 
-        for ind_subset, subset in self.series.items():
-            queue_subsets_of_names[ind_subset] = subset.get_name_arrays()
-            for name, path in subset.get_name_path_arrays():
-                queue_paths[name] = path
+        self.fill_queues_from_series(
+            queue_subsets_of_names, queue_paths, self._join_subsets
+        )
 
     def make_subsets(self, input_queues: Tuple[Dict], output_queue: Dict) -> bool:
         """Create the subsets of images"""
         queue_subsets_of_names, queue_arrays = input_queues
-        # for each name subset
-        for key, names in list(queue_subsets_of_names.items()):
-            # if correspondant arrays have been loaded from images,
-            # make an array subset
-            if all([name in queue_arrays for name in names]):
-                arrays = (queue_arrays[name] for name in names)
-                serie = copy.copy(self.series.get_serie_from_index(key))
-
-                array_subset = ArraySubset(
-                    names=names, arrays=arrays, serie=serie
-                )
-                output_queue[key] = array_subset
-                del queue_subsets_of_names[key]
-                # remove the image_array if it not will be used anymore
-
-                key_arrays = list(queue_arrays.keys())
-                for key_array in key_arrays:
-                    if not queue_subsets_of_names.is_name_in_values(key_array):
-                        del queue_arrays[key_array]
+        for key, names, arrays in self._join_subsets.pop_ready(
+            queue_subsets_of_names, queue_arrays
+        ):
+            serie = copy.copy(self.series.get_serie_from_index(key))
+            array_subset = ArraySubset(names=names, arrays=arrays, serie=serie)
+            output_queue[key] = array_subset
 
 
 Topology = TopologyPreproc
@@ -24,7 +24,8 @@ from abc import ABC, abstractmethod
 from copy import deepcopy
 from pathlib import Path
 
-from fluiddyn.util.serieofarrays import SerieOfArraysFromFiles, SeriesOfArrays
+from fluiddyn.util.serieofarrays import SeriesOfArrays
+from fluidimage.util.containers import create_serie
 
 
 def split_range(start0, stop0, step0, num_parts):
@@ -153,7 +154,7 @@ class SplitterFromSeries(SplitterCompleteAware):
         if topology is None:
             p_series = self._get_params_series(params)
             self.series = SeriesOfArrays(
-                p_series.path,
+                create_serie(p_series.path),
                 p_series.str_subset,
                 ind_start=p_series.ind_start,
                 ind_stop=p_series.ind_stop,
@@ -224,7 +225,7 @@ class SplitterFromImages(SplitterCompleteAware):
 
         if topology is None:
             p_images = self._get_params_images(params)
-            self.serie = SerieOfArraysFromFiles(
+            self.serie = create_serie(
                 p_images.path,
                 p_images.str_subset,
             )
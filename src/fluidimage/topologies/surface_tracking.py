@@ -259,6 +259,7 @@ Parameters indicating the input image set.
         name_file = Path(path).name
         path_out = self.path_dir_result / name_file
         imsave_h5(path_out, image, splitext=False)
+        self._add_to_manifest_results(name_file)
 
     def fill_queue_paths(self, input_queue, output_queues):
         assert input_queue is None
@@ -271,11 +272,12 @@ Parameters indicating the input image set.
             return
 
         names = serie.get_name_arrays()
+        if self.how_saving == "complete":
+            names_saved = self.get_names_results_saved()
         for name in names:
-            path_im_output = self.path_dir_result / name
             path_im_input = str(self.path_dir_src / name)
             if self.how_saving == "complete":
-                if not path_im_output.exists():
+                if name not in names_saved:
                     queue_paths[name] = path_im_input
             else:
                 queue_paths[name] = path_im_input
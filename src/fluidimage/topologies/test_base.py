@@ -0,0 +1,139 @@
+from fluidimage import SeriesOfArrays
+from fluidimage.topologies.base import (
+    JoinByNames,
+    LazySource,
+    Queue,
+    TopologyBase,
+    TopologyBaseFromSeries,
+)
+
+
+class TopologyFromSeries(TopologyBaseFromSeries):
+    def compute_indices_to_be_computed(self):
+        return list(self.series.iter_indices())
+
+
+def test_join_by_names():
+    queue_names = Queue("couples of names")
+    queue_arrays = Queue("arrays")
+    join = JoinByNames()
+
+    for index in range(4):
+        queue_names[index] = (f"im{index}", f"im{index + 1}")
+    queue_names[4] = ("im4", "im4")
+
+    assert join.pop_ready(queue_names, queue_arrays) == []
+
+    queue_arrays["im1"] = 1
+    queue_arrays["im0"] = 0
+    queue_arrays["im3"] = 3
+    assert join.pop_ready(queue_names, queue_arrays) == [
+        (0, ("im0", "im1"), (0, 1))
+    ]
+    # im0 is no longer used, im1 is still used by the couple 1
+    assert list(queue_arrays.keys()) == ["im1", "im3"]
+    assert list(queue_names.keys()) == [1, 2, 3, 4]
+
+    queue_arrays["im2"] = 2
+    assert join.pop_ready(queue_names, queue_arrays) == [
+        (1, ("im1", "im2"), (1, 2)),
+        (2, ("im2", "im3"), (2, 3)),
+    ]
+    assert list(queue_arrays.keys()) == ["im3"]
+
+    queue_arrays["im4"] = 4
+    assert join.pop_ready(queue_names, queue_arrays) == [
+        (3, ("im3", "im4"), (3, 4)),
+        (4, ("im4", "im4"), (4, 4)),
+    ]
+    assert not queue_arrays
+    assert not queue_names
+
+
+def test_fill_queues_from_series(tmp_path):
+    # couples of non-adjacent images: an image is used by two couples which
+    # are not added at the same time in the queues
+    for index in range(40):
+        (tmp_path / f"im{index:02d}.png").touch()
+
+    topology = TopologyFromSeries(
+        path_dir_src=tmp_path, path_dir_result=tmp_path
+    )
+    topology.series = SeriesOfArrays(tmp_path, "i:i+7:6")
+    # the look-ahead cannot be reduced by the read-ahead
+    topology._nb_items_read_ahead = 1
+    assert topology._get_nb_items_lookahead() == 8
+    topology._get_nb_items_lookahead = lambda: 4
+
+    queue_names = Queue("couples of names")
+    queue_paths = Queue("paths")
+    queue_arrays = Queue("arrays")
+    join = JoinByNames()
+    topology.fill_queues_from_series(queue_names, queue_paths, join)
+
+    # one image read at a time and the couples made as soon as possible
+    couples = []
+    nb_reads = 0
+    while queue_paths:
+        name, _ = queue_paths.pop_first_item()
+        nb_reads += 1
+        queue_arrays[name] = name
+        for key, names, arrays in join.pop_ready(queue_names, queue_arrays):
+            assert arrays == names
+            couples.append(key)
+
+    assert couples == list(range(34))
+    assert not queue_names
+    assert not queue_arrays
+    # the images used by two couples are read again only if they were freed
+    assert 40 <= nb_reads <= 68
+
+
+def test_lazy_source():
+    queue = Queue("paths")
+
+    def fill(index):
+        queue[f"im{index}"] = f"path{index}"
+
+    source = LazySource(range(10), fill, queue, 3, nb_items=10)
+    assert source.nb_items == 10
+    assert list(queue.keys()) == ["im0", "im1", "im2"]
+
+    assert queue.pop_first_item() == ("im0", "path0")
+    assert list(queue.keys()) == ["im1", "im2", "im3"]
+
+    queue.fill_from_source()
+    assert len(queue) == 9
+    assert queue.source is None
+
+    while queue:
+        queue.pop_first_item()
+    assert not queue
+
+
+def test_manifest_results(tmp_path):
+    path_dir_result = tmp_path / "results"
+    path_dir_result.mkdir()
+    for name in ("a.h5", "b.h5", "log_2024.txt"):
+        (path_dir_result / name).touch()
+    (path_dir_result / "job_2024").mkdir()
+
+    topology = TopologyBase(
+        path_dir_src=tmp_path, path_dir_result=path_dir_result
+    )
+    # no manifest: the directory is listed (without the files of the executors)
+    assert topology.get_names_results_saved() == {"a.h5", "b.h5"}
+    path_manifest = path_dir_result / topology._name_manifest_results
+    assert path_manifest.read_text() == "a.h5\nb.h5\n"
+
+    (path_dir_result / "c.h5").touch()
+    topology._add_to_manifest_results(str(path_dir_result / "c.h5"))
+    # a file not saved by a save work is not a result
+    (path_dir_result / "d.h5").touch()
+    topology._names_results_saved = None
+    assert topology.get_names_results_saved() == {"a.h5", "b.h5", "c.h5"}
+
+    # a removed result has to be detected
+    (path_dir_result / "a.h5").unlink()
+    topology._names_results_saved = None
+    assert topology.get_names_results_saved() == {"b.h5", "c.h5"}
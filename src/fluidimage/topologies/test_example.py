@@ -1,5 +1,6 @@
 import sys
 
+import numpy as np
 import pytest
 
 from fluidimage.executors import supported_multi_executors
@@ -75,3 +76,117 @@ def test_topo_example(tmp_path_karman, executor):
 
     assert len(path_files) > 0, "No files saved"
     assert len(path_files) == 2, "Bad number of saved files"
+
+
+@pytest.mark.parametrize("executor", ["exec_async", "exec_async_multi"])
+def test_topo_example_memory_max(tmp_path_karman, executor):
+    params = TopologyExample.create_default_params()
+    params["path_input"] = tmp_path_karman
+    path_dir_result = tmp_path_karman.parent / f"Images.{executor}_memory_max"
+    params["path_dir_result"] = path_dir_result
+
+    topology = TopologyExample(params, logging_level="info")
+    # very small budget: the works are throttled but the computation finishes
+    topology.compute(executor, nb_max_workers=2, memory_max="1k")
+    assert topology.executor.memory_max == 1000
+    assert len(tuple(path_dir_result.glob("Karman*"))) == 2
+
+
+@pytest.mark.parametrize("priority_sink_first", [True, False])
+def test_topo_example_priority(tmp_path_karman, priority_sink_first):
+    params = TopologyExample.create_default_params()
+    params["path_input"] = tmp_path_karman
+    path_dir_result = tmp_path_karman.parent / f"Images.{priority_sink_first}"
+    params["path_dir_result"] = path_dir_result
+
+    topology = TopologyExample(params, logging_level="info")
+    topology.compute(
+        "exec_async",
+        nb_max_workers=2,
+        kwargs_executor={"priority_sink_first": priority_sink_first},
+    )
+    distances = topology.executor._distances_to_sink
+    assert distances["save"] == 0
+    assert distances["read array"] > distances["cpu1"] > distances["cpu2"]
+    assert len(tuple(path_dir_result.glob("Karman*"))) == 2
+
+
+def test_topo_example_nb_max_workers_io_cpu(tmp_path_karman):
+    params = TopologyExample.create_default_params()
+    params["path_input"] = tmp_path_karman
+    path_dir_result = tmp_path_karman.parent / "Images.io_cpu"
+    params["path_dir_result"] = path_dir_result
+
+    topology = TopologyExample(params, logging_level="info")
+    topology.works_dict["cpu1"].nb_max_workers = 1
+    topology.compute(
+        "exec_async",
+        kwargs_executor={"nb_max_workers_io": 1, "nb_max_workers_cpu": 3},
+    )
+    executor = topology.executor
+    assert executor.nb_max_workers_io == 1
+    assert executor.nb_max_workers_cpu == 3
+    assert len(tuple(path_dir_result.glob("Karman*"))) == 2
+
+    text_log = executor._log_path.read_text()
+    assert "  nb_max_workers_io = 1\n" in text_log
+    assert "  nb_max_workers_cpu = 3\n" in text_log
+
+    # default nb_max_workers_io from the latency of the input storage
+    path_dir_result = tmp_path_karman.parent / "Images.io_probe"
+    params["path_dir_result"] = path_dir_result
+    topology = TopologyExample(params, logging_level="info")
+    topology.compute("exec_async")
+    executor = topology.executor
+    assert executor.latency_storage is not None
+    assert executor.nb_max_workers_io >= 4
+
+
+@pytest.mark.parametrize("executor", ["exec_async", "exec_async_sequential"])
+def test_topo_example_batch_size(tmp_path_karman, executor):
+    params = TopologyExample.create_default_params()
+    params["path_input"] = tmp_path_karman
+    path_dir_result = tmp_path_karman.parent / f"Images.{executor}_batch"
+    params["path_dir_result"] = path_dir_result
+
+    topology = TopologyExample(params, logging_level="info")
+    for name in ("read array", "cpu1", "save"):
+        topology.works_dict[name].batch_size = 3
+    topology.compute(executor, nb_max_workers=2)
+
+    # same results, errors and logs as without batches
+    log = topology.read_log_data()
+    assert [
+        len(log.durations[key]) for key in ("read_array", "cpu1", "cpu2", "save")
+    ] == [4, 3, 2, 2]
+    assert len(tuple(path_dir_result.glob("Karman*"))) == 2
+    nb_items_running = topology.executor._nb_items_running
+    assert all(value == 0 for value in nb_items_running.values())
+
+
+def test_topo_example_batch_size_max(tmp_path_karman):
+    params = TopologyExample.create_default_params()
+    params["path_input"] = tmp_path_karman
+    params["path_dir_result"] = tmp_path_karman.parent / "Images.batch_max"
+
+    topology = TopologyExample(params, logging_level="info")
+    work = topology.works_dict["cpu1"]
+    work.batch_size = 10
+    topology.compute(
+        "exec_async", nb_max_workers=2, kwargs_executor={"nb_items_queue_max": 4}
+    )
+    executor = topology.executor
+
+    # the task of the batch and another running item
+    executor._nb_items_running[work.name] = 2
+    assert executor._get_size_batch_max(work) == 3
+    work.output_queue["a"] = np.zeros(100, dtype=np.uint8)
+    assert executor._get_size_batch_max(work) == 2
+    work.nb_max_workers = 2
+    assert executor._get_size_batch_max(work) == 1
+    work.nb_max_workers = None
+    executor.memory_max = executor._get_nbytes_queues() + 100
+    assert executor._get_size_batch_max(work) == 1
+    # at least one item
+    executor._nb_items_running[work.name] = 10
+    assert executor._get_size_batch_max(work) == 1
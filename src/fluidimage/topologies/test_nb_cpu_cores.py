@@ -0,0 +1,52 @@
+from fluidimage.topologies.nb_cpu_cores import (
+    get_cpu_quota_cgroup,
+    get_memory_limit_cgroup,
+)
+
+
+def test_cgroup_v2(tmp_path):
+    path_proc_cgroup = tmp_path / "cgroup"
+    path_proc_cgroup.write_text("0::/job/step\n")
+
+    path_root = tmp_path / "sys_fs_cgroup"
+    path_step = path_root / "job/step"
+    path_step.mkdir(parents=True)
+
+    kwargs = dict(path_root=path_root, path_proc_cgroup=path_proc_cgroup)
+    assert get_cpu_quota_cgroup(**kwargs) is None
+    assert get_memory_limit_cgroup(**kwargs) is None
+
+    (path_step / "cpu.max").write_text("max 100000\n")
+    (path_step / "memory.max").write_text("max\n")
+    assert get_cpu_quota_cgroup(**kwargs) is None
+    assert get_memory_limit_cgroup(**kwargs) is None
+
+    # the limits of the parents also apply
+    (path_root / "job/cpu.max").write_text("1600000 100000\n")
+    (path_root / "job/memory.max").write_text("8000000000\n")
+    (path_step / "memory.max").write_text("4000000000\n")
+    assert get_cpu_quota_cgroup(**kwargs) == 16
+    assert get_memory_limit_cgroup(**kwargs) == 4_000_000_000
+
+
+def test_cgroup_v1(tmp_path):
+    path_proc_cgroup = tmp_path / "cgroup"
+    path_proc_cgroup.write_text(
+        "4:memory:/docker/abc\n2:cpu,cpuacct:/docker/abc\n1:name=systemd:/\n"
+    )
+    path_root = tmp_path / "sys_fs_cgroup"
+    # without cgroup namespace, only the root of the hierarchy is visible
+    path_cpu = path_root / "cpu,cpuacct"
+    path_cpu.mkdir(parents=True)
+    (path_cpu / "cpu.cfs_quota_us").write_text("250000\n")
+    (path_cpu / "cpu.cfs_period_us").write_text("100000\n")
+    path_memory = path_root / "memory/docker/abc"
+    path_memory.mkdir(parents=True)
+    (path_memory / "memory.limit_in_bytes").write_text("9223372036854771712\n")
+
+    kwargs = dict(path_root=path_root, path_proc_cgroup=path_proc_cgroup)
+    assert get_cpu_quota_cgroup(**kwargs) == 2.5
+    assert get_memory_limit_cgroup(**kwargs) is None
+
+    (path_memory / "memory.limit_in_bytes").write_text("2000000000\n")
+    assert get_memory_limit_cgroup(**kwargs) == 2_000_000_000
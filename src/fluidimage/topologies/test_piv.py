@@ -1,7 +1,11 @@
+import os
 from pathlib import Path
 
+import h5py
+import numpy as np
 import pytest
 
+from fluidimage import imread
 from fluidimage.executors import supported_multi_executors
 from fluidimage.piv import TopologyPIV
 
@@ -54,6 +58,101 @@ def test_piv_oseen(tmp_path_oseen, executor):
     topology.make_code_graphviz(topology.path_dir_result / "topo.dot")
 
 
+@pytest.mark.parametrize("executor", supported_multi_executors)
+def test_piv_oseen_size_batches(tmp_path_oseen, executor):
+    params = TopologyPIV.create_default_params()
+
+    params.series.path = str(tmp_path_oseen)
+    params.piv0.shape_crop_im0 = 32
+
+    params.saving.how = "recompute"
+    params.saving.postfix = postfix + "_size_batches"
+
+    topology = TopologyPIV(params, logging_level="info")
+    topology.compute(
+        executor, nb_max_workers=2, kwargs_executor={"size_batches": 1}
+    )
+    assert len(topology.results) == 3
+    assert sorted(topology.results) == sorted(set(topology.results))
+    path_files = sorted(Path(topology.path_dir_result).glob("piv*"))
+    assert len(path_files) == 3
+
+    # one log file per process (the batches append to it)
+    path_dir_result = Path(topology.path_dir_result)
+    assert len(list(path_dir_result.glob("log_*/process_*.txt"))) <= 2
+    if executor.startswith("multi_exec_subproc"):
+        # the subprocesses pulled the xml files of the batches
+        paths_batches = path_dir_result.glob("params_files_*/params_batch*.xml")
+        assert len(list(paths_batches)) == 3
+
+    for path in path_files[:2]:
+        path.unlink()
+
+    params.saving.how = "complete"
+    topology = TopologyPIV(params, logging_level="info")
+    topology.compute(
+        executor, nb_max_workers=2, kwargs_executor={"size_batches": 1}
+    )
+    assert len(topology.results) == 2
+
+
+@pytest.mark.parametrize("executor", ["exec_async", "multi_exec_subproc"])
+def test_piv_oseen_container(tmp_path_oseen, executor):
+    frames = np.array([imread(path) for path in sorted(tmp_path_oseen.glob("*"))])
+    path_dir_movie = tmp_path_oseen.parent / "movie"
+    path_dir_movie.mkdir()
+    path_movie = path_dir_movie / "oseen.h5"
+    with h5py.File(path_movie, "w") as file:
+        file.create_dataset("frames", data=frames, chunks=(1,) + frames.shape[1:])
+
+    params = TopologyPIV.create_default_params()
+
+    params.series.path = str(path_movie)
+    params.piv0.shape_crop_im0 = 32
+
+    params.saving.how = "recompute"
+    params.saving.postfix = postfix + "_container"
+
+    topology = TopologyPIV(params, logging_level="info")
+    topology.compute(executor, nb_max_workers=2)
+    path_files = sorted(Path(topology.path_dir_result).glob("piv*"))
+    assert [path.name for path in path_files] == [
+        "piv_0-1.h5",
+        "piv_1-2.h5",
+        "piv_2-3.h5",
+    ]
+
+    path_files[1].unlink()
+    params.saving.how = "complete"
+    topology = TopologyPIV(params, logging_level="info")
+    topology.compute(executor, nb_max_workers=2)
+    assert len(topology.results) == 1
+
+
+@pytest.mark.skipif(
+    not hasattr(os, "sched_setaffinity"), reason="no CPU affinity"
+)
+@pytest.mark.parametrize("executor", ["multi_exec_async", "multi_exec_subproc"])
+def test_piv_oseen_pin_cpus(tmp_path_oseen, executor):
+    params = TopologyPIV.create_default_params()
+
+    params.series.path = str(tmp_path_oseen)
+    params.piv0.shape_crop_im0 = 32
+
+    params.saving.how = "recompute"
+    params.saving.postfix = postfix + "_pin_cpus"
+
+    topology = TopologyPIV(params, logging_level="info")
+    topology.compute(
+        executor,
+        nb_max_workers=1,
+        kwargs_executor={"pin_cpus": True, "nb_threads_per_process": 1},
+    )
+    assert len(topology.executor._cpus_processes[0]) == 1
+    path_files = sorted(Path(topology.path_dir_result).glob("piv*"))
+    assert len(path_files) == 3
+
+
 def test_piv_jet(tmp_path_jet):
     path_dir_images = tmp_path_jet
 
@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 
 import pytest
@@ -31,6 +32,63 @@ def test_preproc_exec_async_sequential(tmp_path_jet_small):
     assert len(topology.results) == 0
 
 
+def test_preproc_complete_h5(tmp_path_jet_small, monkeypatch):
+    params = TopologyPreproc.create_default_params()
+
+    params.series.path = str(tmp_path_jet_small)
+    params.series.str_subset = "i:i+2,1"
+
+    params.saving.how = "recompute"
+    params.saving.format = "h5"
+    params.saving.postfix = "preproc_test_h5"
+
+    topology = TopologyPreproc(params, logging_level="info")
+    topology.compute("exec_async_sequential")
+    assert len(topology.results) == 1
+
+    path_dir_result = topology.path_dir_result
+    names_h5 = set(path.name for path in path_dir_result.glob("*.h5"))
+    path_manifest = path_dir_result / topology._name_manifest_results
+    assert names_h5 == set(path_manifest.read_text().split())
+
+    # the result directory is not listed when a run is resumed
+    paths_listed = []
+    scandir = os.scandir
+
+    def scandir_spy(path="."):
+        paths_listed.append(Path(path))
+        return scandir(path)
+
+    monkeypatch.setattr(os, "scandir", scandir_spy)
+
+    params.saving.how = "complete"
+    for _ in range(2):
+        topology = TopologyPreproc(params, logging_level="info")
+        topology.compute("exec_async_sequential")
+        assert len(topology.results) == 0
+    assert path_dir_result not in paths_listed
+    assert names_h5 == set(path_manifest.read_text().split())
+
+
+def test_preproc_image_loader(tmp_path_jet_small):
+    params = TopologyPreproc.create_default_params()
+
+    params.series.path = str(tmp_path_jet_small)
+    params.series.str_subset = "i:i+2,1"
+
+    params.loader.nb_items_read_ahead = 2
+    params.loader.max_nbytes_cache = 10_000_000
+    params.loader.drop_page_cache = True
+
+    params.saving.how = "recompute"
+    params.saving.postfix = "preproc_test_loader"
+
+    topology = TopologyPreproc(params, logging_level="debug")
+    topology.compute("exec_async")
+    assert len(topology.results) == 1
+    assert len(topology.image_loader.cache) > 0
+
+
 @pytest.mark.parametrize("executor", supported_multi_executors)
 def test_preproc_multi_exec(tmp_path_jet_small, executor):
 
@@ -6,6 +6,7 @@
 
    util
    log
+   containers
 
 """
 
@@ -21,7 +22,10 @@ from .log import (
     reset_logger,
 )
 from .util import (
+    ImageLoader,
+    LRUCacheNBytes,
     cstring,
+    estimate_nbytes,
     format_time_in_seconds,
     get_txt_memory_usage,
     imread,
@@ -48,4 +52,7 @@ __all__ = [
     "config_logging",
     "safe_eval",
     "format_time_in_seconds",
+    "LRUCacheNBytes",
+    "ImageLoader",
+    "estimate_nbytes",
 ]
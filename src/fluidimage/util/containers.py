@@ -0,0 +1,319 @@
+"""Multi-frame containers
+=========================
+
+The images of a series can be the frames of container files (HDF5 files with
+a 3D dataset, multi-page TIFF files or ``.npy`` files with 3D arrays) instead
+of one file per image. As for the movies supported by
+:class:`fluiddyn.util.serieofarrays.SerieOfArraysFromFiles`, the last index of
+the serie is the index of the frame in the container and the name of a frame
+contains this index in brackets (for example ``movie.h5[0042]``).
+
+The frames are read without loading the whole containers: the ``.npy`` files
+and the uncompressed TIFF files are memory-mapped and the HDF5 datasets are
+read by chunks. The containers are opened once per process, so that the
+processes of the multi executors (which get ranges of series from the
+splitters) read their frames directly from the files.
+
+.. autofunction:: is_container
+
+.. autofunction:: get_nb_frames
+
+.. autofunction:: split_name_frame
+
+.. autofunction:: is_name_frame
+
+.. autofunction:: get_name_file_frame
+
+.. autofunction:: open_container
+
+.. autofunction:: read_frame
+
+.. autofunction:: create_serie
+
+.. autoclass:: FramesHDF5
+   :members:
+
+.. autoclass:: FramesTIFF
+   :members:
+
+.. autoclass:: FramesNPY
+   :members:
+
+.. autoclass:: SerieOfArraysFromContainer
+   :members:
+
+"""
+
+import os
+import threading
+from math import ceil, log10
+
+import h5py
+import numpy as np
+
+from fluiddyn.util.serieofarrays import SerieOfArraysFromFiles
+
+try:
+    import tifffile
+except ImportError:
+    tifffile = None
+
+
+class FramesHDF5:
+    """Frames of the first 3D dataset of a HDF5 file (read by chunks)"""
+
+    def __init__(self, path):
+        self._file = h5py.File(path, "r")
+        datasets = []
+
+        def visit(name, obj):
+            if isinstance(obj, h5py.Dataset) and obj.ndim == 3:
+                datasets.append(obj)
+                return True
+            return None
+
+        self._file.visititems(visit)
+        if not datasets:
+            self._file.close()
+            raise ValueError(f"No 3D dataset in {path}")
+        self._dataset = datasets[0]
+
+    def __len__(self):
+        return self._dataset.shape[0]
+
+    def get_frame(self, index):
+        """Read a frame"""
+        return self._dataset[index]
+
+    def close(self):
+        """Close the file"""
+        self._file.close()
+
+
+class FramesTIFF:
+    """Frames of a multi-page TIFF file (one frame per page)
+
+    The file is memory-mapped if its data are uncompressed and contiguous. A
+    TIFF file with one page (for example a RGB image) contains one frame.
+
+    """
+
+    def __init__(self, path):
+        if tifffile is None:
+            raise ImportError("tifffile is needed to read TIFF containers")
+        self._tiff = tifffile.TiffFile(path)
+        self._nb_frames = len(self._tiff.pages)
+        try:
+            self._frames = tifffile.memmap(path, mode="r")
+        except ValueError:
+            self._frames = None
+        if self._frames is not None and (
+            self._frames.ndim != 3 or self._frames.shape[0] != self._nb_frames
+        ):
+            self._frames = None
+        if self._frames is None:
+            self._lock = threading.Lock()
+        else:
+            self._tiff.close()
+            self._tiff = None
+
+    def __len__(self):
+        return self._nb_frames
+
+    def get_frame(self, index):
+        """Read a frame"""
+        if self._frames is not None:
+            return np.array(self._frames[index])
+        with self._lock:
+            return self._tiff.pages[index].asarray()
+
+    def close(self):
+        """Close the file"""
+        self._frames = None
+        if self._tiff is not None:
+            self._tiff.close()
+
+
+class FramesNPY:
+    """Frames of a 3D array saved in a ``.npy`` file (memory-mapped)"""
+
+    def __init__(self, path):
+        self._frames = np.load(path, mmap_mode="r")
+        if self._frames.ndim != 3:
+            raise ValueError(f"The array in {path} is not 3D")
+
+    def __len__(self):
+        return self._frames.shape[0]
+
+    def get_frame(self, index):
+        """Read a frame"""
+        return np.array(self._frames[index])
+
+    def close(self):
+        """Close the file"""
+        self._frames = None
+
+
+_classes_containers = {
+    ".h5": FramesHDF5,
+    ".hdf5": FramesHDF5,
+    ".tif": FramesTIFF,
+    ".tiff": FramesTIFF,
+    ".npy": FramesNPY,
+}
+
+# containers opened in this process
+_containers = {}
+_lock_containers = threading.Lock()
+
+
+def _get_class_container(path):
+    cls = _classes_containers.get(os.path.splitext(str(path))[1].lower())
+    if cls is FramesTIFF and tifffile is None:
+        return None
+    return cls
+
+
+def split_name_frame(name):
+    """Split the name of a frame (``"movie.h5[0042]"`` -> ``"movie.h5", 42``)
+
+    The index is None if the name is not the name of a frame.
+
+    """
+    name = str(name)
+    if not name.endswith("]") or "[" not in name:
+        return name, None
+    path, str_index = name[:-1].rsplit("[", 1)
+    return path, int(str_index)
+
+
+def is_name_frame(name):
+    """Check if a name is the name of a frame of a container"""
+    path, index = split_name_frame(name)
+    return index is not None and _get_class_container(path) is not None
+
+
+def get_name_file_frame(name, extension="png"):
+    """Name of a file for a frame (``"movie.h5[0042]"`` -> ``"movie_0042.png"``)
+
+    The names which are not names of frames are returned unchanged.
+
+    """
+    if not is_name_frame(name):
+        return name
+    path, str_index = name[:-1].rsplit("[", 1)
+    return f"{os.path.splitext(path)[0]}_{str_index}.{extension}"
+
+
+def get_nb_frames(path):
+    """Get the number of frames of a file (1 for a file with one image)"""
+    cls = _get_class_container(path)
+    if cls is None or not os.path.isfile(path):
+        return 1
+    try:
+        container = cls(path)
+    except (OSError, ValueError):
+        return 1
+    try:
+        return len(container)
+    finally:
+        container.close()
+
+
+def is_container(path):
+    """Check if a path points towards a container of several frames"""
+    return get_nb_frames(path) > 1
+
+
+def open_container(path):
+    """Open a container (only once per process)"""
+    key = (os.getpid(), os.path.abspath(path))
+    with _lock_containers:
+        try:
+            return _containers[key]
+        except KeyError:
+            pass
+        cls = _get_class_container(path)
+        if cls is None:
+            raise ValueError(f"{path} is not a container")
+        container = _containers[key] = cls(path)
+        return container
+
+
+def read_frame(name):
+    """Read a frame from its name (``"movie.h5[0042]"``)"""
+    path, index = split_name_frame(name)
+    if index is None:
+        raise ValueError(f"{name} is not the name of a frame")
+    return open_container(path).get_frame(index)
+
+
+class SerieOfArraysFromContainer(SerieOfArraysFromFiles):
+    """Serie of arrays stored as the frames of container files
+
+    The last index is the index of the frame in the container. All the
+    containers of the serie should contain the same number of frames.
+
+    Parameters
+    ----------
+
+    path : str
+        The path of a container.
+
+    slicing : None or iterable of iterables or str
+
+    """
+
+    def __init__(self, path, slicing=None):
+        super().__init__(path)
+
+        path_file = os.path.join(self.path_dir, self.filename_given)
+        nb_frames = get_nb_frames(path_file)
+
+        self._from_movies = True
+        self.nb_indices = self.nb_indices_name_file + 1
+        self.nb_arrays_in_one_file = nb_frames
+        self._nb_arrays_file = {path_file: nb_frames}
+        self._format_index = (
+            "[{" + f":0{max(1, int(ceil(log10(nb_frames))))}d" + "}]"
+        )
+
+        self._slicing_tuples_all_files = list(self._slicing_tuples_all_files)
+        self._slicing_tuples_all_files.append((0, nb_frames, 1))
+
+        self._slicing_input = slicing
+        if isinstance(slicing, str):
+            self.set_slicing_tuples_from_str(slicing)
+        elif slicing is None:
+            self._slicing_tuples = list(self._slicing_tuples_all_files)
+        else:
+            self.set_slicing_tuples(*slicing)
+
+    def get_array_from_name(self, name):
+        """Get the array from its name."""
+        return read_frame(os.path.join(self.path_dir, name))
+
+    def check_all_arrays_exist(self):
+        """Check that all arrays exists."""
+        if not self.check_all_files_exist():
+            return False
+
+        for indices in self.iter_indices():
+            if indices[-1] >= self.nb_arrays_in_one_file:
+                return False
+
+        for path in self.get_path_files():
+            if path not in self._nb_arrays_file:
+                self._nb_arrays_file[path] = get_nb_frames(path)
+
+        return all(
+            self.nb_arrays_in_one_file == nb
+            for nb in self._nb_arrays_file.values()
+        )
+
+
+def create_serie(path, slicing=None):
+    """Create a serie of arrays (from containers or from one file per array)"""
+    if is_container(path):
+        return SerieOfArraysFromContainer(path, slicing)
+    return SerieOfArraysFromFiles(path, slicing)
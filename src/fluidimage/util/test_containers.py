@@ -0,0 +1,85 @@
+import h5py
+import numpy as np
+import pytest
+
+from fluiddyn.util.serieofarrays import SeriesOfArrays
+
+from .containers import (
+    SerieOfArraysFromContainer,
+    create_serie,
+    get_name_file_frame,
+    get_nb_frames,
+    is_container,
+    read_frame,
+    split_name_frame,
+    tifffile,
+)
+from .util import imread
+
+
+@pytest.fixture
+def frames():
+    return np.arange(5 * 4 * 6, dtype=np.uint16).reshape(5, 4, 6)
+
+
+def _save_containers(tmp_path, frames):
+    names = ["movie.npy", "movie.h5"]
+    np.save(tmp_path / "movie.npy", frames)
+    with h5py.File(tmp_path / "movie.h5", "w") as file:
+        file.create_dataset("frames", data=frames, chunks=(1, 4, 6))
+    if tifffile is not None:
+        names.append("movie.tif")
+        tifffile.imwrite(tmp_path / "movie.tif", frames)
+        names.append("movie_zlib.tif")
+        tifffile.imwrite(
+            tmp_path / "movie_zlib.tif", frames, compression="zlib"
+        )
+    return names
+
+
+def test_containers(tmp_path, frames):
+    names = _save_containers(tmp_path, frames)
+
+    for name in names:
+        path = tmp_path / name
+        assert is_container(path)
+        assert get_nb_frames(path) == 5
+        assert np.array_equal(read_frame(f"{path}[2]"), frames[2])
+        assert np.array_equal(imread(f"{path}[3]"), frames[3])
+
+    np.save(tmp_path / "image.npy", frames[0])
+    assert not is_container(tmp_path / "image.npy")
+
+    if tifffile is not None:
+        # a RGB image is not a stack of frames
+        path = tmp_path / "image_rgb.tif"
+        tifffile.imwrite(path, np.zeros((64, 48, 3), dtype=np.uint8))
+        assert get_nb_frames(path) == 1
+        assert not is_container(path)
+
+    assert split_name_frame("movie.h5[0042]") == ("movie.h5", 42)
+    assert split_name_frame("im0.png") == ("im0.png", None)
+    assert get_name_file_frame("movie.h5[0042]") == "movie_0042.png"
+    assert get_name_file_frame("im0.png") == "im0.png"
+
+
+def test_serie_from_container(tmp_path, frames):
+    _save_containers(tmp_path, frames)
+
+    serie = create_serie(str(tmp_path / "movie.h5"))
+    assert isinstance(serie, SerieOfArraysFromContainer)
+    assert serie.get_name_arrays() == tuple(f"movie.h5[{i}]" for i in range(5))
+    assert np.array_equal(serie.get_array_from_name("movie.h5[1]"), frames[1])
+
+    series = SeriesOfArrays(serie, "i:i+2")
+    assert len(series) == 4
+    assert series.get_serie_from_index(3).get_name_arrays() == (
+        "movie.h5[3]",
+        "movie.h5[4]",
+    )
+
+    series = SeriesOfArrays(serie, "i:i+2", ind_start=1, ind_stop=3)
+    assert [subset.get_name_arrays()[0] for subset in series] == [
+        "movie.h5[1]",
+        "movie.h5[2]",
+    ]
@@ -1,6 +1,19 @@
+import os
 import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
 
-from .util import cprint, imread, is_memory_full, str_short
+import numpy as np
+
+from .util import (
+    ImageLoader,
+    LRUCacheNBytes,
+    cprint,
+    imread,
+    imsave,
+    is_memory_full,
+    str_short,
+)
 
 
 class TestUtil(unittest.TestCase):
@@ -14,6 +27,42 @@ class TestUtil(unittest.TestCase):
         is_memory_full()
         str_short("string")
 
+    def test_lru_cache_nbytes(self):
+        cache = LRUCacheNBytes(max_nbytes=250)
+        arr = np.zeros(10)
+        cache.set("a", arr)
+        cache.set("b", (arr, arr))
+        assert cache.nbytes == 240 and len(cache) == 2
+        # "a" becomes the most recently used
+        assert cache.get("a") is arr
+        cache.set("c", arr)
+        assert "b" not in cache
+        assert cache.get("b") is None
+        assert cache.nbytes == 160
+        # too large to be kept
+        cache.set("d", np.zeros(100))
+        assert "d" not in cache
+        cache.clear()
+        assert len(cache) == 0 and cache.nbytes == 0
+
+    def test_image_loader(self):
+        with TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir) / "im.png"
+            imsave(path, np.ones((4, 8), dtype=np.uint8), as_int=True)
+
+            loader = ImageLoader(max_nbytes_cache=1000, drop_page_cache=True)
+            loader.read_ahead(path)
+            if hasattr(os, "POSIX_FADV_WILLNEED"):
+                # advice given in a thread
+                assert loader._pid_read_ahead == os.getpid()
+            arr = loader(path)
+            assert str(path) in loader.cache
+            path.unlink()
+            # read from the cache
+            arr_cached = loader(path)
+            assert np.array_equal(arr, arr_cached)
+            assert arr_cached is not arr
+
 
 if __name__ == "__main__":
     unittest.main()
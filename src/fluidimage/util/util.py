@@ -20,9 +20,21 @@ Provides:
 
 .. autofunction:: format_time_in_seconds
 
+.. autofunction:: estimate_nbytes
+
+.. autoclass:: LRUCacheNBytes
+   :members:
+
+.. autoclass:: ImageLoader
+   :members:
+
 """
 
+import os
+import threading
+from collections import OrderedDict
 from pathlib import Path
+from queue import SimpleQueue
 
 import psutil
 from IPython.lib.pretty import pretty
@@ -33,6 +45,8 @@ from fluiddyn.io.image import imsave as _imsave
 from fluiddyn.util import get_memory_usage
 from fluiddyn.util import terminal_colors as term
 
+from .containers import is_name_frame, read_frame
+
 color_dict = {
     "HEADER": term.HEADER,
     "OKBLUE": term.OKBLUE,
@@ -50,6 +64,11 @@ def imread(path):
     """
     if isinstance(path, Path):
         path = str(path)
+
+    if is_name_frame(path):
+        # frame of a container (for example "movie.h5[0042]")
+        return read_frame(path)
+
     # pylint: disable=W0703
     try:
         array = _imread(path)
@@ -142,3 +161,185 @@ def format_time_in_seconds(duration_in_s):
     hours, remainder = divmod(duration_in_s, 3600)
     minutes, seconds = divmod(remainder, 60)
     return f"{int(hours):02}:{int(minutes):02}:{int(seconds):02}"
+
+
+def estimate_nbytes(obj, _depth=0):
+    """Estimate the number of bytes of an object.
+
+    Only the arrays (and other objects with an attribute `nbytes`), the bytes
+    and the strings are counted. They are searched in the containers and in
+    the attributes of the objects, with a limited depth.
+
+    """
+    nbytes = getattr(obj, "nbytes", None)
+    if isinstance(nbytes, int):
+        return nbytes
+    if isinstance(obj, (bytes, bytearray, str)):
+        return len(obj)
+    if _depth >= 4:
+        return 0
+    if isinstance(obj, (tuple, list, set, frozenset)):
+        values = obj
+    elif isinstance(obj, dict):
+        values = obj.values()
+    elif hasattr(obj, "__dict__") and not isinstance(obj, type):
+        values = vars(obj).values()
+    else:
+        return 0
+    return sum(estimate_nbytes(value, _depth + 1) for value in values)
+
+
+class LRUCacheNBytes:
+    """Least recently used cache bounded in number of bytes.
+
+    The values are typically arrays or tuples of arrays. When the total
+    number of bytes of the values exceeds `max_nbytes`, the least recently
+    used values are dropped. The cache can be used from different threads.
+
+    Parameters
+    ----------
+
+    max_nbytes : int
+
+      Maximum number of bytes of the values kept in the cache.
+
+    """
+
+    def __init__(self, max_nbytes):
+        self.max_nbytes = max_nbytes
+        self.nbytes = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        """Get a value (and mark it as recently used)"""
+        with self._lock:
+            try:
+                value, _ = self._data[key]
+            except KeyError:
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, nbytes=None):
+        """Add a value (not kept if it is larger than `max_nbytes`)"""
+        if nbytes is None:
+            nbytes = estimate_nbytes(value)
+        with self._lock:
+            if key in self._data:
+                self.nbytes -= self._data.pop(key)[1]
+            if nbytes > self.max_nbytes:
+                return
+            self._data[key] = (value, nbytes)
+            self.nbytes += nbytes
+            while self.nbytes > self.max_nbytes:
+                _, (_, nbytes_dropped) = self._data.popitem(last=False)
+                self.nbytes -= nbytes_dropped
+
+    def clear(self):
+        """Remove all values"""
+        with self._lock:
+            self._data.clear()
+            self.nbytes = 0
+
+
+def _fadvise(path, advice):
+    """Give an advice to the kernel on the access to a file (if possible)"""
+    if advice is None:
+        return
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.posix_fadvise(fd, 0, 0, advice)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class ImageLoader:
+    """Read images with read-ahead and a cache of the decoded arrays
+
+    The images can be read ahead by the kernel (see :func:`read_ahead`, with
+    ``posix_fadvise`` called in a background thread) before being read by the
+    io workers. The decoded
+    arrays are kept in a :class:`LRUCacheNBytes`, so that images used in
+    different subsets are not read and decoded again.
+
+    Parameters
+    ----------
+
+    max_nbytes_cache : int
+
+      Maximum number of bytes of the arrays kept in the cache (0 for no
+      cache).
+
+    drop_page_cache : bool
+
+      If True, the pages of the files are dropped from the page cache of the
+      system after reading (like with direct I/O), which is useful if the
+      files are read only once.
+
+    """
+
+    def __init__(self, max_nbytes_cache=0, drop_page_cache=False):
+        if max_nbytes_cache:
+            self.cache = LRUCacheNBytes(max_nbytes_cache)
+        else:
+            self.cache = None
+        self.drop_page_cache = drop_page_cache
+        self._paths_read_ahead = None
+        self._pid_read_ahead = None
+        self._lock = threading.Lock()
+
+    def read_ahead(self, path):
+        """Ask the kernel to read a file in the background
+
+        The file is opened in a thread so that the caller (for example the
+        event loop of an async executor) is not blocked by the storage.
+
+        """
+        if not hasattr(os, "POSIX_FADV_WILLNEED"):
+            return
+        if self.cache is not None and str(path) in self.cache:
+            return
+        with self._lock:
+            # the thread has to be (re)started in a new (forked) process
+            if self._pid_read_ahead != os.getpid():
+                self._pid_read_ahead = os.getpid()
+                self._paths_read_ahead = SimpleQueue()
+                threading.Thread(
+                    target=self._run_read_ahead,
+                    args=(self._paths_read_ahead,),
+                    daemon=True,
+                ).start()
+        self._paths_read_ahead.put(path)
+
+    @staticmethod
+    def _run_read_ahead(paths):
+        while True:
+            _fadvise(paths.get(), os.POSIX_FADV_WILLNEED)
+
+    def __call__(self, path):
+        """Read an image"""
+        path = str(path)
+        if self.cache is not None:
+            array = self.cache.get(path)
+            if array is not None:
+                # the arrays of the cache must not be modified
+                return array.copy()
+
+        array = imread(path)
+        if self.drop_page_cache:
+            _fadvise(path, getattr(os, "POSIX_FADV_DONTNEED", None))
+        if self.cache is not None:
+            self.cache.set(path, array.copy())
+        return array
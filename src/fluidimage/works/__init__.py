@@ -45,6 +45,7 @@ from fluiddyn.util.paramcontainer import ParamContainer
 from fluiddyn.util.serieofarrays import SerieOfArraysFromFiles, SeriesOfArrays
 
 from .. import imread
+from ..util.containers import create_serie
 
 
 class BaseWork(ABC):
@@ -149,7 +150,7 @@ Parameters indicating the input series of images.
         if not hasattr(self, "_series"):
             p_series = self.params.series
             self._series = SeriesOfArrays(
-                p_series.path,
+                create_serie(p_series.path),
                 p_series.str_subset,
                 ind_start=p_series.ind_start,
                 ind_stop=p_series.ind_stop,
@@ -208,7 +209,7 @@ Parameters indicating the input image set.
 
     def _init_serie(self):
         p_images = self.params.images
-        self.serie = SerieOfArraysFromFiles(p_images.path, p_images.str_subset)
+        self.serie = create_serie(p_images.path, p_images.str_subset)
         return self.serie
 
     def get_tuple_image_name(self, index_image: int = 0):
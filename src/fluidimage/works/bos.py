@@ -31,6 +31,7 @@ class WorkBOS(BaseWorkFromImage):
         WorkPIV._complete_params_with_default_piv(params)
 
         params._set_attrib("reference", 0)
+        params._set_attrib("cache_reference_spectra", True)
 
         params._set_doc(
             """
@@ -40,6 +41,14 @@ class WorkBOS(BaseWorkFromImage):
   absolute file path, a file name or the index in the list of files found
   from the parameters in ``params.images``.
 
+- cache_reference_spectra : bool, {True}
+
+  If True, the spectra of the windows of the reference image are kept and
+  reused for all images (only for the correlation methods based on FFT). For
+  the first pass, they are computed at initialization. For the next passes,
+  they are computed again only for the windows moved by the displacements.
+  The results are not changed.
+
 """
         )
 
@@ -47,6 +56,8 @@ class WorkBOS(BaseWorkFromImage):
         super().__init__(params)
         self.init_from_input()
         self.work_piv = WorkPIV(params)
+        if params.cache_reference_spectra:
+            self._prepare_reference_spectra()
 
     def init_from_input(self):
         self._init_serie()
@@ -55,6 +66,18 @@ class WorkBOS(BaseWorkFromImage):
         self.path_reference = path_reference
         self.image_reference = imread(path_reference)
 
+    def _prepare_reference_spectra(self):
+        """Precompute the spectra of the windows of the reference image"""
+        couple = ArrayCoupleBOS(
+            names=(self.name_reference, self.name_reference),
+            arrays=(self.image_reference, self.image_reference),
+            params_mask=self.params.mask,
+            serie=self.serie,
+            paths=[self.path_reference, self.path_reference],
+        )
+        image_reference, _ = couple.get_arrays()
+        self.work_piv.prepare_with_fixed_image0(image_reference)
+
     def _init_path_reference(self, params):
         reference = params.reference
         self.path_dir_src = Path(self.serie.path_dir).absolute()
@@ -169,21 +169,32 @@ class WorkPIV(BaseWorkFromSerie):
             self.works_piv.append(work_piv)
             self.works_fix.append(WorkFIX(params.fix, work_piv))
 
+        # the padded images are computed once and shared by all passes
+        npad_images = max(work_piv.npad for work_piv in self.works_piv)
+        for work_piv in self.works_piv:
+            work_piv.npad_images = npad_images
+
     def calcul(self, couple):
         """Compute a PIV field (multipass) from a couple of image."""
 
         results = MultipassPIVResults()
 
         # the first work is a FirstWorkPIV and uses a couple
-        piv_result = couple
-
-        for work_piv, work_fix in zip(self.works_piv, self.works_fix):
-            piv_result = work_piv.calcul(piv_result)
+        piv_result, padded_images = self.works_piv[0]._calcul(couple)
+        piv_result = self.works_fix[0].calcul(piv_result)
+        results.append(piv_result)
+
+        # the padded images are computed once and given to the next passes
+        for work_piv, work_fix in zip(self.works_piv[1:], self.works_fix[1:]):
+            piv_result, padded_images = work_piv._calcul(
+                piv_result, padded_images
+            )
             piv_result = work_fix.calcul(piv_result)
             results.append(piv_result)
+        del padded_images
 
         try:
-            work_piv.apply_interp(piv_result, last=True)
+            self.works_piv[-1].apply_interp(piv_result, last=True)
         except InterpError as e:
             print("Warning: InterpError at the end of the last piv pass:", e)
 
@@ -197,6 +208,21 @@ class WorkPIV(BaseWorkFromSerie):
         for work_piv in self.works_piv:
             work_piv._prepare_with_image(imshape=imshape)
 
+    def prepare_with_fixed_image0(self, im0):
+        """Prepare the works PIV for couples sharing the same image 0.
+
+        The spectra of the windows of the image 0 are computed once for the
+        first pass (for which the windows are on the grid). For the next
+        passes, the windows are shifted by half of the displacements, so the
+        spectra are kept with the positions of the windows and computed again
+        only when a window moves. The results are the same as without this
+        preparation.
+
+        """
+        self._prepare_with_image(im0)
+        for work_piv in self.works_piv:
+            work_piv.compute_spectra_image0(im0)
+
 
 _params = WorkPIV.create_default_params()
 __doc__ += _params._get_formatted_docs()
@@ -13,20 +13,29 @@
    :members:
    :private-members:
 
+.. autoclass:: SpectraWindowsAtPositions
+   :members:
+
 """
 
-from copy import deepcopy
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 
 from fluiddyn.util.serieofarrays import SerieOfArraysFromFiles
 
+from ...calcul.autotune import get_method_correl_auto
 from ...calcul.correl import correlation_classes
 from ...calcul.errors import PIVError
 from ...calcul.interpolate.griddata import griddata
 from ...calcul.interpolate.thin_plate_spline_subdom import ThinPlateSplineSubdom
 from ...calcul.subpix import SubPix
-from ...data_objects.piv import ArrayCouple, HeavyPIVResults
+from ...data_objects.piv import ArrayCouple, CorrelPatches, HeavyPIVResults
+from ...topologies.nb_cpu_cores import nb_cores
+from ...util import LRUCacheNBytes
 from ..with_mask import BaseWorkWithMask
 
 
@@ -38,6 +47,88 @@ def _isint(obj):
     return isinstance(obj, (int, np.integer))
 
 
+_thread_pools = {}
+
+
+def _get_thread_pool(nb_threads):
+    """Get a thread pool (one per process and per number of threads)"""
+    key = (os.getpid(), nb_threads)
+    try:
+        return _thread_pools[key]
+    except KeyError:
+        pass
+    pool = _thread_pools[key] = ThreadPoolExecutor(
+        nb_threads, thread_name_prefix="fluidimage-piv"
+    )
+    return pool
+
+
+def _pad_image(im, npad):
+    """Pad an image with zeros (float32, minimum of the image removed)"""
+    ny, nx = im.shape
+    impad = np.zeros((ny + 2 * npad, nx + 2 * npad), dtype=np.float32)
+    np.subtract(
+        im,
+        im.min(),
+        out=impad[npad : npad + ny, npad : npad + nx],
+        casting="unsafe",
+    )
+    return impad
+
+
+class SpectraWindowsAtPositions:
+    """Spectra of the windows of a fixed image 0 kept with their positions
+
+    Used for the passes for which the windows of the image 0 depend on the
+    input displacements (see :class:`WorkPIVFromDisplacement`). For each
+    vector, the spectrum of the last window is kept with its position, so
+    that it is computed again only if the window moves.
+
+    """
+
+    def __init__(self, nb_vec):
+        self.positions = np.full((nb_vec, 2), -1, dtype=np.int64)
+        self.spectra = None
+        self.energies = None
+        self._lock = threading.Lock()
+
+    def get_batch(self, correl, ivecs, positions, ims, batch_size):
+        """Get the spectra of a batch (computed only for the moved windows)"""
+        ivecs = np.asarray(ivecs, dtype=int)
+        with self._lock:
+            if self.spectra is None:
+                are_kept = np.zeros(len(ivecs), dtype=bool)
+            else:
+                are_kept = (self.positions[ivecs] == positions).all(axis=1)
+                spectra = self.spectra[ivecs]
+                energies = self.energies[ivecs]
+
+        if are_kept.all():
+            return spectra, energies
+
+        indices = np.flatnonzero(~are_kept)
+        spectra_new, energies_new = correl.compute_spectra_stack(
+            ims[indices], batch_size
+        )
+        with self._lock:
+            if self.spectra is None:
+                nb_vec = len(self.positions)
+                self.spectra = np.empty(
+                    (nb_vec,) + spectra_new.shape[1:], dtype=spectra_new.dtype
+                )
+                self.energies = np.empty(nb_vec, dtype=energies_new.dtype)
+            ivecs_new = ivecs[indices]
+            self.spectra[ivecs_new] = spectra_new
+            self.energies[ivecs_new] = energies_new
+            self.positions[ivecs_new] = positions[indices]
+
+        if len(indices) == len(ivecs):
+            return spectra_new, energies_new
+        spectra[indices] = spectra_new
+        energies[indices] = energies_new
+        return spectra, energies
+
+
 class BaseWorkPIV(BaseWorkWithMask):
     """Base class for PIV.
 
@@ -45,10 +136,26 @@ class BaseWorkPIV(BaseWorkWithMask):
 
     """
 
+    #: Spectra and energies of the windows of a fixed image 0 (see
+    #: :meth:`compute_spectra_image0`)
+    spectra_image0 = None
+
+    #: Cache of the spectra of the windows of the images (see
+    #: :meth:`_get_spectra_couple`)
+    spectra_cache = None
+
     @classmethod
     def _complete_params_with_default(cls, params):
         pass
 
+    @property
+    def nb_threads(self):
+        """Number of threads used to compute the batches of vectors of a pass"""
+        nb_threads = self.params.piv0.nb_threads
+        if nb_threads is None:
+            return nb_cores
+        return max(int(nb_threads), 1)
+
     def _init_shape_crop(self, shape_crop_im0, shape_crop_im1):
         if shape_crop_im1 is None:
             shape_crop_im1 = shape_crop_im0
@@ -87,11 +194,20 @@ class BaseWorkPIV(BaseWorkWithMask):
         self.shape_crop_im1 = tuple(int(n) for n in shape_crop_im1)
 
     def _init_correl(self):
+        method_correl = self.params.piv0.method_correl
+        if method_correl == "auto":
+            method_correl = get_method_correl_auto(
+                self.shape_crop_im0,
+                self.shape_crop_im1,
+                displacement_max=self.params.piv0.displacement_max,
+            )
+        self.method_correl = method_correl
+
         try:
-            correl_cls = correlation_classes[self.params.piv0.method_correl]
+            correl_cls = correlation_classes[method_correl]
         except KeyError:
             raise ValueError(
-                "params.piv0.method_correl should be in "
+                "params.piv0.method_correl should be 'auto' or in "
                 + str(list(correlation_classes.keys()))
             )
 
@@ -103,8 +219,21 @@ class BaseWorkPIV(BaseWorkWithMask):
             displacement_max=self.params.piv0.displacement_max,
             particle_radius=self.params.piv0.particle_radius,
             nb_peaks_to_search=self.params.piv0.nb_peaks_to_search,
+            pad_to_fast_sizes=self.params.piv0.pad_to_fast_sizes,
         )
 
+        store_correls = self.params.piv0.store_correls
+        if store_correls not in (True, False, "patches"):
+            raise ValueError(
+                "params.piv0.store_correls should be True, False or 'patches'"
+            )
+        if store_correls is False and self.params.piv0.nb_peaks_to_search > 1:
+            raise ValueError(
+                "params.piv0.store_correls can't be False when "
+                "params.piv0.nb_peaks_to_search > 1 (the correlations are "
+                "needed for the secondary peaks)"
+            )
+
     def _prepare_with_image(self, im0=None, imshape=None):
         """Initialize the object with an image."""
         if imshape is None:
@@ -142,6 +271,15 @@ class BaseWorkPIV(BaseWorkWithMask):
 
     def calcul(self, couple):
         """Calcul the PIV (one pass) from a couple of images."""
+        return self._calcul(couple)[0]
+
+    def _calcul(self, couple):
+        """Calcul the PIV (one pass) and return the padded images
+
+        The padded images (see :meth:`_pad_images`) can be given to the next
+        passes (see :meth:`WorkPIVFromDisplacement._calcul`).
+
+        """
         if isinstance(couple, SerieOfArraysFromFiles):
             couple = ArrayCouple(serie=couple)
         elif isinstance(couple, dict):
@@ -159,6 +297,9 @@ class BaseWorkPIV(BaseWorkWithMask):
         if not hasattr(self, "ixvecs_grid"):
             self._prepare_with_image(im0)
 
+        padded_images = self._pad_images(im0, im1)
+        spectra = self._get_spectra_couple(couple, padded_images)
+
         (
             deltaxs,
             deltays,
@@ -168,7 +309,9 @@ class BaseWorkPIV(BaseWorkWithMask):
             correls,
             errors,
             secondary_peaks,
-        ) = self._loop_vectors(im0, im1)
+        ) = self._loop_vectors(
+            im0, im1, padded_images=padded_images, spectra=spectra
+        )
 
         xs, ys = self._xyoriginalimage_from_xymasked(xs, ys)
 
@@ -180,14 +323,14 @@ class BaseWorkPIV(BaseWorkWithMask):
             errors,
             correls_max=correls_max,
             correls=correls,
-            couple=deepcopy(couple),
+            couple=couple,
             params=self.params,
             secondary_peaks=secondary_peaks,
         )
 
         self._complete_result(result)
 
-        return result
+        return result, padded_images
 
     def _complete_result(self, result):
         result.indices_no_displacement = self.correl.get_indices_no_displacement()
@@ -196,16 +339,118 @@ class BaseWorkPIV(BaseWorkWithMask):
     def _pad_images(self, im0, im1):
         """Pad images with zeros.
 
+        The padded images are float32 arrays padded with `self.npad_images`
+        (for a multipass PIV, the largest `npad` of the passes) so that they
+        can be shared by all the passes computed from a couple of images (see
+        :meth:`_get_padded_views`).
+
+        Returns
+        -------
+
+        padded_images : tuple
+
+          ``(im0pad, im1pad, npad)``
+
         .. todo::
 
            Choose correctly the variable npad.
 
         """
-        npad = self.npad = max(self._start_for_crop0 + self._stop_for_crop0)
-        tmp = [(npad, npad), (npad, npad)]
-        im0pad = np.pad(im0 - im0.min(), tmp, "constant", constant_values=0)
-        im1pad = np.pad(im1 - im1.min(), tmp, "constant", constant_values=0)
-        return im0pad, im1pad
+        npad = self.npad_images
+        return _pad_image(im0, npad), _pad_image(im1, npad), npad
+
+    def compute_spectra_image0(self, im0):
+        """Compute and keep the spectra of the windows of a fixed image 0.
+
+        Used when many couples share the same image 0 (for example the
+        reference image for BOS). Nothing is done if the correlation method
+        cannot use precomputed spectra.
+
+        """
+        if not self.correl.can_use_spectra:
+            return
+
+        if not hasattr(self, "ixvecs_grid"):
+            self._prepare_with_image(im0)
+
+        self.spectra_image0 = self._compute_spectra_grid(
+            _pad_image(im0, self.npad)
+        )
+
+    def _compute_spectra_grid(self, impad):
+        """Compute the spectra of the windows centered on the grid.
+
+        `impad` has to be padded with `self.npad`.
+
+        """
+        windows = sliding_window_view(impad, self.shape_crop_im0)
+        iys_start = self.iyvecs_grid + self.npad - self._start_for_crop0[0]
+        ixs_start = self.ixvecs_grid + self.npad - self._start_for_crop0[1]
+
+        nb_vec = len(self.ixvecs_grid)
+        batch_size = self.params.piv0.batch_size
+        if batch_size is None:
+            batch_size = nb_vec
+
+        spectra = []
+        energies = []
+        for ivec_start in range(0, nb_vec, batch_size):
+            batch = slice(ivec_start, ivec_start + batch_size)
+            spectra_batch, energies_batch = self.correl.compute_spectra_stack(
+                windows[iys_start[batch], ixs_start[batch]], batch_size
+            )
+            spectra.append(spectra_batch)
+            energies.append(energies_batch)
+
+        return np.concatenate(spectra), np.concatenate(energies)
+
+    def _get_spectra_couple(self, couple, padded_images):
+        """Get the spectra of the windows of the 2 images of a couple.
+
+        For the first pass, the spectra of the windows of the images are kept
+        in `self.spectra_cache` (with keys depending on the directory and the
+        name of the image, the grid and the shape of the windows) so that the
+        windows of an image used in 2 consecutive couples (time-resolved
+        series) are transformed only once.
+
+        Returns
+        -------
+
+        spectra : tuple
+
+          ``(spectra0, spectra1)``, each of them being None or a tuple
+          ``(spectra, energies)`` for all the vectors of the grid.
+
+        """
+        if (
+            self.spectra_image0 is not None
+            or self.spectra_cache is None
+            or getattr(couple, "serie", None) is None
+        ):
+            # without serie, the names do not identify the images
+            return self.spectra_image0, None
+
+        im0pad, im1pad = self._get_padded_views(padded_images)
+        key_grid = (self.imshape0, self.shape_crop_im0, self.overlap)
+        path_dir = str(couple.serie.path_dir)
+        spectra = []
+        for name, impad in zip(couple.names, (im0pad, im1pad)):
+            key = (path_dir, name, key_grid)
+            spectra_image = self.spectra_cache.get(key)
+            if spectra_image is None:
+                spectra_image = self._compute_spectra_grid(impad)
+                self.spectra_cache.set(key, spectra_image)
+            spectra.append(spectra_image)
+        return tuple(spectra)
+
+    def _get_padded_views(self, padded_images):
+        """Get views of the images padded with `self.npad`"""
+        im0pad, im1pad, npad = padded_images
+        offset = npad - self.npad
+        if offset == 0:
+            return im0pad, im1pad
+        crop = (slice(offset, -offset),) * 2
+        return im0pad[crop], im1pad[crop]
 
     def _calcul_positions_vectors_subimages(
         self, deltaxs_input=None, deltays_input=None
@@ -259,10 +504,36 @@ class BaseWorkPIV(BaseWorkWithMask):
             iys1_pad,
         )
 
-    def _loop_vectors(self, im0, im1, deltaxs_input=None, deltays_input=None):
-        """Loop over the vectors to compute them."""
+    def _loop_vectors(
+        self,
+        im0,
+        im1,
+        deltaxs_input=None,
+        deltays_input=None,
+        padded_images=None,
+        spectra=None,
+    ):
+        """Loop over the vectors to compute them.
+
+        The correlations are computed by batches of `params.piv0.batch_size`
+        vectors (see :meth:`fluidimage.calcul.correl.CorrelBase.compute_correls_stack`).
+        The peaks and the subpixel displacements of a batch are also computed
+        with compiled functions working on the whole stack.
+
+        `padded_images` can be given to avoid padding again the images (see
+        :meth:`_pad_images`) and `spectra` to avoid computing again the spectra
+        of the windows (see :meth:`_get_spectra_couple`).
+
+        """
+        if padded_images is None or padded_images[2] < self.npad:
+            padded_images = self._pad_images(im0, im1)
+
+        if spectra is None:
+            spectra = (self.spectra_image0, None)
 
-        im0pad, im1pad = self._pad_images(im0, im1)
+        im0pad, im1pad = self._get_padded_views(padded_images)
+        windows0 = sliding_window_view(im0pad, self.shape_crop_im0)
+        windows1 = sliding_window_view(im1pad, self.shape_crop_im1)
 
         xs, ys, ixs0_pad, iys0_pad, ixs1_pad, iys1_pad = (
             self._calcul_positions_vectors_subimages(deltaxs_input, deltays_input)
@@ -270,7 +541,17 @@ class BaseWorkPIV(BaseWorkWithMask):
 
         nb_vec = len(xs)
 
-        correls = [None] * nb_vec
+        store_correls = self.params.piv0.store_correls
+        if store_correls == "patches":
+            correls = CorrelPatches(
+                nb_vec,
+                self.params.piv0.nb_peaks_to_search,
+                max(self.correl.particle_radius, self.correl.subpix.n, 1),
+            )
+        elif store_correls:
+            correls = [None] * nb_vec
+        else:
+            correls = None
         errors = {}
         deltaxs = np.empty(xs.shape, dtype="float32")
         deltays = np.empty_like(deltaxs)
@@ -279,71 +560,123 @@ class BaseWorkPIV(BaseWorkWithMask):
 
         has_to_apply_subpix = self.index_pass == self.params.multipass.number - 1
 
-        for ivec in range(nb_vec):
-            ixvec0 = ixs0_pad[ivec]
-            iyvec0 = iys0_pad[ivec]
-            ixvec1 = ixs1_pad[ivec]
-            iyvec1 = iys1_pad[ivec]
-
-            im0crop = self._crop_im0(ixvec0, iyvec0, im0pad)
-            im1crop = self._crop_im1(ixvec1, iyvec1, im1pad)
+        batch_size = self.params.piv0.batch_size
+        if batch_size is None or batch_size > nb_vec:
+            batch_size = max(nb_vec, 1)
+
+        nb_threads = self.nb_threads
+        if nb_threads > 1:
+            # at least one batch per thread
+            batch_size = min(batch_size, max(-(-nb_vec // nb_threads), 1))
+
+        def compute_batch(ivec_start):
+            ivecs = range(ivec_start, min(ivec_start + batch_size, nb_vec))
+
+            ims0, ims1, ivecs = self._crop_stacks(
+                ivecs,
+                windows0,
+                windows1,
+                ixs0_pad,
+                iys0_pad,
+                ixs1_pad,
+                iys1_pad,
+                deltaxs,
+                deltays,
+                correls_max,
+                errors,
+            )
 
-            if (
-                im0crop.shape != self.shape_crop_im0
-                or im1crop.shape != self.shape_crop_im1
-            ):
-                print(
-                    "Warning: Bad im_crop shape.",
-                    ixvec0,
-                    iyvec0,
-                    ixvec1,
-                    iyvec1,
-                    im0crop.shape,
-                    self.shape_crop_im0,
-                    im1crop.shape,
-                    self.shape_crop_im1,
+            # compute the correlation maps of the whole batch
+            if ivecs and any(sp is not None for sp in spectra):
+                spectra0, energies0 = self._get_spectra_batch(
+                    spectra[0],
+                    ivecs,
+                    ims0,
+                    batch_size,
+                    (iys0_pad[ivecs], ixs0_pad[ivecs]),
+                )
+                spectra1, energies1 = self._get_spectra_batch(
+                    spectra[1], ivecs, ims1, batch_size
+                )
+                (
+                    correls_batch,
+                    norms,
+                ) = self.correl.compute_correls_stack_from_spectra(
+                    spectra0, energies0, spectra1, energies1, batch_size
+                )
+            else:
+                # the last batch and the batches without the removed windows
+                # are padded to batch_size (one FFT plan per pass)
+                correls_batch, norms = self.correl.compute_correls_stack(
+                    ims0, ims1, batch_size
                 )
-
-                deltaxs[ivec] = np.nan
-                deltays[ivec] = np.nan
-                correls_max[ivec] = np.nan
-                errors[ivec] = "Bad im_crop shape."
-                continue
-
-            # compute and store correlation map
-            correl, norm = self.correl(im0crop, im1crop)
-
-            correls[ivec] = correl
 
             # compute displacements corresponding to peaks
-            try:
+            (
+                deltaxs_batch,
+                deltays_batch,
+                correls_max_batch,
+                errors_batch,
+                other_peaks,
+            ) = self.correl.compute_displacements_from_correls_stack(
+                correls_batch, norms
+            )
+            indices_peaks = self.correl.compute_indices_from_displacement(
+                deltaxs_batch, deltays_batch
+            )
+
+            # increase precision on the displacement
+            if has_to_apply_subpix and len(ivecs) > 0:
                 (
-                    deltax,
-                    deltay,
-                    correl_max,
-                    other_peaks,
-                ) = self.correl.compute_displacements_from_correl(
-                    correl, norm=norm
+                    deltaxs_subpix,
+                    deltays_subpix,
+                    errors_subpix,
+                ) = self.correl.apply_subpix_stack(
+                    deltaxs_batch, deltays_batch, correls_batch
                 )
-            except PIVError as e:
-                errors[ivec] = e.explanation
-                deltaxs[ivec], deltays[ivec], correls_max[ivec] = e.results
-                continue
+                errors_subpix = {
+                    index: explanation
+                    for index, explanation in errors_subpix.items()
+                    if index not in errors_batch
+                }
+                use_subpix = np.ones(len(ivecs), dtype=bool)
+                use_subpix[list(errors_batch)] = False
+                use_subpix[list(errors_subpix)] = False
+                deltaxs_batch = np.where(
+                    use_subpix, deltaxs_subpix, deltaxs_batch
+                )
+                deltays_batch = np.where(
+                    use_subpix, deltays_subpix, deltays_batch
+                )
+                errors_batch.update(errors_subpix)
 
-            # increase precision on the displacement
-            if has_to_apply_subpix:
-                try:
-                    deltax, deltay = self.correl.apply_subpix(
-                        deltax, deltay, correl
-                    )
-                except PIVError as e:
-                    errors[ivec] = e.explanation
+            deltaxs[ivecs] = deltaxs_batch
+            deltays[ivecs] = deltays_batch
+            correls_max[ivecs] = correls_max_batch
 
-            deltaxs[ivec] = deltax
-            deltays[ivec] = deltay
-            correls_max[ivec] = correl_max
+            for index, ivec in enumerate(ivecs):
+                secondary_peaks[ivec] = other_peaks[index]
 
-            secondary_peaks[ivec] = other_peaks
+            if store_correls == "patches":
+                self._store_correl_patches(
+                    correls, ivecs, correls_batch, indices_peaks, other_peaks
+                )
+            elif store_correls:
+                # copies so that the results do not keep the batch alive
+                for index, ivec in enumerate(ivecs):
+                    correls[ivec] = correls_batch[index].copy()
+
+            for index, explanation in errors_batch.items():
+                errors[ivecs[index]] = explanation
+
+        ivec_starts = range(0, nb_vec, batch_size)
+        if nb_threads == 1:
+            for ivec_start in ivec_starts:
+                compute_batch(ivec_start)
+        else:
+            # the compiled functions and the FFTs release the GIL and the
+            # batches write in different parts of the output arrays
+            list(_get_thread_pool(nb_threads).map(compute_batch, ivec_starts))
 
         if deltaxs_input is not None:
             deltaxs += deltaxs_input
@@ -360,6 +693,131 @@ class BaseWorkPIV(BaseWorkWithMask):
             secondary_peaks,
         )
 
+    def _get_spectra_batch(
+        self, spectra, ivecs, ims, batch_size, positions=None
+    ):
+        """Select (or compute) the spectra of a batch of windows
+
+        `positions` (indices of the windows in the padded image) is used when
+        `spectra` is a :class:`SpectraWindowsAtPositions`.
+
+        """
+        if spectra is None:
+            return self.correl.compute_spectra_stack(ims, batch_size)
+        if isinstance(spectra, SpectraWindowsAtPositions):
+            return spectra.get_batch(
+                self.correl,
+                ivecs,
+                np.stack(positions, axis=1),
+                ims,
+                batch_size,
+            )
+        spectra, energies = spectra
+        return spectra[ivecs], energies[ivecs]
+
+    def _store_correl_patches(
+        self, correl_patches, ivecs, correls, indices_peaks, other_peaks
+    ):
+        """Keep the patches around the peaks of a batch of correlations"""
+        ixs, iys = indices_peaks
+        correl_patches.set_patches(ivecs, correls, iys, ixs)
+
+        for index_peak in range(1, self.params.piv0.nb_peaks_to_search):
+            indices = [
+                index
+                for index, peaks in enumerate(other_peaks)
+                if peaks is not None and len(peaks) >= index_peak
+            ]
+            if not indices:
+                break
+            dxs, dys, _ = np.array(
+                [other_peaks[index][index_peak - 1] for index in indices]
+            ).T
+            ixs, iys = self.correl.compute_indices_from_displacement(
+                dxs.astype(int), dys.astype(int)
+            )
+            correl_patches.set_patches(
+                [ivecs[index] for index in indices],
+                correls[indices],
+                iys,
+                ixs,
+                index_peak,
+            )
+
+    def _crop_stacks(
+        self,
+        ivecs,
+        windows0,
+        windows1,
+        ixs0_pad,
+        iys0_pad,
+        ixs1_pad,
+        iys1_pad,
+        deltaxs,
+        deltays,
+        correls_max,
+        errors,
+    ):
+        """Crop the images for a batch of vectors and stack the windows.
+
+        The windows are gathered in bulk from `windows0` and `windows1`
+        (views of the padded images produced by
+        :func:`numpy.lib.stride_tricks.sliding_window_view`).
+
+        The vectors for which the cropped windows are not fully included in
+        the padded images are flagged in `deltaxs`, `deltays`, `correls_max`
+        and `errors`, and are not included in the stacks.
+
+        Returns
+        -------
+
+        ims0 : np.array (3d, float32)
+
+        ims1 : np.array (3d, float32)
+
+        ivecs : list
+
+          Indices of the vectors corresponding to the windows in the stacks.
+
+        """
+        ivecs = np.array(ivecs, dtype=int)
+
+        iys0_start = iys0_pad[ivecs] - self._start_for_crop0[0]
+        ixs0_start = ixs0_pad[ivecs] - self._start_for_crop0[1]
+        iys1_start = iys1_pad[ivecs] - self._start_for_crop1[0]
+        ixs1_start = ixs1_pad[ivecs] - self._start_for_crop1[1]
+
+        are_good = (
+            (iys0_start >= 0)
+            & (iys0_start < windows0.shape[0])
+            & (ixs0_start >= 0)
+            & (ixs0_start < windows0.shape[1])
+            & (iys1_start >= 0)
+            & (iys1_start < windows1.shape[0])
+            & (ixs1_start >= 0)
+            & (ixs1_start < windows1.shape[1])
+        )
+
+        for ivec in ivecs[~are_good].tolist():
+            print(
+                "Warning: Bad im_crop shape.",
+                ixs0_pad[ivec],
+                iys0_pad[ivec],
+                ixs1_pad[ivec],
+                iys1_pad[ivec],
+                self.shape_crop_im0,
+                self.shape_crop_im1,
+            )
+            deltaxs[ivec] = np.nan
+            deltays[ivec] = np.nan
+            correls_max[ivec] = np.nan
+            errors[ivec] = "Bad im_crop shape."
+
+        ims0 = windows0[iys0_start[are_good], ixs0_start[are_good]]
+        ims1 = windows1[iys1_start[are_good], ixs1_start[are_good]]
+
+        return ims0, ims1, ivecs[are_good].tolist()
+
     def _init_crop(self):
         """Initialize the cropping of the images."""
 
@@ -388,23 +846,9 @@ class BaseWorkPIV(BaseWorkWithMask):
 
         self._stop_for_crop1 = tuple(_stop_for_crop1)
 
-    def _crop_im0(self, ixvec, iyvec, im):
-        """Crop image 0."""
-        subim = im[
-            iyvec - self._start_for_crop0[0] : iyvec + self._stop_for_crop0[0],
-            ixvec - self._start_for_crop0[1] : ixvec + self._stop_for_crop0[1],
-        ]
-        subim = np.ascontiguousarray(subim, dtype=np.float32)
-        return subim
-
-    def _crop_im1(self, ixvec, iyvec, im):
-        """Crop image 1."""
-        subim = im[
-            iyvec - self._start_for_crop1[0] : iyvec + self._stop_for_crop1[0],
-            ixvec - self._start_for_crop1[1] : ixvec + self._stop_for_crop1[1],
-        ]
-        subim = np.ascontiguousarray(subim, dtype=np.float32)
-        return subim
+        self.npad = max(self._start_for_crop0 + self._stop_for_crop0)
+        # can be increased to share the padded images between passes
+        self.npad_images = self.npad
 
     def apply_interp(self, piv_results, last=False):
         """Interpolate a PIV result object on the grid of the PIV work.
@@ -592,6 +1036,11 @@ class FirstWorkPIV(BaseWorkPIV):
                 "nsubpix": None,
                 "nb_peaks_to_search": 1,
                 "particle_radius": 3,
+                "batch_size": 256,
+                "store_correls": True,
+                "spectra_cache_nbytes": 200_000_000,
+                "pad_to_fast_sizes": False,
+                "nb_threads": 1,
             },
         )
 
@@ -619,10 +1068,15 @@ class FirstWorkPIV(BaseWorkPIV):
 
 - method_correl : str, default 'fftw'
 
-  Can be in """
+  Can be 'auto' or in """
             + str(list(correlation_classes.keys()))
             + """
 
+  With 'auto', the correlation methods running on CPU are benchmarked for the
+  windows of each pass and the fastest one is used (see
+  :mod:`fluidimage.calcul.autotune`). The decisions are saved in a profile of
+  the machine so that the tuning is done only once.
+
 - method_subpix : str, default '2d_gaussian2'
 
   Can be in """
@@ -645,6 +1099,50 @@ class FirstWorkPIV(BaseWorkPIV):
   Typical radius of a particle (or more precisely of a correlation
   peak). Used only if `nb_peaks_to_search` is larger than one.
 
+- batch_size : 256, int or None
+
+  Number of interrogation windows gathered in one stack for the computation
+  of the correlations. For fft based correlations, the FFTs of a whole stack
+  are computed with one call to the FFT library. If None, all the windows of
+  a pass are processed in one stack (faster but memory hungry for large
+  images).
+
+- store_correls : True, bool or 'patches'
+
+  Correlation maps kept in the results (attribute `correls`). If True, the
+  full maps are kept. With 'patches', only small patches around the main and
+  secondary peaks are kept (enough for the subpix of the secondary peaks and
+  to display the correlations), which strongly reduces the memory used by the
+  results of large fields. If False, no correlation is kept (incompatible with
+  `nb_peaks_to_search > 1`).
+
+- spectra_cache_nbytes : 200_000_000, int
+
+  Maximum number of bytes of the cache of the spectra of the windows of the
+  first pass (for fft based correlations with `shape_crop_im1` equal to
+  `shape_crop_im0`). The windows of an image used in 2 consecutive couples
+  (time-resolved series, for example with `str_subset = "i:i+2"`) are then
+  transformed only once. The images are identified by their names. If 0, no
+  cache is used.
+
+- pad_to_fast_sizes : False, bool
+
+  For fft based correlations, zero-pad the windows to the next even sizes of
+  the form 2**a * 3**b * 5**c * 7**d (for which the FFTs are fast). Useful
+  for sizes like 21 or 46 (obtained for example with
+  `params.multipass.coeff_zoom`). The correlation maps are cropped to the
+  shape of the windows so that the displacements are computed as without
+  padding. Note that the padding also avoids the wrap-around of the circular
+  correlations.
+
+- nb_threads : 1, int or None
+
+  Number of threads used to compute the batches of vectors of each pass (if
+  None, the number of cores). Useful to reduce the latency when fields are
+  computed one by one (for example online). The FFTs and the compiled
+  functions release the GIL. For topologies, which already use one core per
+  couple, keep 1.
+
 """
         )
 
@@ -681,6 +1179,14 @@ Parameters describing the grid.
         self._init_crop()
         self._init_correl()
 
+        nbytes = params.piv0.spectra_cache_nbytes
+        if (
+            nbytes
+            and self.correl.can_use_spectra
+            and self.shape_crop_im0 == self.shape_crop_im1
+        ):
+            self.spectra_cache = LRUCacheNBytes(nbytes)
+
 
 class WorkPIVFromDisplacement(BaseWorkPIV):
     """Work PIV working from already computed displacement (for multipass).
@@ -730,6 +1236,22 @@ class WorkPIVFromDisplacement(BaseWorkPIV):
         self._init_crop()
         self._init_correl()
 
+    def compute_spectra_image0(self, im0):
+        """Prepare the cache of the spectra of the windows of a fixed image 0.
+
+        The windows of the image 0 depend on the input displacements, so the
+        spectra are computed during the first calculations and kept with the
+        positions of the windows (see :class:`SpectraWindowsAtPositions`).
+
+        """
+        if not self.correl.can_use_spectra:
+            return
+
+        if not hasattr(self, "ixvecs_grid"):
+            self._prepare_with_image(im0)
+
+        self.spectra_image0 = SpectraWindowsAtPositions(len(self.ixvecs_grid))
+
     def calcul(self, piv_results):
         """Calcul the PIV (one pass) from a couple of images and displacement.
 
@@ -737,6 +1259,15 @@ class WorkPIVFromDisplacement(BaseWorkPIV):
 
            Use the derivatives of the velocity to distort the image 1.
 
+        """
+        return self._calcul(piv_results)[0]
+
+    def _calcul(self, piv_results, padded_images=None):
+        """Calcul the PIV (one pass) and return the padded images
+
+        `padded_images` (computed by a previous pass, see
+        :meth:`FirstWorkPIV._calcul`) are used if they are padded enough.
+
         """
         if not isinstance(piv_results, HeavyPIVResults):
             raise ValueError
@@ -752,6 +1283,9 @@ class WorkPIVFromDisplacement(BaseWorkPIV):
         deltaxs_input = np.round(piv_results.deltaxs_approx).astype("int32")
         deltays_input = np.round(piv_results.deltays_approx).astype("int32")
 
+        if padded_images is None or padded_images[2] < self.npad:
+            padded_images = self._pad_images(im0, im1)
+
         (
             deltaxs,
             deltays,
@@ -761,7 +1295,9 @@ class WorkPIVFromDisplacement(BaseWorkPIV):
             correls,
             errors,
             secondary_peaks,
-        ) = self._loop_vectors(im0, im1, deltaxs_input, deltays_input)
+        ) = self._loop_vectors(
+            im0, im1, deltaxs_input, deltays_input, padded_images
+        )
 
         xs, ys = self._xyoriginalimage_from_xymasked(xs, ys)
 
@@ -773,7 +1309,7 @@ class WorkPIVFromDisplacement(BaseWorkPIV):
             errors,
             correls_max=correls_max,
             correls=correls,
-            couple=deepcopy(couple),
+            couple=couple,
             params=self.params,
             secondary_peaks=secondary_peaks,
         )
@@ -782,7 +1318,7 @@ class WorkPIVFromDisplacement(BaseWorkPIV):
         result.deltaxs_input = deltaxs_input
         result.deltays_input = deltays_input
 
-        return result
+        return result, padded_images
 
     def _calcul_positions_vectors_subimages(
         self, deltaxs_input=None, deltays_input=None
@@ -1,3 +1,4 @@
+import numpy as np
 import pytest
 
 from fluidimage import get_path_image_samples
@@ -106,3 +107,160 @@ def test_piv_list():
     event.artist = d.q
     event.ind = [0]
     d.onpick(event)
+
+
+@pytest.mark.parametrize("method_correl", ["fftw", "np.fft", "scipy.signal"])
+def test_piv_batch_size(method_correl):
+    """The results should not depend on the batch size (and nb of threads)"""
+
+    params = WorkPIV.create_default_params()
+
+    params.piv0.shape_crop_im0 = 32
+    params.piv0.grid.overlap = -1
+    params.piv0.method_correl = method_correl
+    params.multipass.number = 2
+    params.multipass.use_tps = False
+
+    params.series.path = str(path_images / "Oseen*")
+    params.series.str_subset = "i+1:i+3"
+
+    params.piv0.batch_size = 1
+    result_ref = WorkPIV(params=params).process_1_serie()
+
+    for batch_size, nb_threads in ((7, 1), (None, 1), (7, 3), (None, 4)):
+        params.piv0.batch_size = batch_size
+        params.piv0.nb_threads = nb_threads
+        result = WorkPIV(params=params).process_1_serie()
+        for piv, piv_ref in zip(result.passes, result_ref.passes):
+            assert piv.errors.keys() == piv_ref.errors.keys()
+            assert np.allclose(
+                piv.deltaxs, piv_ref.deltaxs, atol=1e-4, equal_nan=True
+            )
+            assert np.allclose(
+                piv.deltays, piv_ref.deltays, atol=1e-4, equal_nan=True
+            )
+
+
+@pytest.mark.usefixtures("close_plt_figs")
+def test_piv_store_correls():
+    params = WorkPIV.create_default_params()
+
+    params.piv0.shape_crop_im0 = 32
+    params.piv0.grid.overlap = -1
+    params.piv0.nb_peaks_to_search = 2
+    params.multipass.number = 2
+    params.multipass.use_tps = False
+    params.fix.threshold_diff_neighbour = 2
+
+    params.series.path = str(path_images / "Oseen*")
+    params.series.str_subset = "i+1:i+3"
+
+    result_full = WorkPIV(params=params).process_1_serie()
+    # the maps do not keep the stacks of the batches alive
+    assert all(
+        correl is None or correl.base is None
+        for piv in result_full.passes
+        for correl in piv.correls
+    )
+    # the padded images are not kept in the results
+    assert all("_padded_images" not in vars(piv) for piv in result_full.passes)
+
+    params.piv0.store_correls = "patches"
+    result = WorkPIV(params=params).process_1_serie()
+
+    assert result.nbytes < result_full.nbytes
+    for piv, piv_full in zip(result.passes, result_full.passes):
+        assert piv.nbytes < piv_full.nbytes
+        assert piv.couple is result.passes[0].couple
+        assert np.allclose(piv.deltaxs, piv_full.deltaxs, equal_nan=True)
+        assert np.allclose(piv.deltays, piv_full.deltays, equal_nan=True)
+        for ivec, correl in enumerate(piv_full.correls):
+            patched = piv.correls[ivec]
+            assert (patched is None) == (correl is None)
+            if correl is None:
+                continue
+            selection = ~np.isnan(patched)
+            assert np.allclose(patched[selection], correl[selection])
+
+    piv0 = result.piv0
+    im0, im1 = piv0.get_images()
+    display = DisplayPIV(im0, im1, piv0)
+    display.select_arrow([0], artist=display.q)
+
+    params.piv0.store_correls = False
+    with pytest.raises(ValueError):
+        WorkPIV(params=params)
+    params.piv0.nb_peaks_to_search = 1
+    result = WorkPIV(params=params).process_1_serie()
+    assert result.piv0.correls is None
+
+
+def test_piv_spectra_cache():
+    """Consecutive couples of a time-resolved series share an image"""
+
+    params = WorkPIV.create_default_params()
+
+    params.piv0.shape_crop_im0 = 32
+    params.piv0.grid.overlap = -1
+    params.multipass.number = 2
+    params.multipass.use_tps = False
+
+    params.series.path = str(path_images / "Oseen*")
+    params.series.str_subset = "i+1:i+3"
+
+    work = WorkPIV(params=params)
+    cache = work.works_piv[0].spectra_cache
+    assert cache is not None
+    results = [work.process_1_serie(index) for index in range(2)]
+    # 3 images, the second one is used in the 2 couples
+    assert len(cache) == 3
+
+    params.piv0.spectra_cache_nbytes = 0
+    work = WorkPIV(params=params)
+    assert work.works_piv[0].spectra_cache is None
+    for index, result in enumerate(results):
+        result_ref = work.process_1_serie(index)
+        for piv, piv_ref in zip(result.passes, result_ref.passes):
+            assert piv.errors.keys() == piv_ref.errors.keys()
+            assert np.allclose(piv.deltaxs, piv_ref.deltaxs, equal_nan=True)
+            assert np.allclose(piv.deltays, piv_ref.deltays, equal_nan=True)
+
+
+def test_piv_method_correl_auto(tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        "fluidimage.config.get_path_autotune_profile",
+        lambda: tmp_path / "profile.json",
+    )
+    params = WorkPIV.create_default_params()
+    params.piv0.shape_crop_im0 = 32
+    params.piv0.method_correl = "auto"
+    params.multipass.number = 2
+
+    work = WorkPIV(params=params)
+    for work_piv in work.works_piv:
+        assert work_piv.method_correl != "auto"
+    assert (tmp_path / "profile.json").exists()
+
+
+def test_piv_pad_to_fast_sizes():
+    params = WorkPIV.create_default_params()
+
+    params.piv0.shape_crop_im0 = 46
+    params.piv0.grid.overlap = -1
+    params.multipass.number = 2
+    params.multipass.use_tps = False
+
+    params.series.path = str(path_images / "Oseen*")
+    params.series.str_subset = "i+1:i+3"
+
+    result_ref = WorkPIV(params=params).process_1_serie()
+
+    params.piv0.pad_to_fast_sizes = True
+    work = WorkPIV(params=params)
+    assert [w.correl.shape_fft for w in work.works_piv] == [(48, 48), (24, 24)]
+    result = work.process_1_serie()
+
+    piv, piv_ref = result.passes[-1], result_ref.passes[-1]
+    assert piv.deltaxs.shape == piv_ref.deltaxs.shape
+    assert np.nanmedian(abs(piv.deltaxs - piv_ref.deltaxs)) < 0.1
+    assert np.nanmedian(abs(piv.deltays - piv_ref.deltays)) < 0.1
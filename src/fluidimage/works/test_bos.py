@@ -1,4 +1,8 @@
+import numpy as np
+
 from fluidimage import get_path_image_samples
+from fluidimage.synthetic import make_synthetic_images
+from fluidimage.util import imsave
 from fluidimage.works.bos import WorkBOS
 
 
@@ -30,3 +34,45 @@ def test_work_bos():
     result = work.process_1_image()
 
     print(type(result))
+
+
+def test_work_bos_cache_reference_spectra(tmp_path):
+    # displacements large enough to shift the windows of the second pass
+    np.random.seed(0)
+    im0, im1 = make_synthetic_images((6.6, -4.3), 600, shape_im0=(128, 128))
+    for index, image in enumerate((im0, im1)):
+        image = 200 * image / image.max()
+        imsave(tmp_path / f"im{index}.png", image, as_int=True)
+
+    params = WorkBOS.create_default_params()
+
+    params.images.path = str(tmp_path)
+    params.images.str_subset = "1:2"
+    params.reference = "im0.png"
+
+    params.piv0.shape_crop_im0 = 32
+    params.multipass.number = 2
+    params.multipass.use_tps = False
+
+    work = WorkBOS(params)
+    assert work.work_piv.works_piv[0].spectra_image0 is not None
+    result = work.process_1_image()
+    # the spectra of the second pass are kept with the positions of the windows
+    spectra_pass1 = work.work_piv.works_piv[1].spectra_image0
+    assert (spectra_pass1.positions >= 0).all()
+    # computed again with the spectra kept for all the passes
+    result_again = work.process_1_image()
+
+    params.cache_reference_spectra = False
+    work = WorkBOS(params)
+    assert work.work_piv.works_piv[0].spectra_image0 is None
+    result_no_cache = work.process_1_image()
+
+    for piv, piv_again, piv_no_cache in zip(
+        result.passes, result_again.passes, result_no_cache.passes
+    ):
+        assert np.array_equal(piv_again.deltaxs, piv.deltaxs, equal_nan=True)
+        assert np.array_equal(piv.xs, piv_no_cache.xs)
+        assert np.array_equal(piv.ys, piv_no_cache.ys)
+        assert np.array_equal(piv.deltaxs, piv_no_cache.deltaxs, equal_nan=True)
+        assert np.array_equal(piv.deltays, piv_no_cache.deltays, equal_nan=True)